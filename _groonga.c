@@ -4,6 +4,10 @@
  */
 
 #include <Python.h>
+#include <pythread.h>
+#include <errno.h>
+#include <poll.h>
+#include <sys/time.h>
 #include <groonga/groonga.h>
 
 #define MODULE_NAME     "_groonga"
@@ -16,8 +20,10 @@
 
 #ifdef PY3
 # define INIT_RETURN(m) return(m)
+# define BYTES_FORMAT "y#"
 #else
 # define INIT_RETURN(m) return
+# define BYTES_FORMAT "s#"
 #endif
 
 typedef struct {
@@ -106,6 +112,13 @@ static pair _groonga_consts[] = {
     {"CTX_BATCH_MODE", GRN_CTX_BATCH_MODE},
     {"CTX_PER_DB", GRN_CTX_PER_DB},
 
+    /* ctx send/recv flag */
+    {"CTX_MORE", GRN_CTX_MORE},
+    {"CTX_TAIL", GRN_CTX_TAIL},
+    {"CTX_HEAD", GRN_CTX_HEAD},
+    {"CTX_QUIET", GRN_CTX_QUIET},
+    {"CTX_QUIT", GRN_CTX_QUIT},
+
     /* grn_encoding */
     {"ENC_DEFAULT", GRN_ENC_DEFAULT},
     {"ENC_NONE", GRN_ENC_NONE},
@@ -138,15 +151,89 @@ typedef struct {
     PyObject_HEAD
     grn_ctx ctx;
     int opened;
+    grn_obj *db;
+    PyThread_type_lock lock;
 } GroongaContext;
 
+/*
+ * grn_ctx is not thread-safe. Blocking operations run without the GIL, so
+ * they are serialized by the per-context lock instead.
+ */
+#define CONTEXT_BEGIN_ALLOW_THREADS(self) \
+    Py_BEGIN_ALLOW_THREADS \
+    PyThread_acquire_lock((self)->lock, WAIT_LOCK);
+
+#define CONTEXT_END_ALLOW_THREADS(self) \
+    PyThread_release_lock((self)->lock); \
+    Py_END_ALLOW_THREADS
+
+/*
+ * Convert the deadline by time.time(), or None that means no deadline.
+ */
+static int
+_groonga_deadline_converter(PyObject *obj, double *deadline)
+{
+    if (obj == Py_None) {
+        *deadline = -1.0;
+        return TRUE;
+    }
+    *deadline = PyFloat_AsDouble(obj);
+    if (*deadline == -1.0 && PyErr_Occurred()) {
+        return FALSE;
+    }
+    return TRUE;
+}
+
+/*
+ * Wait until the socket of the context becomes ready for the events.
+ * Returns GRN_OPERATION_TIMEOUT if the deadline has passed, so that the
+ * blocking send and recv of groonga are not entered. Nothing is waited
+ * without the deadline or the socket (embedded mode). Must be called with
+ * the context locked and without the GIL.
+ */
+static grn_rc
+GroongaContext_wait(GroongaContext *self, short events, double deadline)
+{
+    grn_ctx_info info;
+    struct pollfd pfd;
+    struct timeval now;
+    double remaining;
+    int n;
+
+    if (deadline < 0) {
+        return GRN_SUCCESS;
+    }
+    if (grn_ctx_info_get(&self->ctx, &info) != GRN_SUCCESS || info.fd < 0) {
+        return GRN_SUCCESS;
+    }
+    pfd.fd = info.fd;
+    pfd.events = events;
+    do {
+        gettimeofday(&now, NULL);
+        remaining = deadline - (now.tv_sec + now.tv_usec / 1000000.0);
+        pfd.revents = 0;
+        /* round up to milliseconds not to wake up before the deadline */
+        n = poll(&pfd, 1, remaining > 0 ? (int)(remaining * 1000 + 0.999) : 0);
+    } while (n == -1 && errno == EINTR);
+
+    /* the errors of socket are reported by send and recv of groonga */
+    return n == 0 ? GRN_OPERATION_TIMEOUT : GRN_SUCCESS;
+}
+
 static void
 GroongaContext_dealloc(GroongaContext *self)
 {
     if (self->opened) {
-        Py_BEGIN_ALLOW_THREADS
+        CONTEXT_BEGIN_ALLOW_THREADS(self)
+        if (self->db != NULL) {
+            grn_obj_close(&self->ctx, self->db);
+        }
         grn_ctx_fin(&self->ctx);
-        Py_END_ALLOW_THREADS
+        CONTEXT_END_ALLOW_THREADS(self)
+    }
+
+    if (self->lock != NULL) {
+        PyThread_free_lock(self->lock);
     }
 
     Py_TYPE(self)->tp_free((PyObject *)self);
@@ -176,6 +263,14 @@ GroongaContext_init(GroongaContext *self, PyObject *args, PyObject *kwargs)
         return -1;
     }
 
+    if (self->lock == NULL) {
+        self->lock = PyThread_allocate_lock();
+        if (self->lock == NULL) {
+            PyErr_SetString(PyExc_MemoryError, "unable to allocate lock");
+            return -1;
+        }
+    }
+
     Py_BEGIN_ALLOW_THREADS
     rc = grn_ctx_init(&self->ctx, flags);
     Py_END_ALLOW_THREADS
@@ -228,38 +323,292 @@ GroongaContext_connect(GroongaContext *self, PyObject *args, PyObject *kwargs)
         return NULL;
     }
 
+    CONTEXT_BEGIN_ALLOW_THREADS(self)
     rc = grn_ctx_connect(&self->ctx, host, port, flags);
+    CONTEXT_END_ALLOW_THREADS(self)
 
     return Py_BuildValue("i", rc);
 }
 
+static PyObject *
+GroongaContext_open_db(GroongaContext *self, PyObject *args, PyObject *kwargs,
+                       int create)
+{
+    int rc;
+    const char *path;
+    static char *kwlist[] = {"path", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "s", kwlist, &path)) {
+        return NULL;
+    }
+
+    if (self->db != NULL) {
+        PyErr_SetString(PyExc_RuntimeError, "database is already opened");
+        return NULL;
+    }
+
+    CONTEXT_BEGIN_ALLOW_THREADS(self)
+    if (create) {
+        self->db = grn_db_create(&self->ctx, path, NULL);
+    } else {
+        self->db = grn_db_open(&self->ctx, path);
+    }
+    rc = self->ctx.rc;
+    CONTEXT_END_ALLOW_THREADS(self)
+
+    if (self->db == NULL && rc == GRN_SUCCESS) {
+        rc = GRN_UNKNOWN_ERROR;
+    }
+
+    return Py_BuildValue("i", rc);
+}
+
+static PyObject *
+GroongaContext_db_open(GroongaContext *self, PyObject *args, PyObject *kwargs)
+{
+    return GroongaContext_open_db(self, args, kwargs, FALSE);
+}
+
+static PyObject *
+GroongaContext_db_create(GroongaContext *self, PyObject *args, PyObject *kwargs)
+{
+    return GroongaContext_open_db(self, args, kwargs, TRUE);
+}
+
 static PyObject *
 GroongaContext_send(GroongaContext *self, PyObject *args, PyObject *kwargs)
 {
     const char *str;
     unsigned int str_len;
     int flags;
-    static char *kwlist[] = {"str", "flags", NULL};
+    double deadline = -1.0;
+    int rc;
+    static char *kwlist[] = {"str", "flags", "deadline", NULL};
 
-    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "s#i", kwlist, &str, &str_len, &flags)) {
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "s#i|O&", kwlist, &str, &str_len, &flags,
+                                     _groonga_deadline_converter, &deadline)) {
         return NULL;
     }
 
-    grn_ctx_send(&self->ctx, str, str_len, flags);
+    CONTEXT_BEGIN_ALLOW_THREADS(self)
+    rc = GroongaContext_wait(self, POLLOUT, deadline);
+    if (rc == GRN_SUCCESS) {
+        grn_ctx_send(&self->ctx, str, str_len, flags);
+        rc = self->ctx.rc;
+    }
+    CONTEXT_END_ALLOW_THREADS(self)
 
-    Py_RETURN_NONE;
+    return Py_BuildValue("i", rc);
 }
 
 static PyObject *
-GroongaContext_recv(GroongaContext *self)
+GroongaContext_recv_internal(GroongaContext *self, PyObject *args,
+                             PyObject *kwargs, const char *format)
 {
     char *str = NULL;
     unsigned int str_len = 0;
+    int flags = 0;
+    double deadline = -1.0;
+    int rc;
+    PyObject *result;
+    static char *kwlist[] = {"deadline", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "|O&", kwlist,
+                                     _groonga_deadline_converter, &deadline)) {
+        return NULL;
+    }
+
+    Py_BEGIN_ALLOW_THREADS
+    PyThread_acquire_lock(self->lock, WAIT_LOCK);
+    rc = GroongaContext_wait(self, POLLIN, deadline);
+    if (rc == GRN_SUCCESS) {
+        grn_ctx_recv(&self->ctx, &str, &str_len, &flags);
+        rc = self->ctx.rc;
+    }
+    Py_END_ALLOW_THREADS
+
+    /* str points into the context's buffer, copy it before unlocking. */
+    result = Py_BuildValue(format, rc, str, str_len, flags);
+    PyThread_release_lock(self->lock);
+
+    return result;
+}
+
+static PyObject *
+GroongaContext_recv(GroongaContext *self, PyObject *args, PyObject *kwargs)
+{
+    return GroongaContext_recv_internal(self, args, kwargs, "(is#i)");
+}
+
+static PyObject *
+GroongaContext_recv_bytes(GroongaContext *self, PyObject *args,
+                          PyObject *kwargs)
+{
+    return GroongaContext_recv_internal(self, args, kwargs,
+                                        "(i" BYTES_FORMAT "i)");
+}
+
+/*
+ * Receive all chunks of a response into *buf. Must be called with the
+ * context locked and without the GIL.
+ */
+static int
+GroongaContext_recv_all(GroongaContext *self, char **buf, size_t *len,
+                        size_t *cap, double deadline)
+{
+    char *str;
+    unsigned int str_len;
     int flags;
+    int rc;
+
+    *len = 0;
+    do {
+        str = NULL;
+        str_len = 0;
+        rc = GroongaContext_wait(self, POLLIN, deadline);
+        if (rc != GRN_SUCCESS) {
+            break;
+        }
+        grn_ctx_recv(&self->ctx, &str, &str_len, &flags);
+        rc = self->ctx.rc;
+        if (*len + str_len > *cap) {
+            size_t newcap = (*len + str_len) * 2;
+            char *newbuf = realloc(*buf, newcap);
+            if (newbuf == NULL) {
+                return GRN_NO_MEMORY_AVAILABLE;
+            }
+            *buf = newbuf;
+            *cap = newcap;
+        }
+        if (str_len > 0) {
+            memcpy(*buf + *len, str, str_len);
+            *len += str_len;
+        }
+    } while (rc == GRN_SUCCESS && (flags & GRN_CTX_MORE));
+
+    return rc;
+}
+
+static PyObject *
+GroongaContext_query_many(GroongaContext *self, PyObject *args,
+                          PyObject *kwargs)
+{
+    PyObject *commands;
+    PyObject *seq = NULL;
+    PyObject *results = NULL;
+    char **strs = NULL;
+    Py_ssize_t *str_lens = NULL;
+    int *send_rcs = NULL;
+    char *buf = NULL;
+    size_t len = 0;
+    size_t cap = 0;
+    int pipelined;
+    int rc;
+    double deadline = -1.0;
+    Py_ssize_t i, j, n;
+    static char *kwlist[] = {"commands", "deadline", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "O|O&", kwlist, &commands,
+                                     _groonga_deadline_converter, &deadline)) {
+        return NULL;
+    }
+
+    seq = PySequence_Fast(commands, "commands must be a sequence of bytes");
+    if (seq == NULL) {
+        return NULL;
+    }
+    n = PySequence_Fast_GET_SIZE(seq);
+
+    strs = PyMem_Malloc(sizeof(char *) * (n + 1));
+    str_lens = PyMem_Malloc(sizeof(Py_ssize_t) * (n + 1));
+    send_rcs = PyMem_Malloc(sizeof(int) * (n + 1));
+    if (strs == NULL || str_lens == NULL || send_rcs == NULL) {
+        PyErr_NoMemory();
+        goto exit;
+    }
+    for (i = 0; i < n; i++) {
+        PyObject *item = PySequence_Fast_GET_ITEM(seq, i);
+        if (PyBytes_AsStringAndSize(item, &strs[i], &str_lens[i]) == -1) {
+            goto exit;
+        }
+        send_rcs[i] = GRN_SUCCESS;
+    }
+
+    results = PyList_New(n);
+    if (results == NULL) {
+        goto exit;
+    }
 
-    grn_ctx_recv(&self->ctx, &str, &str_len, &flags);
+    /*
+     * The local database executes a command on sending, so the commands are
+     * sent and received one by one in embedded mode.
+     */
+    pipelined = (self->db == NULL);
 
-    return Py_BuildValue("(is#i)", self->ctx.rc, str, str_len, flags);
+    Py_BEGIN_ALLOW_THREADS
+    PyThread_acquire_lock(self->lock, WAIT_LOCK);
+    if (pipelined) {
+        for (i = 0; i < n; i++) {
+            send_rcs[i] = GroongaContext_wait(self, POLLOUT, deadline);
+            if (send_rcs[i] == GRN_SUCCESS) {
+                grn_ctx_send(&self->ctx, strs[i], (unsigned int)str_lens[i],
+                             0);
+                send_rcs[i] = self->ctx.rc;
+            }
+        }
+    }
+    Py_END_ALLOW_THREADS
+
+    for (i = 0; i < n; i++) {
+        PyObject *item;
+
+        Py_BEGIN_ALLOW_THREADS
+        if (!pipelined) {
+            grn_ctx_send(&self->ctx, strs[i], (unsigned int)str_lens[i], 0);
+            send_rcs[i] = self->ctx.rc;
+        }
+        if (send_rcs[i] == GRN_SUCCESS) {
+            rc = GroongaContext_recv_all(self, &buf, &len, &cap, deadline);
+            if (rc == GRN_OPERATION_TIMEOUT) {
+                /* the rest of responses can no longer be received */
+                for (j = i + 1; j < n; j++) {
+                    send_rcs[j] = GRN_OPERATION_TIMEOUT;
+                }
+            }
+        } else {
+            rc = send_rcs[i];
+            len = 0;
+        }
+        Py_END_ALLOW_THREADS
+
+        item = Py_BuildValue("(i" BYTES_FORMAT ")", rc, buf ? buf : "",
+                             (int)len);
+        if (item == NULL) {
+            /* receive the rest of responses to keep the connection usable */
+            for (i++; i < n; i++) {
+                Py_BEGIN_ALLOW_THREADS
+                if (send_rcs[i] == GRN_SUCCESS) {
+                    GroongaContext_recv_all(self, &buf, &len, &cap,
+                                            deadline);
+                }
+                Py_END_ALLOW_THREADS
+            }
+            PyThread_release_lock(self->lock);
+            Py_CLEAR(results);
+            goto exit;
+        }
+        PyList_SET_ITEM(results, i, item);
+    }
+    PyThread_release_lock(self->lock);
+
+exit:
+    free(buf);
+    PyMem_Free(strs);
+    PyMem_Free(str_lens);
+    PyMem_Free(send_rcs);
+    Py_DECREF(seq);
+
+    return results;
 }
 
 static PyMethodDef GroongaContext_methods[] = {
@@ -269,9 +618,17 @@ static PyMethodDef GroongaContext_methods[] = {
      ""},
     {"connect", (PyCFunction)GroongaContext_connect, METH_VARARGS | METH_KEYWORDS,
      ""},
+    {"db_open", (PyCFunction)GroongaContext_db_open, METH_VARARGS | METH_KEYWORDS,
+     ""},
+    {"db_create", (PyCFunction)GroongaContext_db_create, METH_VARARGS | METH_KEYWORDS,
+     ""},
     {"send", (PyCFunction)GroongaContext_send, METH_VARARGS | METH_KEYWORDS,
      ""},
-    {"recv", (PyCFunction)GroongaContext_recv, METH_NOARGS,
+    {"recv", (PyCFunction)GroongaContext_recv, METH_VARARGS | METH_KEYWORDS,
+     ""},
+    {"recv_bytes", (PyCFunction)GroongaContext_recv_bytes, METH_VARARGS | METH_KEYWORDS,
+     ""},
+    {"query_many", (PyCFunction)GroongaContext_query_many, METH_VARARGS | METH_KEYWORDS,
      ""},
     {NULL}, /* Sentinel */
 };
@@ -0,0 +1,195 @@
+/*
+ * Copyright (c) 2013 Naoya Inada <naoina@kuune.org>
+ * Licensed under the MIT License.
+ */
+
+#include <Python.h>
+
+#define MODULE_NAME     "pyroonga._speedups"
+#define TRUE    (1)
+#define FALSE   (0)
+
+#if (PY_MAJOR_VERSION == 3 && PY_MINOR_VERSION >= 1) || PY_MAJOR_VERSION > 3
+# define PY3
+#endif
+
+#if PY_VERSION_HEX >= 0x03030000
+/* flexible string representation of PEP 393 */
+# define PEP393
+#endif
+
+#ifdef PY3
+# define INIT_RETURN(m) return(m)
+#else
+# define INIT_RETURN(m) return
+#endif
+
+/* count the characters to escape, and whether the spaces are contained */
+#define COUNT_ESCAPE(type, data, len, extra, quote) \
+    do { \
+        const type *p = (const type *)(data); \
+        const type *end = p + (len); \
+        for (; p < end; p++) { \
+            switch (*p) { \
+            case '\\': \
+            case '\n': \
+            case '"': \
+                (extra)++; \
+                break; \
+            case ' ': \
+                (quote) = TRUE; \
+            } \
+        } \
+    } while (0)
+
+/* write the escaped characters into the allocated result */
+#define WRITE_ESCAPE(type, data, rdata, len, quote) \
+    do { \
+        const type *p = (const type *)(data); \
+        const type *end = p + (len); \
+        type *q = (type *)(rdata); \
+        if (quote) { \
+            *q++ = '"'; \
+        } \
+        for (; p < end; p++) { \
+            switch (*p) { \
+            case '\\': \
+                *q++ = '\\'; \
+                *q++ = '\\'; \
+                break; \
+            case '\n': \
+                *q++ = '\\'; \
+                *q++ = 'n'; \
+                break; \
+            case '"': \
+                *q++ = '\\'; \
+                *q++ = '"'; \
+                break; \
+            default: \
+                *q++ = *p; \
+            } \
+        } \
+        if (quote) { \
+            *q++ = '"'; \
+        } \
+    } while (0)
+
+/*
+ * Escape the string in one copy. The length of the result is counted first,
+ * then the result is written into the string allocated by the length.
+ */
+static PyObject *
+_speedups_escape(PyObject *self, PyObject *args, PyObject *kwds)
+{
+    static char *kwlist[] = {"s", "force_quote", NULL};
+    PyObject *s, *force_quote = Py_False, *result;
+    Py_ssize_t len, extra = 0;
+    int quote;
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "U|O", kwlist, &s,
+                                     &force_quote)) {
+        return NULL;
+    }
+    if ((quote = PyObject_IsTrue(force_quote)) == -1) {
+        return NULL;
+    }
+
+#ifdef PEP393
+    {
+        int kind;
+        void *data, *rdata;
+
+        if (PyUnicode_READY(s) == -1) {
+            return NULL;
+        }
+        kind = PyUnicode_KIND(s);
+        data = PyUnicode_DATA(s);
+        len = PyUnicode_GET_LENGTH(s);
+        switch (kind) {
+        case PyUnicode_1BYTE_KIND:
+            COUNT_ESCAPE(Py_UCS1, data, len, extra, quote);
+            break;
+        case PyUnicode_2BYTE_KIND:
+            COUNT_ESCAPE(Py_UCS2, data, len, extra, quote);
+            break;
+        default:
+            COUNT_ESCAPE(Py_UCS4, data, len, extra, quote);
+        }
+        if (!extra && !quote) {
+            Py_INCREF(s);
+            return s;
+        }
+        /* the result is the same kind as the input */
+        result = PyUnicode_New(len + extra + (quote ? 2 : 0),
+                               PyUnicode_MAX_CHAR_VALUE(s));
+        if (result == NULL) {
+            return NULL;
+        }
+        rdata = PyUnicode_DATA(result);
+        switch (kind) {
+        case PyUnicode_1BYTE_KIND:
+            WRITE_ESCAPE(Py_UCS1, data, rdata, len, quote);
+            break;
+        case PyUnicode_2BYTE_KIND:
+            WRITE_ESCAPE(Py_UCS2, data, rdata, len, quote);
+            break;
+        default:
+            WRITE_ESCAPE(Py_UCS4, data, rdata, len, quote);
+        }
+    }
+#else
+    {
+        Py_UNICODE *data;
+
+        data = PyUnicode_AS_UNICODE(s);
+        len = PyUnicode_GET_SIZE(s);
+        COUNT_ESCAPE(Py_UNICODE, data, len, extra, quote);
+        if (!extra && !quote) {
+            Py_INCREF(s);
+            return s;
+        }
+        result = PyUnicode_FromUnicode(NULL, len + extra + (quote ? 2 : 0));
+        if (result == NULL) {
+            return NULL;
+        }
+        WRITE_ESCAPE(Py_UNICODE, data, PyUnicode_AS_UNICODE(result), len,
+                     quote);
+    }
+#endif
+
+    return result;
+}
+
+static PyMethodDef _speedups_methods[] = {
+    {"escape", (PyCFunction)_speedups_escape, METH_VARARGS | METH_KEYWORDS,
+     ""},
+    {NULL},  /* Sentinel */
+};
+
+#ifdef PY3
+static struct PyModuleDef _speedups_module = {
+    PyModuleDef_HEAD_INIT,
+    MODULE_NAME, /* name of module */
+    NULL,        /* module documentation, may be NULL */
+    -1,          /* size of per-interpreter state of the module,
+                    or -1 if the module keeps state in global variables. */
+    _speedups_methods,
+};
+
+PyMODINIT_FUNC
+PyInit__speedups(void)
+#else
+PyMODINIT_FUNC
+init_speedups(void)
+#endif
+{
+    PyObject *module = NULL;
+
+#ifdef PY3
+    module = PyModule_Create(&_speedups_module);
+#else
+    module = Py_InitModule(MODULE_NAME, _speedups_methods);
+#endif
+
+    INIT_RETURN(module);
+}
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2013 Naoya Inada <naoina@kuune.org>
+# Licensed under the MIT License.
+
+"""Throughput of bulk load by the number of connections
+
+Loads ``--rows`` records into a fresh table by
+:func:`pyroonga.odm.query.bulk_load` over a :class:`pyroonga.GroongaPool` for
+each number of connections. The throughput should scale with the number of
+connections until the server saturates.
+
+Usage::
+
+   % groonga -s DB_PATH_NAME
+   % python benchmarks/bulk_load.py [--rows N] [--batch-size N] \\
+       [--connections 1,2,4,8]
+"""
+
+__author__ = "Naoya Inada <naoina@kuune.org>"
+
+import optparse
+
+from pyroonga import GroongaError, GroongaPool
+from pyroonga.odm.table import Column, tablebase
+
+
+def run(host, port, rows, batch_size, connections):
+    Table = tablebase()
+
+    class BulkLoadBench(Table):
+        title = Column()
+        body = Column()
+
+    pool = GroongaPool(host, port, maxsize=connections)
+    Table.bind(pool)
+    try:
+        pool.query('table_remove BulkLoadBench')
+    except GroongaError:
+        pass  # not exists
+    Table.create_all()
+    data = (BulkLoadBench(_key='key%d' % i, title='title %d' % i,
+                          body='body of the record %d. ' % i * 8)
+            for i in range(rows))
+    return BulkLoadBench.bulk_load(data, batch_size=batch_size,
+                                   concurrency=connections)
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option('--host', default='0.0.0.0')
+    parser.add_option('--port', type='int', default=10041)
+    parser.add_option('--rows', type='int', default=100000)
+    parser.add_option('--batch-size', dest='batch_size', type='int',
+                      default=1000)
+    parser.add_option('--connections', default='1,2,4,8')
+    opts, _ = parser.parse_args()
+    base = None
+    print('%12s %12s %12s %8s' % ('connections', 'seconds', 'rows/s',
+                                  'scale'))
+    for n in [int(v) for v in opts.connections.split(',')]:
+        report = run(opts.host, opts.port, opts.rows, opts.batch_size, n)
+        if report.errors:
+            print('%12d %d batches failed: %s' % (n, len(report.errors),
+                                                 report.errors[0].error))
+            continue
+        base = base or report.throughput
+        print('%12d %12.2f %12.1f %7.2fx' % (n, report.elapsed,
+                                             report.throughput,
+                                             report.throughput / base))
+
+
+if __name__ == '__main__':
+    main()
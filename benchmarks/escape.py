@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2013 Naoya Inada <naoina@kuune.org>
+# Licensed under the MIT License.
+
+"""Time of escaping the payload of 'load' query
+
+Escapes the JSON of ``--rows`` records as :class:`pyroonga.odm.query.LoadQuery`
+does, by the pure-Python :func:`pyroonga.utils.escape` and by the C extension
+``pyroonga._speedups`` if it is built.
+
+Usage::
+
+   % python setup.py build_ext --inplace
+   % python benchmarks/escape.py [--rows N] [--repeat N]
+"""
+
+__author__ = "Naoya Inada <naoina@kuune.org>"
+
+import json
+import optparse
+import time
+
+from pyroonga import utils
+
+
+def make_payload(rows):
+    return json.dumps([{'_key': 'key%d' % i,
+                        'title': u'タイトル "%d"' % i,
+                        'body': u'本文\nbody of the site\\%d. ' % i * 4}
+                       for i in range(rows)], ensure_ascii=False)
+
+
+def measure(payload, repeat):
+    start = time.time()
+    for _ in range(repeat):
+        utils.escape(payload, True)
+    return (time.time() - start) / repeat
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option('--rows', type='int', default=50000)
+    parser.add_option('--repeat', type='int', default=10)
+    opts, _ = parser.parse_args()
+    payload = make_payload(opts.rows)
+    print('%.2f MiB, %d rows' % (len(payload.encode('utf-8')) / 1024.0 / 1024,
+                                 opts.rows))
+    print('%8s %12s' % ('escape', 'ms'))
+    speedups = utils._speedups_escape
+    utils._speedups_escape = None
+    print('%8s %12.2f' % ('python', measure(payload, opts.repeat) * 1000))
+    if speedups is None:
+        print('%8s %12s' % ('c', 'N/A'))
+    else:
+        utils._speedups_escape = speedups
+        print('%8s %12.2f' % ('c', measure(payload, opts.repeat) * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2013 Naoya Inada <naoina@kuune.org>
+# Licensed under the MIT License.
+
+"""Latency of querying many servers by :func:`pyroonga.gqtp.fanout`
+
+Starts the fake GQTP servers that respond after ``--delay`` seconds, then
+compares sending the query to each of them in turn with
+:meth:`pyroonga.gqtp.GroongaGQTP.query` against waiting on all of them at once
+with :func:`pyroonga.gqtp.fanout`\ . The latter should take about one delay
+regardless of the number of servers.
+
+Usage::
+
+   % python benchmarks/gqtp_fanout.py [--servers N] [--delay SEC]
+"""
+
+__author__ = "Naoya Inada <naoina@kuune.org>"
+
+import optparse
+import time
+
+from pyroonga.gqtp import GroongaGQTP, fanout
+from pyroonga.tests.gqtp_server import GQTPServer
+
+
+def measure(func, repeat):
+    start = time.time()
+    for _ in range(repeat):
+        func()
+    return (time.time() - start) / repeat
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option('--servers', type='int', default=8)
+    parser.add_option('--delay', type='float', default=0.01)
+    parser.add_option('--repeat', type='int', default=20)
+    parser.add_option('--query', default='select Site')
+    opts, _ = parser.parse_args()
+    servers = [GQTPServer(delay=opts.delay) for _ in range(opts.servers)]
+    for server in servers:
+        server.start()
+    try:
+        nodes = [GroongaGQTP(s.host, s.port) for s in servers]
+        for grn in nodes:
+            grn.connect()
+        sequential = measure(
+            lambda: [grn.query(opts.query) for grn in nodes], opts.repeat)
+        fanned = measure(
+            lambda: fanout([(grn, opts.query) for grn in nodes]), opts.repeat)
+    finally:
+        for server in servers:
+            server.stop()
+    print('%12s %12s' % ('method', 'ms/round'))
+    print('%12s %12.2f' % ('sequential', sequential * 1000))
+    print('%12s %12.2f' % ('fanout', fanned * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2013 Naoya Inada <naoina@kuune.org>
+# Licensed under the MIT License.
+
+"""Time of decoding the result of 'select' query by each JSON decoder
+
+Builds the response of 'select' query that has ``--rows`` records of text,
+numeric, time and vector columns with a drilldown, then decodes it from
+``bytes`` by each decoder of :data:`pyroonga.utils.json_decoders` that is
+installed.
+
+Usage::
+
+   % python benchmarks/json_decoder.py [--rows N] [--repeat N]
+"""
+
+__author__ = "Naoya Inada <naoina@kuune.org>"
+
+import json
+import optparse
+import time
+
+from pyroonga import utils
+
+
+def make_response(rows):
+    columns = [['_id', 'UInt32'], ['_key', 'ShortText'], ['title', 'ShortText'],
+               ['body', 'Text'], ['price', 'Int32'], ['rate', 'Float'],
+               ['updated', 'Time'], ['tags', 'Tag']]
+    records = [[i + 1, 'http://example.com/%d' % i, u'タイトル %d' % i,
+                u'本文 body of the site %d. ' % i * 4, i * 10, i / 7.0,
+                1380000000.0 + i, ['tag%d' % (i % 10), 'common']]
+               for i in range(rows)]
+    drilldown = [[[10], [['_key', 'ShortText'], ['_nsubrecs', 'Int32']]] +
+                 [['tag%d' % i, rows // 10] for i in range(10)]]
+    header = [0, 1380000000.0, 0.01]
+    body = [[[rows], columns] + records] + drilldown
+    return json.dumps([header, body], ensure_ascii=False).encode('utf-8')
+
+
+def measure(decoder, data, repeat):
+    start = time.time()
+    for _ in range(repeat):
+        decoder(data)
+    return (time.time() - start) / repeat
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option('--rows', type='int', default=10000)
+    parser.add_option('--repeat', type='int', default=10)
+    opts, _ = parser.parse_args()
+    data = make_response(opts.rows)
+    print('%.2f MiB, %d rows' % (len(data) / 1024.0 / 1024, opts.rows))
+    print('%10s %12s' % ('decoder', 'ms'))
+    for name, factory in utils.json_decoders:
+        try:
+            decoder = factory()
+        except ImportError:
+            print('%10s %12s' % (name, 'N/A'))
+            continue
+        print('%10s %12.2f' % (name, measure(decoder, data, opts.repeat) *
+                               1000))
+
+
+if __name__ == '__main__':
+    main()
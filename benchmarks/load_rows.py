@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2013 Naoya Inada <naoina@kuune.org>
+# Licensed under the MIT License.
+
+"""Time and size of 'load' query by the records and by the rows
+
+Builds the 'load' query of ``--rows`` records, ``records`` from instances of
+Table like :meth:`pyroonga.odm.table.TableBase.load`\ , and ``rows`` from the
+tuples of values like :meth:`pyroonga.odm.table.TableBase.load_rows`\ , then
+compares the time to build them including the instances and the size of them.
+
+Usage::
+
+   % python benchmarks/load_rows.py [--rows N] [--repeat N]
+"""
+
+__author__ = "Naoya Inada <naoina@kuune.org>"
+
+import optparse
+import time
+
+from pyroonga.odm.query import LoadQuery, RowsLoadQuery
+from pyroonga.odm.table import Column, tablebase
+
+Table = tablebase()
+
+
+class Site(Table):
+    title = Column()
+    body = Column()
+    views = Column()
+
+
+def values(rows):
+    return [('key%d' % i, 'title %d' % i, 'body of site %d' % i, i)
+            for i in range(rows)]
+
+
+def records(data):
+    return str(LoadQuery(Site, (Site(_key=k, title=t, body=b, views=v)
+                                for k, t, b, v in data)))
+
+
+def rows(data):
+    return str(RowsLoadQuery(Site, ['_key', 'title', 'body', 'views'],
+                             data))
+
+
+def measure(func, data, repeat):
+    start = time.time()
+    for _ in range(repeat):
+        query = func(data)
+    return (time.time() - start) / repeat, len(query)
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option('--rows', type='int', default=50000)
+    parser.add_option('--repeat', type='int', default=5)
+    opts, _ = parser.parse_args()
+    data = values(opts.rows)
+    print('%8s %12s %12s' % ('method', 'KiB', 'ms'))
+    for name, func in (('records', records), ('rows', rows)):
+        elapsed, size = measure(func, data, opts.repeat)
+        print('%8s %12.1f %12.2f' % (name, size / 1024.0, elapsed * 1000))
+
+
+if __name__ == '__main__':
+    main()
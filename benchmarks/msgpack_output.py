@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2013 Naoya Inada <naoina@kuune.org>
+# Licensed under the MIT License.
+
+"""Size and decode time of the result of 'select' query by output type
+
+Builds the numeric-heavy result of 'select' query that has ``--rows``
+records, encodes it as groonga does for ``--output_type json`` and
+``--output_type msgpack``\ , then compares the size of them and the time of
+:class:`pyroonga.odm.query.GroongaSelectResult` to decode them.
+
+Usage::
+
+   % python benchmarks/msgpack_output.py [--rows N] [--repeat N] \\
+       [--json-decoder NAME]
+"""
+
+__author__ = "Naoya Inada <naoina@kuune.org>"
+
+import json
+import optparse
+import sys
+import time
+
+from pyroonga import utils
+from pyroonga.odm.query import GroongaSelectResult
+
+
+class Item(object):
+    __tablename__ = 'Item'
+    _id = _key = price = stock = rate = updated = None
+
+
+def make_result(rows):
+    columns = [['_id', 'UInt32'], ['_key', 'ShortText'], ['price', 'Int32'],
+               ['stock', 'UInt32'], ['rate', 'Float'], ['updated', 'Time']]
+    records = [[i + 1, 'item%d' % i, i * 100, i % 1000, i / 7.0,
+                1380000000.0 + i] for i in range(rows)]
+    return [[[rows], columns] + records]
+
+
+def measure(data, output_type, repeat):
+    start = time.time()
+    for _ in range(repeat):
+        GroongaSelectResult(Item, data, output_type=output_type)
+    return (time.time() - start) / repeat
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option('--rows', type='int', default=50000)
+    parser.add_option('--repeat', type='int', default=10)
+    parser.add_option('--json-decoder', dest='json_decoder')
+    opts, _ = parser.parse_args()
+    if utils.msgpack is None:
+        sys.exit('msgpack is required')
+    utils.set_json_decoder(opts.json_decoder)
+    result = make_result(opts.rows)
+    payloads = (
+        ('json', json.dumps(result, separators=(',', ':')).encode('utf-8')),
+        ('msgpack', utils.msgpack.packb(result, use_bin_type=True)),
+    )
+    print('%8s %12s %12s' % ('output', 'KiB', 'ms'))
+    for output_type, data in payloads:
+        print('%8s %12.1f %12.2f' % (output_type, len(data) / 1024.0,
+                                     measure(data, output_type, opts.repeat) *
+                                     1000))
+
+
+if __name__ == '__main__':
+    main()
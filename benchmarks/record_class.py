@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2013 Naoya Inada <naoina@kuune.org>
+# Licensed under the MIT License.
+
+"""Memory and time of building the records of the result
+
+Maps ``--rows`` rows of the result of 'select' query to the records and keeps
+all of them. ``generic`` is :class:`pyroonga.odm.query.GroongaRecord` that
+validates each column of each row and stores them in ``__dict__``\ ,
+``table`` is the record class that :class:`pyroonga.odm.table.TableMeta`
+generates with ``__slots__``\ .
+
+Usage::
+
+   % python benchmarks/record_class.py [--rows N]
+"""
+
+__author__ = "Naoya Inada <naoina@kuune.org>"
+
+import optparse
+import sys
+import time
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+from pyroonga.odm.query import GroongaRecord
+from pyroonga.odm.table import Column, tablebase
+
+Table = tablebase()
+
+
+class Site(Table):
+    title = Column()
+    body = Column()
+    views = Column()
+
+
+COLUMNS = ['_id', '_key', 'title', 'body', 'views']
+
+
+def generic(rows):
+    return [GroongaRecord(Site, **dict(zip(COLUMNS, row))) for row in rows]
+
+
+def table(rows):
+    make = Site.__record__._maker(COLUMNS)
+    return [make(row) for row in rows]
+
+
+def measure(func, rows):
+    tracemalloc.start()
+    start = time.time()
+    records = func(rows)
+    elapsed = time.time() - start
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del records
+    return size, elapsed
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option('--rows', type='int', default=50000)
+    opts, _ = parser.parse_args()
+    if tracemalloc is None:
+        sys.exit('tracemalloc is required (Python 3.4 or later)')
+    rows = [[i + 1, 'key%d' % i, 'title %d' % i, 'body of site %d' % i, i]
+            for i in range(opts.rows)]
+    print('%8s %12s %12s' % ('method', 'bytes/row', 'ms'))
+    for name, func in (('generic', generic), ('table', table)):
+        size, elapsed = measure(func, rows)
+        print('%8s %12.1f %12.2f' % (name, float(size) / opts.rows,
+                                     elapsed * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2013 Naoya Inada <naoina@kuune.org>
+# Licensed under the MIT License.
+
+"""Peak memory of mapping the result of 'select' query
+
+Builds the response of 'select' query that has ``--rows`` records, then
+measures the peak memory by :mod:`tracemalloc` while the records are iterated
+once. ``eager`` maps all records up front like pyroonga 0.5 did, ``lazy`` is
+:class:`pyroonga.odm.query.GroongaSelectResult` that maps each record on
+iteration, and ``stream`` parses the response from chunks of ``--chunk``
+bytes by :func:`pyroonga.utils.parse_select_chunks` like
+:meth:`pyroonga.odm.query.SelectQuery.stream`\ .
+
+Usage::
+
+   % python benchmarks/result_memory.py [--rows N] [--chunk N]
+"""
+
+__author__ = "Naoya Inada <naoina@kuune.org>"
+
+import codecs
+import functools
+import json
+import optparse
+import sys
+import time
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+from pyroonga import utils
+from pyroonga.odm.query import GroongaRecord, GroongaSelectResult
+from pyroonga.odm.table import Column, tablebase
+
+Table = tablebase()
+
+
+class Site(Table):
+    title = Column()
+    body = Column()
+    views = Column()
+
+
+def make_response(rows):
+    records = [[i + 1, 'title %d' % i, 'body of site %d' % i, i]
+               for i in range(rows)]
+    columns = [['_id', 'UInt32'], ['title', 'ShortText'], ['body', 'Text'],
+               ['views', 'UInt32']]
+    return json.dumps([[[rows], columns] + records]).encode('utf-8')
+
+
+def eager(response):
+    results = utils.json_loads(response)[0]
+    return tuple(GroongaRecord(Site, **mapped) for mapped in
+                 utils.to_python(results, 1))
+
+
+def lazy(response):
+    return GroongaSelectResult(Site, response)
+
+
+def stream(response, chunk_size):
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    chunks = (decoder.decode(response[i:i + chunk_size])
+              for i in range(0, len(response), chunk_size))
+    _, columns, rows = utils.parse_select_chunks(chunks)
+    make = Site.__record__._maker([col[0] for col in columns])
+    return (make(row) for row in rows)
+
+
+def measure(func, response):
+    tracemalloc.start()
+    start = time.time()
+    total = 0
+    for record in func(response):
+        total += record.views
+    elapsed = time.time() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak, elapsed
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option('--rows', type='int', default=50000)
+    parser.add_option('--chunk', type='int', default=65536)
+    opts, _ = parser.parse_args()
+    if tracemalloc is None:
+        sys.exit('tracemalloc is required (Python 3.4 or later)')
+    response = make_response(opts.rows)
+    print('%8s %12s %12s' % ('method', 'peak MiB', 'ms'))
+    for name, func in (('eager', eager), ('lazy', lazy),
+                       ('stream', functools.partial(stream,
+                                                    chunk_size=opts.chunk))):
+        peak, elapsed = measure(func, response)
+        print('%8s %12.2f %12.2f' % (name, peak / 1024.0 / 1024,
+                                     elapsed * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2013 Naoya Inada <naoina@kuune.org>
+# Licensed under the MIT License.
+
+"""Throughput of concurrent queries from multiple threads
+
+Each thread owns its own :class:`pyroonga.Groonga` connection and sends the
+same query repeatedly for a fixed duration. Because network I/O runs without
+the GIL, the throughput should scale with the number of threads until the
+server saturates.
+
+Usage::
+
+   % groonga -s DB_PATH_NAME
+   % python benchmarks/threaded_query.py [--query QUERY] [--duration SEC]
+"""
+
+__author__ = "Naoya Inada <naoina@kuune.org>"
+
+import optparse
+import threading
+import time
+
+from pyroonga import Groonga
+
+
+def worker(host, port, query, deadline, counts, idx):
+    grn = Groonga(host, port)
+    grn.connect()
+    n = 0
+    while time.time() < deadline:
+        grn.query(query)
+        n += 1
+    counts[idx] = n
+
+
+def run(host, port, query, nthreads, duration):
+    counts = [0] * nthreads
+    deadline = time.time() + duration
+    threads = [threading.Thread(target=worker,
+                                args=(host, port, query, deadline, counts, i))
+               for i in range(nthreads)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return sum(counts) / float(duration)
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option('--host', default='0.0.0.0')
+    parser.add_option('--port', type='int', default=10041)
+    parser.add_option('--query', default='status')
+    parser.add_option('--duration', type='float', default=3.0)
+    parser.add_option('--threads', default='1,2,4,8,16')
+    opts, _ = parser.parse_args()
+    base = None
+    print('%8s %12s %8s' % ('threads', 'queries/s', 'scale'))
+    for n in [int(v) for v in opts.threads.split(',')]:
+        qps = run(opts.host, opts.port, opts.query, n, opts.duration)
+        base = base or qps
+        print('%8d %12.1f %7.2fx' % (n, qps, qps / base))
+
+
+if __name__ == '__main__':
+    main()
@@ -13,7 +13,14 @@ __all__ = [
 
 import logging
 
-from pyroonga.groonga import *
+try:
+    from pyroonga.groonga import *
+except ImportError:
+    # the C extension is not built. only the HTTP transport is available.
+    pass
+from pyroonga.pool import *
+from pyroonga.gqtp import *
+from pyroonga.http import *
 from pyroonga.exceptions import *
 from pyroonga.odm.attributes import *
 from pyroonga.odm.table import *
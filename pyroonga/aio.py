@@ -0,0 +1,321 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2013 Naoya Inada <naoina@kuune.org>
+# Licensed under the MIT License.
+
+"""asyncio client of groonga
+
+This module requires Python 3.5 or later. :class:`AsyncGroonga` speaks GQTP
+with the groonga server over the streams of :mod:`asyncio`\ , so that an event
+loop can keep many queries in flight without threads::
+
+   grn = AsyncGroonga()
+   result = await grn.query('select Site')
+
+The connection is opened on the first query. :class:`AsyncGroonga` and
+:class:`AsyncGroongaPool` can also be bound to the tables, then use the
+awaitable methods of the queries such as
+:meth:`pyroonga.odm.query.SelectQueryBase.all_async`\ .
+"""
+
+__author__ = "Naoya Inada <naoina@kuune.org>"
+
+__all__ = [
+    'AsyncGroonga', 'AsyncGroongaPool',
+]
+
+import asyncio
+import collections
+import logging
+
+from pyroonga import gqtp, rc
+from pyroonga.exceptions import (GroongaError, GroongaTimeoutError,
+                                 PoolTimeoutError)
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncGroonga(object):
+    """Connection to the groonga server over GQTP for :mod:`asyncio`
+
+    Queries on the same connection are sent one by one. Use
+    :class:`AsyncGroongaPool` to run queries concurrently.
+    """
+
+    connect_on_demand = True
+
+    def __init__(self, host='0.0.0.0', port=10041, encoding='utf-8'):
+        """Construct of AsyncGroonga
+
+        :param host: String of host for connect to groonga server,
+            default is '0.0.0.0'
+        :param port: Port number for connect to groonga server,
+            default is 10041
+        :param encoding: Encoding of groonga. Default is 'utf-8'.
+        """
+        self.host = host
+        self.port = port
+        self.encoding = encoding
+        self._reader = None
+        self._writer = None
+        self._lock = None
+
+    @property
+    def connected(self):
+        return self._writer is not None
+
+    async def connect(self):
+        """Connect to the groonga server
+
+        :raises: :class:`pyroonga.exceptions.GroongaError` if failed to
+            connect
+        """
+        if self.connected:
+            return
+        try:
+            self._reader, self._writer = await asyncio.open_connection(
+                self.host, self.port)
+        except OSError as e:
+            raise GroongaError(rc.CONNECTION_REFUSED, str(e))
+        logger.debug("connected to %s:%d", self.host, self.port)
+
+    def close(self):
+        """Close the connection"""
+        writer, self._reader, self._writer = self._writer, None, None
+        if writer is not None:
+            writer.close()
+
+    async def query(self, qstr, raw=False, timeout=None):
+        """Send and receive the query string to the groonga server
+
+        Same as :meth:`pyroonga.groonga.Groonga.query`\ .
+
+        :param qstr: Query string.
+        :param raw: If True, returns the result as ``bytes``\ .
+        :param timeout: Seconds of timeout of this query. If exceeded, the
+            connection is closed. Default is None, it waits forever.
+        :returns: result of query. ``str`` or ``bytes``\ .
+        :raises: :class:`pyroonga.exceptions.GroongaError` if the query
+            failed, or :class:`pyroonga.exceptions.GroongaTimeoutError` if
+            timed out
+        """
+        status, result = (await self._communicate([qstr], timeout))[0]
+        if status != rc.SUCCESS:
+            raise GroongaError.from_response(status, result, qstr)
+        return result if raw else result.decode(self.encoding)
+
+    async def query_many(self, qstrs, raw=False, timeout=None):
+        """Send the queries at once and receive the results in order
+
+        Same as :meth:`pyroonga.groonga.Groonga.query_many`\ .
+
+        :param qstrs: iterable of query strings
+        :param raw: If True, returns the results as ``bytes``\ .
+        :param timeout: Seconds of timeout of all queries. See :meth:`query`\ .
+        :returns: list of results of queries. If a query failed, the item
+            is an instance of :class:`pyroonga.exceptions.GroongaError`
+            instead.
+        """
+        qstrs = list(qstrs)
+        if not qstrs:
+            return []
+        results = []
+        for qstr, (status, result) in zip(qstrs,
+                                          await self._communicate(qstrs,
+                                                                  timeout)):
+            if status != rc.SUCCESS:
+                result = GroongaError.from_response(status, result, qstr)
+            elif not raw:
+                result = result.decode(self.encoding)
+            results.append(result)
+        return results
+
+    async def _communicate(self, qstrs, timeout=None):
+        try:
+            return await asyncio.wait_for(self._exchange(qstrs), timeout)
+        except asyncio.TimeoutError:
+            # the connection has been closed by the cancellation
+            raise GroongaTimeoutError("timed out in %s seconds" % timeout,
+                                      qstrs[0])
+
+    async def _exchange(self, qstrs):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            await self.connect()
+            try:
+                self._writer.write(b''.join(
+                    gqtp.pack(q.encode(self.encoding)) for q in qstrs))
+                await self._writer.drain()
+                return [(await self._recv()) for _ in qstrs]
+            except (OSError, ValueError, asyncio.IncompleteReadError) as e:
+                self.close()
+                raise GroongaError(rc.SOCKET_IS_NOT_CONNECTED, str(e),
+                                   qstrs[0])
+            except BaseException:
+                # cancelled while the responses are left in the stream
+                self.close()
+                raise
+
+    async def _recv(self):
+        chunks = []
+        while True:
+            header = gqtp.Header.unpack(
+                await self._reader.readexactly(gqtp.HEADER_SIZE))
+            chunks.append(await self._reader.readexactly(header.size))
+            if header.tail:
+                return header.status, b''.join(chunks)
+
+
+class _PoolConnection(object):
+    def __init__(self, pool, timeout):
+        self._pool = pool
+        self._timeout = timeout
+        self._grn = None
+
+    async def __aenter__(self):
+        self._grn = await self._pool.checkout(self._timeout)
+        return self._grn
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self._pool.checkin(self._grn)
+
+
+class AsyncGroongaPool(object):
+    """Pool of :class:`AsyncGroonga` connections
+
+    Each query checks out a connection from the pool, so that the queries
+    run concurrently up to ``maxsize``\ ::
+
+       pool = AsyncGroongaPool(maxsize=100)
+       Table.bind(pool)
+       results = await asyncio.gather(*[Table.select(title=w).all_async()
+                                        for w in words])
+    """
+
+    connect_on_demand = True
+
+    def __init__(self, host='0.0.0.0', port=10041, encoding='utf-8',
+                 maxsize=10, timeout=30):
+        """Construct of AsyncGroongaPool
+
+        :param host: String of host for connect to groonga server,
+            default is '0.0.0.0'
+        :param port: Port number for connect to groonga server,
+            default is 10041
+        :param encoding: Encoding of groonga. Default is 'utf-8'.
+        :param maxsize: Maximum number of connections. Default is 10.
+        :param timeout: Seconds to wait for a connection to be checked in
+            when all connections are in use. None means wait forever.
+            Default is 30.
+        """
+        if maxsize < 1:
+            raise ValueError("invalid pool size: maxsize=%r" % maxsize)
+        self.host = host
+        self.port = port
+        self.encoding = encoding
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self._idle = collections.deque()
+        self._size = 0
+        self._sem = None
+
+    @property
+    def connected(self):
+        return self._size > 0
+
+    @property
+    def size(self):
+        """Number of connections that are opened by this pool"""
+        return self._size
+
+    @property
+    def idle(self):
+        """Number of connections that are not checked out"""
+        return len(self._idle)
+
+    def close(self):
+        """Close the all idle connections"""
+        while self._idle:
+            self._idle.pop().close()
+            self._size -= 1
+
+    async def checkout(self, timeout=None):
+        """Check out a connection from the pool
+
+        The connection must be returned to the pool by :meth:`checkin`\ .
+
+        :param timeout: Seconds to wait for a connection. Default is
+            :attr:`timeout`\ .
+        :returns: :class:`AsyncGroonga`
+        :raises: :class:`pyroonga.exceptions.PoolTimeoutError` if no
+            connection is checked in within ``timeout``
+        """
+        if timeout is None:
+            timeout = self.timeout
+        if self._sem is None:
+            self._sem = asyncio.BoundedSemaphore(self.maxsize)
+        if timeout is None or not self._sem.locked():
+            await self._sem.acquire()
+        else:
+            try:
+                await asyncio.wait_for(self._sem.acquire(), timeout)
+            except asyncio.TimeoutError:
+                raise PoolTimeoutError(
+                    "all of %d connections are in use" % self.maxsize)
+        if self._idle:
+            return self._idle.pop()
+        grn = AsyncGroonga(self.host, self.port, self.encoding)
+        try:
+            await grn.connect()
+        except BaseException:
+            self._sem.release()
+            raise
+        self._size += 1
+        return grn
+
+    def checkin(self, grn):
+        """Return the connection to the pool
+
+        The connection is discarded if it is not connected.
+
+        :param grn: :class:`AsyncGroonga` that was checked out
+        """
+        if grn.connected:
+            self._idle.append(grn)
+        else:
+            self._size -= 1
+        self._sem.release()
+
+    def connection(self, timeout=None):
+        """Asynchronous context manager that checks out and checks in a
+        connection
+
+        e.g.::
+
+           async with pool.connection() as grn:
+               await grn.query('status')
+
+        :param timeout: see :meth:`checkout`
+        """
+        return _PoolConnection(self, timeout)
+
+    async def query(self, qstr, raw=False, timeout=None):
+        """Same as :meth:`AsyncGroonga.query` on a connection checked out
+        from the pool
+        """
+        async with self.connection() as grn:
+            return await grn.query(qstr, raw=raw, timeout=timeout)
+
+    async def query_many(self, qstrs, raw=False, timeout=None):
+        """Same as :meth:`AsyncGroonga.query_many` on a connection checked
+        out from the pool
+        """
+        async with self.connection() as grn:
+            return await grn.query_many(qstrs, raw=raw, timeout=timeout)
+
+
+async def then(awaitable, func):
+    """Await ``awaitable`` and returns the result applied to ``func``"""
+    return func(await awaitable)
+
@@ -5,81 +5,81 @@
 
 __author__ = "Naoya Inada <naoina@kuune.org>"
 
-import _groonga
+from pyroonga import rc, utils
 
 error_messages = {
-    _groonga.END_OF_DATA: "end of data",
-    _groonga.UNKNOWN_ERROR: "unknown error",
-    _groonga.OPERATION_NOT_PERMITTED: "operation not permitted",
-    _groonga.NO_SUCH_FILE_OR_DIRECTORY: "no such file or directory",
-    _groonga.NO_SUCH_PROCESS: "no such process",
-    _groonga.INTERRUPTED_FUNCTION_CALL: "interrupted function call",
-    _groonga.INPUT_OUTPUT_ERROR: "input output error",
-    _groonga.NO_SUCH_DEVICE_OR_ADDRESS: "no such device or address",
-    _groonga.ARG_LIST_TOO_LONG: "arg list too long",
-    _groonga.EXEC_FORMAT_ERROR: "exec format error",
-    _groonga.BAD_FILE_DESCRIPTOR: "bad file descriptor",
-    _groonga.NO_CHILD_PROCESSES: "no child processes",
-    _groonga.RESOURCE_TEMPORARILY_UNAVAILABLE: "resource temporarily unavailable",
-    _groonga.NOT_ENOUGH_SPACE: "not enough space",
-    _groonga.PERMISSION_DENIED: "permission denied",
-    _groonga.BAD_ADDRESS: "bad address",
-    _groonga.RESOURCE_BUSY: "resource busy",
-    _groonga.FILE_EXISTS: "file exists",
-    _groonga.IMPROPER_LINK: "improper link",
-    _groonga.NO_SUCH_DEVICE: "no such device",
-    _groonga.NOT_A_DIRECTORY: "not a directory",
-    _groonga.IS_A_DIRECTORY: "is a directory",
-    _groonga.INVALID_ARGUMENT: "invalid argument",
-    _groonga.TOO_MANY_OPEN_FILES_IN_SYSTEM: "too many open files in system",
-    _groonga.TOO_MANY_OPEN_FILES: "too many open files",
-    _groonga.INAPPROPRIATE_I_O_CONTROL_OPERATION: "inappropriate i o control operation",
-    _groonga.FILE_TOO_LARGE: "file too large",
-    _groonga.NO_SPACE_LEFT_ON_DEVICE: "no space left on device",
-    _groonga.INVALID_SEEK: "invalid seek",
-    _groonga.READ_ONLY_FILE_SYSTEM: "read only file system",
-    _groonga.TOO_MANY_LINKS: "too many links",
-    _groonga.BROKEN_PIPE: "broken pipe",
-    _groonga.DOMAIN_ERROR: "domain error",
-    _groonga.RESULT_TOO_LARGE: "result too large",
-    _groonga.RESOURCE_DEADLOCK_AVOIDED: "resource deadlock avoided",
-    _groonga.NO_MEMORY_AVAILABLE: "no memory available",
-    _groonga.FILENAME_TOO_LONG: "filename too long",
-    _groonga.NO_LOCKS_AVAILABLE: "no locks available",
-    _groonga.FUNCTION_NOT_IMPLEMENTED: "function not implemented",
-    _groonga.DIRECTORY_NOT_EMPTY: "directory not empty",
-    _groonga.ILLEGAL_BYTE_SEQUENCE: "illegal byte sequence",
-    _groonga.SOCKET_NOT_INITIALIZED: "socket not initialized",
-    _groonga.OPERATION_WOULD_BLOCK: "operation would block",
-    _groonga.ADDRESS_IS_NOT_AVAILABLE: "address is not available",
-    _groonga.NETWORK_IS_DOWN: "network is down",
-    _groonga.NO_BUFFER: "no buffer",
-    _groonga.SOCKET_IS_ALREADY_CONNECTED: "socket is already connected",
-    _groonga.SOCKET_IS_NOT_CONNECTED: "socket is not connected",
-    _groonga.SOCKET_IS_ALREADY_SHUTDOWNED: "socket is already shutdowned",
-    _groonga.OPERATION_TIMEOUT: "operation timeout",
-    _groonga.CONNECTION_REFUSED: "connection refused",
-    _groonga.RANGE_ERROR: "range error",
-    _groonga.TOKENIZER_ERROR: "tokenizer error",
-    _groonga.FILE_CORRUPT: "file corrupt",
-    _groonga.INVALID_FORMAT: "invalid format",
-    _groonga.OBJECT_CORRUPT: "object corrupt",
-    _groonga.TOO_MANY_SYMBOLIC_LINKS: "too many symbolic links",
-    _groonga.NOT_SOCKET: "not socket",
-    _groonga.OPERATION_NOT_SUPPORTED: "operation not supported",
-    _groonga.ADDRESS_IS_IN_USE: "address is in use",
-    _groonga.ZLIB_ERROR: "zlib error",
-    _groonga.LZO_ERROR: "lzo error",
-    _groonga.STACK_OVER_FLOW: "stack over flow",
-    _groonga.SYNTAX_ERROR: "syntax error",
-    _groonga.RETRY_MAX: "retry max",
-    _groonga.INCOMPATIBLE_FILE_FORMAT: "incompatible file format",
-    _groonga.UPDATE_NOT_ALLOWED: "update not allowed",
-    _groonga.TOO_SMALL_OFFSET: "too small offset",
-    _groonga.TOO_LARGE_OFFSET: "too large offset",
-    _groonga.TOO_SMALL_LIMIT: "too small limit",
-    _groonga.CAS_ERROR: "cas error",
-    _groonga.UNSUPPORTED_COMMAND_VERSION: "unsupported command version",
+    rc.END_OF_DATA: "end of data",
+    rc.UNKNOWN_ERROR: "unknown error",
+    rc.OPERATION_NOT_PERMITTED: "operation not permitted",
+    rc.NO_SUCH_FILE_OR_DIRECTORY: "no such file or directory",
+    rc.NO_SUCH_PROCESS: "no such process",
+    rc.INTERRUPTED_FUNCTION_CALL: "interrupted function call",
+    rc.INPUT_OUTPUT_ERROR: "input output error",
+    rc.NO_SUCH_DEVICE_OR_ADDRESS: "no such device or address",
+    rc.ARG_LIST_TOO_LONG: "arg list too long",
+    rc.EXEC_FORMAT_ERROR: "exec format error",
+    rc.BAD_FILE_DESCRIPTOR: "bad file descriptor",
+    rc.NO_CHILD_PROCESSES: "no child processes",
+    rc.RESOURCE_TEMPORARILY_UNAVAILABLE: "resource temporarily unavailable",
+    rc.NOT_ENOUGH_SPACE: "not enough space",
+    rc.PERMISSION_DENIED: "permission denied",
+    rc.BAD_ADDRESS: "bad address",
+    rc.RESOURCE_BUSY: "resource busy",
+    rc.FILE_EXISTS: "file exists",
+    rc.IMPROPER_LINK: "improper link",
+    rc.NO_SUCH_DEVICE: "no such device",
+    rc.NOT_A_DIRECTORY: "not a directory",
+    rc.IS_A_DIRECTORY: "is a directory",
+    rc.INVALID_ARGUMENT: "invalid argument",
+    rc.TOO_MANY_OPEN_FILES_IN_SYSTEM: "too many open files in system",
+    rc.TOO_MANY_OPEN_FILES: "too many open files",
+    rc.INAPPROPRIATE_I_O_CONTROL_OPERATION: "inappropriate i o control operation",
+    rc.FILE_TOO_LARGE: "file too large",
+    rc.NO_SPACE_LEFT_ON_DEVICE: "no space left on device",
+    rc.INVALID_SEEK: "invalid seek",
+    rc.READ_ONLY_FILE_SYSTEM: "read only file system",
+    rc.TOO_MANY_LINKS: "too many links",
+    rc.BROKEN_PIPE: "broken pipe",
+    rc.DOMAIN_ERROR: "domain error",
+    rc.RESULT_TOO_LARGE: "result too large",
+    rc.RESOURCE_DEADLOCK_AVOIDED: "resource deadlock avoided",
+    rc.NO_MEMORY_AVAILABLE: "no memory available",
+    rc.FILENAME_TOO_LONG: "filename too long",
+    rc.NO_LOCKS_AVAILABLE: "no locks available",
+    rc.FUNCTION_NOT_IMPLEMENTED: "function not implemented",
+    rc.DIRECTORY_NOT_EMPTY: "directory not empty",
+    rc.ILLEGAL_BYTE_SEQUENCE: "illegal byte sequence",
+    rc.SOCKET_NOT_INITIALIZED: "socket not initialized",
+    rc.OPERATION_WOULD_BLOCK: "operation would block",
+    rc.ADDRESS_IS_NOT_AVAILABLE: "address is not available",
+    rc.NETWORK_IS_DOWN: "network is down",
+    rc.NO_BUFFER: "no buffer",
+    rc.SOCKET_IS_ALREADY_CONNECTED: "socket is already connected",
+    rc.SOCKET_IS_NOT_CONNECTED: "socket is not connected",
+    rc.SOCKET_IS_ALREADY_SHUTDOWNED: "socket is already shutdowned",
+    rc.OPERATION_TIMEOUT: "operation timeout",
+    rc.CONNECTION_REFUSED: "connection refused",
+    rc.RANGE_ERROR: "range error",
+    rc.TOKENIZER_ERROR: "tokenizer error",
+    rc.FILE_CORRUPT: "file corrupt",
+    rc.INVALID_FORMAT: "invalid format",
+    rc.OBJECT_CORRUPT: "object corrupt",
+    rc.TOO_MANY_SYMBOLIC_LINKS: "too many symbolic links",
+    rc.NOT_SOCKET: "not socket",
+    rc.OPERATION_NOT_SUPPORTED: "operation not supported",
+    rc.ADDRESS_IS_IN_USE: "address is in use",
+    rc.ZLIB_ERROR: "zlib error",
+    rc.LZO_ERROR: "lzo error",
+    rc.STACK_OVER_FLOW: "stack over flow",
+    rc.SYNTAX_ERROR: "syntax error",
+    rc.RETRY_MAX: "retry max",
+    rc.INCOMPATIBLE_FILE_FORMAT: "incompatible file format",
+    rc.UPDATE_NOT_ALLOWED: "update not allowed",
+    rc.TOO_SMALL_OFFSET: "too small offset",
+    rc.TOO_LARGE_OFFSET: "too large offset",
+    rc.TOO_SMALL_LIMIT: "too small limit",
+    rc.CAS_ERROR: "cas error",
+    rc.UNSUPPORTED_COMMAND_VERSION: "unsupported command version",
     }
 
 
@@ -89,8 +89,49 @@ class GroongaError(Exception):
         self.reason = reason
         self.cause = cause
 
+    @classmethod
+    def from_response(cls, rc, body, query):
+        """Create the error from the response of groonga
+
+        :param rc: return code of groonga
+        :param body: response body. The reason is taken from it if it is a
+            header of groonga in JSON or MessagePack.
+        :param query: query string that caused the error
+        :returns: :class:`GroongaError`
+        """
+        for output_type in utils.output_types:
+            try:
+                reason = utils.loads(body, output_type)[0][3]
+                break
+            except (ImportError, IndexError, KeyError, ValueError,
+                    TypeError):
+                pass
+        else:
+            reason = body
+            if isinstance(reason, bytes):
+                reason = reason.decode('utf-8', 'replace')
+        return cls(rc, reason, query)
+
     def __str__(self):
         msg = "%s: %s" % (self.errmsg, self.reason)
         if self.cause:
             msg += ", query is `%s`" % self.cause
         return msg
+
+
+class GroongaTimeoutError(GroongaError):
+    """Raised when a query doesn't finish within timeout
+
+    The connection that was used by the query is discarded.
+    """
+
+    def __init__(self, reason="", cause=""):
+        super(GroongaTimeoutError, self).__init__(rc.OPERATION_TIMEOUT,
+                                                  reason, cause)
+
+
+class PoolTimeoutError(GroongaTimeoutError):
+    """Raised when no connection of the pool is available within timeout"""
+
+    def __init__(self, reason=""):
+        super(PoolTimeoutError, self).__init__(reason)
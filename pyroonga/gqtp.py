@@ -0,0 +1,455 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2013 Naoya Inada <naoina@kuune.org>
+# Licensed under the MIT License.
+
+"""GQTP (Groonga Query Transfer Protocol) framing
+
+A packet of GQTP consists of the 24 bytes header and the body::
+
+   protocol   uint8   always 0xc7
+   query_type uint8   content type of the body
+   key_length uint16
+   level      uint8
+   flags      uint8   MORE, TAIL, HEAD, QUIET or QUIT
+   status     int16   return code of groonga
+   size       uint32  size of the body
+   opaque     uint32
+   cas        uint64
+
+All fields are big-endian.
+
+:class:`GroongaGQTP` is a client of GQTP written in pure Python. Unlike
+:class:`pyroonga.groonga.Groonga`\ , it supports the timeout of each query,
+and :func:`fanout` sends the queries to many servers and waits for all of
+them at once in one thread::
+
+   nodes = [GroongaGQTP(host) for host in hosts]
+   results = fanout([(grn, 'select Site') for grn in nodes], timeout=1.0)
+"""
+
+__author__ = "Naoya Inada <naoina@kuune.org>"
+
+__all__ = [
+    'GroongaGQTP', 'GroongaGQTPPool', 'fanout',
+]
+
+import codecs
+import collections
+import logging
+import select
+import socket
+import struct
+
+try:
+    import selectors
+except ImportError:
+    selectors = None
+
+from pyroonga import rc, utils
+from pyroonga.exceptions import GroongaError, GroongaTimeoutError
+from pyroonga.pool import GroongaPool
+
+logger = logging.getLogger(__name__)
+
+PROTOCOL = 0xc7
+
+# query_type
+CONTENT_NONE = 0
+CONTENT_TSV = 1
+CONTENT_JSON = 2
+CONTENT_XML = 3
+CONTENT_MSGPACK = 4
+
+# flags
+MORE = 0x01
+TAIL = 0x02
+HEAD = 0x04
+QUIET = 0x08
+QUIT = 0x10
+
+_header = struct.Struct('!BBHBBhIIQ')
+
+HEADER_SIZE = _header.size
+
+# size of receiving at once
+CHUNK_SIZE = 65536
+
+
+class Header(collections.namedtuple('Header', 'query_type flags status size')):
+    """Header of GQTP packet"""
+
+    __slots__ = ()
+
+    @classmethod
+    def unpack(cls, data):
+        """Unpack the header
+
+        :param data: ``bytes`` of :const:`HEADER_SIZE` length
+        :returns: :class:`Header`
+        :raises: ValueError if ``data`` isn't a header of GQTP
+        """
+        (protocol, query_type, _, _, flags, status, size, _,
+         _) = _header.unpack(data)
+        if protocol != PROTOCOL:
+            raise ValueError("invalid protocol of GQTP: 0x%02x" % protocol)
+        return cls(query_type, flags, status, size)
+
+    @property
+    def tail(self):
+        """True if this packet is the last of the response"""
+        return bool(self.flags & TAIL)
+
+
+def pack(body, flags=TAIL, status=0, query_type=CONTENT_NONE):
+    """Pack the body into a GQTP packet
+
+    :param body: ``bytes`` of body
+    :param flags: flags of header. Default is :const:`TAIL`\ .
+    :param status: return code of groonga. Default is 0.
+    :param query_type: content type of body. Default is
+        :const:`CONTENT_NONE`\ .
+    :returns: ``bytes`` of packet
+    """
+    return _header.pack(PROTOCOL, query_type, 0, 0, flags, status, len(body),
+                        0, 0) + body
+
+
+class Parser(object):
+    """Incremental parser of GQTP packets"""
+
+    def __init__(self):
+        self._buf = bytearray()
+        self._header = None
+
+    def feed(self, data):
+        """Feed the received data
+
+        :param data: ``bytes`` received from the server
+        :returns: list of tuple of :class:`Header` and ``bytes`` of body of
+            the packets completed by ``data``
+        """
+        buf = self._buf
+        buf.extend(data)
+        packets = []
+        while True:
+            if self._header is None:
+                if len(buf) < HEADER_SIZE:
+                    break
+                self._header = Header.unpack(bytes(buf[:HEADER_SIZE]))
+                del buf[:HEADER_SIZE]
+            size = self._header.size
+            if len(buf) < size:
+                break
+            packets.append((self._header, bytes(buf[:size])))
+            del buf[:size]
+            self._header = None
+        return packets
+
+
+class GroongaGQTP(object):
+    """Connection to the groonga server over GQTP in pure Python
+
+    This has the same interface as :class:`pyroonga.groonga.Groonga` and can
+    be bound to the tables.
+    """
+
+    def __init__(self, host='0.0.0.0', port=10041, encoding='utf-8',
+                 timeout=None):
+        """Construct of GroongaGQTP
+
+        :param host: String of host for connect to groonga server,
+            default is '0.0.0.0'
+        :param port: Port number for connect to groonga server,
+            default is 10041
+        :param encoding: Encoding of groonga. Default is 'utf-8'.
+        :param timeout: Default seconds of timeout of connect and each query.
+            None means wait forever. Default is None.
+        """
+        self.host = host
+        self.port = port
+        self.encoding = encoding
+        self.timeout = timeout
+        self.connected = False
+        self._sock = None
+        self._parser = None
+
+    def fileno(self):
+        return self._sock.fileno()
+
+    def connect(self):
+        """Connect to the groonga server
+
+        :raises: :class:`pyroonga.exceptions.GroongaError` if failed to
+            connect
+        """
+        self.close()
+        try:
+            sock = socket.create_connection((self.host, self.port),
+                                            self.timeout)
+        except socket.timeout as e:
+            raise GroongaTimeoutError(str(e))
+        except socket.error as e:
+            raise GroongaError(rc.CONNECTION_REFUSED, str(e))
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._sock = sock
+        self._parser = Parser()
+        self.connected = True
+
+    def close(self):
+        """Close the connection"""
+        sock, self._sock = self._sock, None
+        if sock is not None:
+            sock.close()
+        self.connected = False
+
+    def query(self, qstr, raw=False, timeout=None):
+        """Send and receive the query string to the groonga server
+
+        Same as :meth:`pyroonga.groonga.Groonga.query`\ .
+
+        :param qstr: Query string.
+        :param raw: If True, returns the result as ``bytes``\ .
+        :param timeout: Seconds of timeout of this query. Default is
+            :attr:`timeout`\ .
+        :returns: result of query. ``str`` or ``bytes``\ .
+        :raises: :class:`pyroonga.exceptions.GroongaError` if the query
+            failed, or :class:`pyroonga.exceptions.GroongaTimeoutError` if
+            timed out
+        """
+        result = b''.join(self.query_iter(qstr, raw=True, timeout=timeout))
+        return result if raw else result.decode(self.encoding)
+
+    def query_iter(self, qstr, raw=False, timeout=None):
+        """Send the query and iterate the chunks of the result
+
+        Same as :meth:`pyroonga.groonga.Groonga.query_iter`\ .
+
+        :param qstr: Query string.
+        :param raw: If True, yields the chunks as ``bytes``\ .
+        :param timeout: Seconds of timeout of this query. Default is
+            :attr:`timeout`\ .
+        :returns: iterator of chunks of result of query
+        """
+        deadline = utils.deadline(self.timeout if timeout is None else timeout)
+        self._send([qstr], deadline)
+        decoder = codecs.getincrementaldecoder(self.encoding)()
+        finished = False
+        try:
+            for header, body in self._recv_packets(qstr, deadline):
+                if header.status != rc.SUCCESS:
+                    if not header.tail:
+                        body += b''.join(b for _, b in
+                                         self._recv_packets(qstr, deadline))
+                    finished = True
+                    raise GroongaError.from_response(header.status, body,
+                                                     qstr)
+                if body:
+                    yield body if raw else decoder.decode(body)
+                if header.tail:
+                    break
+            if not raw:
+                rest = decoder.decode(b'', True)
+                if rest:
+                    yield rest
+            finished = True
+        finally:
+            if not finished:
+                # the rest of the response is left in the connection
+                self.close()
+
+    def query_many(self, qstrs, raw=False, timeout=None):
+        """Send the queries at once and receive the results in order
+
+        Same as :meth:`pyroonga.groonga.Groonga.query_many`\ .
+
+        :param qstrs: iterable of query strings
+        :param raw: If True, returns the results as ``bytes``\ .
+        :param timeout: Seconds of timeout of all queries. Default is
+            :attr:`timeout`\ .
+        :returns: list of results of queries. If a query failed, the item
+            is an instance of :class:`pyroonga.exceptions.GroongaError`
+            instead.
+        """
+        return fanout([(self, qstr) for qstr in qstrs], raw=raw,
+                      timeout=self.timeout if timeout is None else timeout)
+
+    def _send(self, qstrs, deadline):
+        if not self.connected:
+            self.connect()
+        data = b''.join(pack(q.encode(self.encoding)) for q in qstrs)
+        try:
+            self._sock.settimeout(utils.remaining(deadline))
+            self._sock.sendall(data)
+        except socket.timeout as e:
+            self.close()
+            raise GroongaTimeoutError(str(e), qstrs[0])
+        except socket.error as e:
+            self.close()
+            raise GroongaError(rc.SOCKET_IS_NOT_CONNECTED, str(e), qstrs[0])
+
+    def _recv(self, qstr, deadline):
+        try:
+            self._sock.settimeout(utils.remaining(deadline))
+            data = self._sock.recv(CHUNK_SIZE)
+        except socket.timeout as e:
+            self.close()
+            raise GroongaTimeoutError(str(e), qstr)
+        except socket.error as e:
+            self.close()
+            raise GroongaError(rc.SOCKET_IS_NOT_CONNECTED, str(e), qstr)
+        if not data:
+            self.close()
+            raise GroongaError(rc.SOCKET_IS_NOT_CONNECTED,
+                               "connection closed by server", qstr)
+        try:
+            return self._parser.feed(data)
+        except ValueError as e:
+            self.close()
+            raise GroongaError(rc.INVALID_FORMAT, str(e), qstr)
+
+    def _recv_packets(self, qstr, deadline):
+        while True:
+            for header, body in self._recv(qstr, deadline):
+                yield header, body
+                if header.tail:
+                    return
+
+
+class GroongaGQTPPool(GroongaPool):
+    """Thread-safe pool of :class:`GroongaGQTP` connections
+
+    See also :class:`pyroonga.pool.GroongaPool`\ .
+    """
+
+    def __init__(self, host='0.0.0.0', port=10041, encoding='utf-8',
+                 query_timeout=None, **kwargs):
+        """Construct of GroongaGQTPPool
+
+        :param query_timeout: see ``timeout`` of :class:`GroongaGQTP`
+        :param kwargs: see :class:`pyroonga.pool.GroongaPool`
+        """
+        super(GroongaGQTPPool, self).__init__(host, port, encoding, **kwargs)
+        self.query_timeout = query_timeout
+
+    def _create(self):
+        return GroongaGQTP(self.host, self.port, self.encoding,
+                           timeout=self.query_timeout)
+
+
+_SelectorKey = collections.namedtuple('_SelectorKey', 'fileobj data')
+
+
+class _Selector(object):
+    """Minimal :class:`selectors.DefaultSelector` by :func:`select.select`
+    for Python that doesn't have :mod:`selectors`
+    """
+
+    def __init__(self):
+        self._map = {}
+
+    def register(self, fileobj, events, data=None):
+        self._map[fileobj.fileno()] = _SelectorKey(fileobj, data)
+
+    def unregister(self, fileobj):
+        # fileobj may be already closed
+        for fd, key in list(self._map.items()):
+            if key.fileobj is fileobj:
+                del self._map[fd]
+
+    def select(self, timeout=None):
+        readable, _, _ = select.select(list(self._map), [], [], timeout)
+        return [(self._map[fd], None) for fd in readable]
+
+    def get_map(self):
+        return self._map
+
+    def close(self):
+        self._map.clear()
+
+
+def fanout(requests, raw=False, timeout=None):
+    """Send the queries to many servers and wait for all of the results
+
+    All queries are sent at first, then the responses are received as they
+    arrive by :mod:`selectors`\ . Queries to the same connection are
+    pipelined.
+
+    :param requests: iterable of tuple of :class:`GroongaGQTP` and query
+        string
+    :param raw: If True, returns the results as ``bytes``\ .
+    :param timeout: Seconds of timeout of all queries. None means wait
+        forever. Default is None.
+    :returns: list of results in order of ``requests``\ . If a query failed,
+        the item is an instance of :class:`pyroonga.exceptions.GroongaError`
+        instead, or :class:`pyroonga.exceptions.GroongaTimeoutError` if timed
+        out. The connections that timed out are closed.
+    """
+    requests = list(requests)
+    results = [None] * len(requests)
+    # indexes of requests by connection. connections are in order of the
+    # first request of them
+    pending = {}
+    conns = []
+    for i, (grn, qstr) in enumerate(requests):
+        if grn not in pending:
+            pending[grn] = collections.deque()
+            conns.append(grn)
+        pending[grn].append(i)
+    deadline = utils.deadline(timeout)
+    sel = selectors.DefaultSelector() if selectors else _Selector()
+    chunks = {}
+    try:
+        for grn in conns:
+            idxs = pending[grn]
+            try:
+                grn._send([requests[i][1] for i in idxs], deadline)
+            except GroongaError as e:
+                for i in idxs:
+                    results[i] = e
+                idxs.clear()
+                continue
+            chunks[grn] = []
+            sel.register(grn._sock, getattr(selectors, 'EVENT_READ', 1), grn)
+        while sel.get_map():
+            remaining = utils.remaining(deadline)
+            if remaining == 0:
+                break
+            for key, _ in sel.select(remaining):
+                grn = key.data
+                idxs = pending[grn]
+                try:
+                    packets = grn._recv(requests[idxs[0]][1], None)
+                except GroongaError as e:
+                    sel.unregister(key.fileobj)
+                    for i in idxs:
+                        results[i] = e
+                    idxs.clear()
+                    continue
+                for header, body in packets:
+                    chunks[grn].append(body)
+                    if not header.tail:
+                        continue
+                    i = idxs.popleft()
+                    result = b''.join(chunks[grn])
+                    chunks[grn] = []
+                    if header.status != rc.SUCCESS:
+                        result = GroongaError.from_response(
+                            header.status, result, requests[i][1])
+                    elif not raw:
+                        result = result.decode(grn.encoding)
+                    results[i] = result
+                if not idxs:
+                    sel.unregister(key.fileobj)
+    finally:
+        sel.close()
+        for grn, idxs in pending.items():
+            if idxs:
+                # the rest of the responses are left in the connection
+                logger.debug("discard %s:%s", grn.host, grn.port)
+                grn.close()
+    for idxs in pending.values():
+        for i in idxs:
+            results[i] = GroongaTimeoutError(
+                "timed out in %s seconds" % timeout, requests[i][1])
+    return results
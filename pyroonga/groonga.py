@@ -9,16 +9,31 @@ __all__ = [
     'Groonga',
 ]
 
-import json
+import codecs
 import logging
+import os
 
 import _groonga
-from pyroonga.exceptions import GroongaError
+from pyroonga import utils
+from pyroonga.exceptions import GroongaError, GroongaTimeoutError
 
 logger = logging.getLogger(__name__)
 
 DEFAULT_ENCODING = _groonga.ENC_UTF8
 
+# errors that the connection can no longer be used
+connection_errors = frozenset((
+    _groonga.BROKEN_PIPE,
+    _groonga.SOCKET_NOT_INITIALIZED,
+    _groonga.ADDRESS_IS_NOT_AVAILABLE,
+    _groonga.NETWORK_IS_DOWN,
+    _groonga.SOCKET_IS_NOT_CONNECTED,
+    _groonga.SOCKET_IS_ALREADY_SHUTDOWNED,
+    _groonga.OPERATION_TIMEOUT,
+    _groonga.CONNECTION_REFUSED,
+    _groonga.NOT_SOCKET,
+    ))
+
 encodings = {
     'utf-8': _groonga.ENC_UTF8,
     'euc-jp': _groonga.ENC_EUC_JP,
@@ -41,7 +56,8 @@ class Context(_groonga.Context):
 
 
 class Groonga(object):
-    def __init__(self, host='0.0.0.0', port=10041, encoding='utf-8'):
+    def __init__(self, host='0.0.0.0', port=10041, encoding='utf-8',
+                 path=None):
         """Constructor a Groonga.
 
         :param host: String of host for connect to groonga server,
@@ -50,55 +66,194 @@ class Groonga(object):
             default is 10041
         :param encoding: Encoding of groonga. Supported values are 'utf-8',
             'euc-jp', 'sjis', 'latin1' and 'koi8-r'. Default is 'utf-8'.
+        :param path: String of path of the local database. If given, the
+            queries are executed in-process without the groonga server
+            (embedded mode). Default is None.
         """
         self.host = host
         self.port = port
         self.encoding = encoding
+        self.path = path
         self._ctx = Context(encoding)
         self.connected = False
 
+    @property
+    def embedded(self):
+        """True if this object uses the local database (embedded mode)"""
+        return self.path is not None
+
     def connect(self, host=None, port=None):
         """Connect to the groonga server
 
+        In embedded mode, open the local database instead.
+        See also :meth:`open`\ .
+
         :param host: String of server hostname, If temporarily needed
         :param port: Integer of server port number, If temporarily needed
         """
+        if self.embedded:
+            return self.open()
         host = host or self.host
         port = port or self.port
         rc = self._ctx.connect(host, port, flags=0)
         self._raise_if_notsuccess(rc, "", "")
         self.connected = True
 
+    def open(self, path=None):
+        """Open the local database in embedded mode
+
+        The database will be created if it does not exist.
+
+        :param path: String of database path. Default is :attr:`path`
+        """
+        path = path or self.path
+        if path is None:
+            raise ValueError("path of database is not specified")
+        if os.path.exists(path):
+            rc = self._ctx.db_open(path)
+        else:
+            rc = self._ctx.db_create(path)
+        self._raise_if_notsuccess(rc, "", "")
+        self.path = path
+        self.connected = True
+
+    def close(self):
+        """Close the connection to the groonga server
+
+        In embedded mode, close the local database instead. Call
+        :meth:`connect` to use this object again.
+        """
+        del self._ctx
+        self._ctx = Context(self.encoding)
+        self.connected = False
+
     def reconnect(self):
         """Reconnect to the groonga server
+
+        In embedded mode, reopen the local database instead.
         """
         del self._ctx
         self._ctx = Context(self.encoding)
         self.connect(self.host, self.port)
 
-    def query(self, qstr):
+    def query(self, qstr, raw=False, timeout=None):
         """Send and receive the query string to the groonga server
 
+        In embedded mode, the query is executed in-process.
+
         :param qstr: Query string.
+        :param raw: If True, returns the result as ``bytes`` without
+            decoding. Default is False.
+        :param timeout: Seconds of timeout of this query. See
+            :meth:`query_iter`\ . Default is None.
         :returns: Result string.
         """
+        result = b''.join(self.query_iter(qstr, raw=True, timeout=timeout))
+        return result if raw else result.decode(self.encoding)
+
+    def query_iter(self, qstr, raw=False, timeout=None):
+        """Send the query string and iterate the chunks of result
+
+        groonga may split a large result into several chunks. Each chunk is
+        yielded as soon as it is received. Note that a chunk is not
+        necessarily a boundary of JSON value.
+
+        If the iteration is stopped before the last chunk, the rest of the
+        result will be discarded by reconnecting.
+
+        :param qstr: Query string.
+        :param raw: If True, yields the chunks as ``bytes`` without decoding.
+            Default is False.
+        :param timeout: Seconds of timeout of this query. If the query
+            doesn't finish within it, the connection is discarded and
+            :class:`pyroonga.exceptions.GroongaTimeoutError` is raised. Call
+            :meth:`reconnect` to use this object again. Not supported in
+            embedded mode. Default is None, it waits forever.
+        :returns: Iterator of chunks of result string.
+        """
         if not self.connected:
             raise GroongaError(_groonga.SOCKET_IS_NOT_CONNECTED)
+        if timeout is not None and self.embedded:
+            raise ValueError("timeout is not supported in embedded mode")
         logger.debug(qstr)
-        self._ctx.send(qstr, flags=0)
-        rc, result, flags = self._ctx.recv()
+        if not raw:
+            decoder = codecs.getincrementaldecoder(self.encoding)()
+        deadline = utils.deadline(timeout)
+        ctx = self._ctx
+        rc = ctx.send(qstr, flags=0, deadline=deadline)
+        self._raise_if_timeout(deadline, rc, qstr)
+        more = True
         try:
-            self._raise_if_notsuccess(rc, result, qstr)
-        except GroongaError:
-            self.reconnect()
+            while more:
+                rc, result, flags = ctx.recv_bytes(deadline=deadline)
+                self._raise_if_timeout(deadline, rc, qstr)
+                self._raise_if_notsuccess(rc, result, qstr)
+                more = bool(flags & _groonga.CTX_MORE)
+                if not raw:
+                    result = decoder.decode(result, not more)
+                yield result
+        except GroongaTimeoutError:
+            # the context has been discarded already
+            more = False
             raise
-        return result
+        finally:
+            if more:
+                self.reconnect()
+
+    def query_many(self, qstrs, raw=False, timeout=None):
+        """Send the query strings at once and receive the results in order
+
+        All queries are written back-to-back before receiving the results,
+        so that the round trip to the groonga server is paid only once.
+        Note that the results are held in memory until all of them are
+        received.
+
+        An error of a query doesn't affect the other queries, and it doesn't
+        tear down the connection unless the connection itself is broken.
+
+        :param qstrs: iterable of query strings.
+        :param raw: If True, returns the results as ``bytes`` without
+            decoding. Default is False.
+        :param timeout: Seconds of timeout of all queries. See
+            :meth:`query_iter`\ . Default is None.
+        :returns: list of result strings. If a query fails, the item is an
+            instance of :class:`pyroonga.exceptions.GroongaError` instead.
+        """
+        if not self.connected:
+            raise GroongaError(_groonga.SOCKET_IS_NOT_CONNECTED)
+        if timeout is not None and self.embedded:
+            raise ValueError("timeout is not supported in embedded mode")
+        qstrs = list(qstrs)
+        commands = []
+        for qstr in qstrs:
+            logger.debug(qstr)
+            commands.append(utils.to_text(qstr).encode(self.encoding))
+        results = []
+        broken = False
+        deadline = utils.deadline(timeout)
+        responses = self._ctx.query_many(commands, deadline=deadline)
+        for qstr, (rc, result) in zip(qstrs, responses):
+            self._raise_if_timeout(deadline, rc, qstr)
+            if rc == _groonga.SUCCESS:
+                results.append(result if raw else
+                               result.decode(self.encoding))
+            else:
+                results.append(GroongaError.from_response(rc, result, qstr))
+                broken = broken or rc in connection_errors
+        if broken:
+            self.reconnect()
+        return results
+
+    def _raise_if_timeout(self, deadline, rc, qstr):
+        if deadline is not None and rc == _groonga.OPERATION_TIMEOUT:
+            # the rest of the response is still pending on the connection.
+            # close it and use a new context.
+            logger.debug("timed out: %s", qstr)
+            self._ctx = Context(self.encoding)
+            self.connected = False
+            raise GroongaTimeoutError("timed out", qstr)
 
     def _raise_if_notsuccess(self, rc, msg, query):
         if rc != _groonga.SUCCESS:
-            try:
-                msg = json.loads(msg)[0][3]
-            except (IndexError, ValueError, TypeError):
-                pass
             self.connected = False
-            raise GroongaError(rc, msg, query)
+            raise GroongaError.from_response(rc, msg, query)
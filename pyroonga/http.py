@@ -0,0 +1,478 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2013 Naoya Inada <naoina@kuune.org>
+# Licensed under the MIT License.
+
+"""HTTP transport for the groonga server
+
+:class:`GroongaHTTP` sends the queries to the HTTP interface of groonga
+(``groonga --protocol http``) instead of GQTP. It is written in pure Python,
+so it is available even if the ``_groonga`` extension is not built.
+
+The command string is mapped onto ``/d/<command>?<arguments>``\ , e.g.
+``select --table Site --query foo`` is sent as
+``GET /d/select?query=foo&table=Site``\ . The values of ``load`` are sent as
+the body of POST request.
+"""
+
+__author__ = "Naoya Inada <naoina@kuune.org>"
+
+__all__ = [
+    'GroongaHTTP', 'GroongaHTTPPool',
+]
+
+import codecs
+import itertools
+import json
+import logging
+import re
+import socket
+import zlib
+
+try:
+    import http.client as httplib
+except ImportError:
+    import httplib
+
+try:
+    from urllib.parse import quote
+except ImportError:
+    from urllib import quote
+
+from pyroonga import rc, utils
+from pyroonga.exceptions import GroongaError, GroongaTimeoutError
+from pyroonga.pool import GroongaPool
+
+logger = logging.getLogger(__name__)
+
+# size of reading the response at once
+CHUNK_SIZE = 65536
+
+# names of the arguments that can be given without '--name'
+positional_arguments = {
+    'cache_limit': ('max',),
+    'check': ('obj',),
+    'clearlock': ('objname',),
+    'column_create': ('table', 'name', 'flags', 'type', 'source'),
+    'column_list': ('table',),
+    'column_remove': ('table', 'name'),
+    'defrag': ('objname', 'threshold'),
+    'delete': ('table', 'key', 'id', 'filter'),
+    'dump': ('tables',),
+    'load': ('values', 'table', 'columns', 'ifexists', 'input_type'),
+    'log_level': ('level',),
+    'log_put': ('level', 'message'),
+    'register': ('path',),
+    'select': ('table', 'match_columns', 'query', 'filter', 'scorer',
+               'sortby', 'output_columns', 'offset', 'limit', 'drilldown',
+               'drilldown_sortby', 'drilldown_output_columns',
+               'drilldown_offset', 'drilldown_limit', 'cache',
+               'match_escalation_threshold', 'query_expansion',
+               'query_flags', 'query_expander'),
+    'suggest': ('types', 'table', 'column', 'query', 'sortby',
+                'output_columns', 'offset', 'limit', 'frequency_threshold',
+                'conditional_probability_threshold', 'prefix_search',
+                'similar_search'),
+    'table_create': ('name', 'flags', 'key_type', 'value_type',
+                     'default_tokenizer', 'normalizer'),
+    'table_remove': ('name',),
+    'truncate': ('table',),
+    }
+
+_unescapes = {'n': '\n', 'r': '\r', 't': '\t'}
+
+_envelope_re = re.compile(r'\s*\[')
+_decoder = json.JSONDecoder()
+
+
+def _tokenize(qstr):
+    tokens = []
+    i, n = 0, len(qstr)
+    while i < n:
+        if qstr[i].isspace():
+            i += 1
+            continue
+        buf = []
+        quoted = False
+        while i < n and not qstr[i].isspace():
+            c = qstr[i]
+            if c in '"\'':
+                quoted = True
+                i += 1
+                while i < n and qstr[i] != c:
+                    if qstr[i] == '\\' and i + 1 < n:
+                        i += 1
+                        buf.append(_unescapes.get(qstr[i], qstr[i]))
+                    else:
+                        buf.append(qstr[i])
+                    i += 1
+            elif c == '\\' and i + 1 < n:
+                i += 1
+                buf.append(qstr[i])
+            else:
+                buf.append(c)
+            i += 1
+        tokens.append((''.join(buf), quoted))
+    return tokens
+
+
+def parse_command(qstr):
+    """Parse the command string of groonga
+
+    e.g.::
+
+       >>> parse_command('select Site --query "foo bar"')
+       ('select', {'table': 'Site', 'query': 'foo bar'})
+
+    :param qstr: command string
+    :returns: tuple of name of command and dict of arguments
+    :raises: ValueError if ``qstr`` is not a valid command
+    """
+    tokens = _tokenize(qstr)
+    if not tokens:
+        raise ValueError("command is empty")
+    name = tokens[0][0]
+    positionals = positional_arguments.get(name, ())
+    args = {}
+    i = 1
+    while i < len(tokens):
+        value, quoted = tokens[i]
+        if value.startswith('--') and not quoted:
+            if i + 1 >= len(tokens):
+                raise ValueError("value of %s is not given" % value)
+            args[value[2:]] = tokens[i + 1][0]
+            i += 2
+            continue
+        for key in positionals:
+            if key not in args:
+                args[key] = value
+                break
+        else:
+            raise ValueError("unknown argument of %s: %r" % (name, value))
+        i += 1
+    return name, args
+
+
+def _strip_envelope(chunks):
+    """Yield the body from the response chunks of HTTP interface
+
+    The response of HTTP interface is wrapped as ``[header, body]``\ .
+
+    :returns: tuple of header, ``bytes`` of header and iterator of chunks of
+        body
+    :raises: ValueError if the response is not wrapped by the header
+    """
+    data = b''
+    for chunk in chunks:
+        data += chunk
+        # latin-1 keeps the index of the bytes
+        text = data.decode('latin-1')
+        m = _envelope_re.match(text)
+        if m is None:
+            continue
+        try:
+            header, end = _decoder.raw_decode(text, m.end())
+        except ValueError:
+            continue
+        break
+    else:
+        raise ValueError("invalid response: %r" % data[:100])
+    if not isinstance(header, list) or not header:
+        raise ValueError("invalid header of response: %r" % (header,))
+    return header, data[m.end():end], _iter_body(data[end:], chunks)
+
+
+def _iter_body(data, chunks):
+    while not data.strip():
+        data = next(chunks, None)
+        if data is None:
+            return
+    data = data.lstrip()
+    if data[:1] == b',':
+        data = data[1:]
+    # hold back the last ']' that may close the envelope
+    held = b''
+    for chunk in itertools.chain([data], chunks):
+        data = held + chunk
+        stripped = data.rstrip()
+        idx = len(stripped)
+        if stripped.endswith(b']'):
+            idx -= 1
+        if idx:
+            yield data[:idx]
+        held = data[idx:]
+
+
+def _split_msgpack_envelope(data):
+    """Split the response of HTTP interface in MessagePack
+
+    :returns: tuple of header and ``bytes`` of body
+    :raises: ValueError if the response is not wrapped by the header
+    """
+    msgpack = utils.msgpack
+    if msgpack is None:
+        raise ImportError("msgpack is required for output_type 'msgpack'")
+    unpacker = msgpack.Unpacker()
+    unpacker.feed(data)
+    try:
+        size = unpacker.read_array_header()
+        header = unpacker.unpack()
+    except (ValueError, TypeError, msgpack.OutOfData):
+        raise ValueError("invalid response: %r" % data[:100])
+    if size not in (1, 2) or not isinstance(header, (list, tuple)) or \
+            not header:
+        raise ValueError("invalid header of response: %r" % (header,))
+    return header, data[unpacker.tell():]
+
+
+class GroongaHTTP(object):
+    """Connection to the HTTP interface of groonga
+
+    This has the same interface as :class:`pyroonga.groonga.Groonga` and can
+    be bound to the tables. The connection is kept alive between the
+    queries.
+    """
+
+    def __init__(self, host='0.0.0.0', port=10041, encoding='utf-8',
+                 gzip=False, timeout=None):
+        """Construct of GroongaHTTP
+
+        :param host: String of host for connect to groonga server,
+            default is '0.0.0.0'
+        :param port: Port number of HTTP interface of groonga server,
+            default is 10041
+        :param encoding: Encoding of groonga. Default is 'utf-8'.
+        :param gzip: If True, request the response compressed by gzip.
+            Default is False.
+        :param timeout: Default seconds of timeout of connect and each query.
+            None means wait forever. Default is None.
+        """
+        self.host = host
+        self.port = port
+        self.encoding = encoding
+        self.gzip = gzip
+        self.timeout = timeout
+        self.connected = False
+        self._conn = None
+
+    def connect(self):
+        """Connect to the groonga server
+
+        :raises: :class:`pyroonga.exceptions.GroongaError` if failed to
+            connect
+        """
+        self.close()
+        conn = httplib.HTTPConnection(self.host, self.port,
+                                      timeout=self.timeout)
+        try:
+            conn.connect()
+        except socket.timeout as e:
+            raise GroongaTimeoutError(str(e))
+        except socket.error as e:
+            raise GroongaError(rc.CONNECTION_REFUSED, str(e))
+        self._conn = conn
+        self.connected = True
+
+    def close(self):
+        """Close the connection"""
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            conn.close()
+        self.connected = False
+
+    def query(self, qstr, raw=False, timeout=None):
+        """Send and receive the query string to the groonga server
+
+        Same as :meth:`pyroonga.groonga.Groonga.query`\ .
+
+        :param qstr: Query string.
+        :param raw: If True, returns the result as ``bytes``\ .
+        :param timeout: Seconds of timeout of this query. Default is
+            :attr:`timeout`\ .
+        :returns: result of query. ``str`` or ``bytes``\ .
+        :raises: :class:`pyroonga.exceptions.GroongaError` if the query
+            failed, or :class:`pyroonga.exceptions.GroongaTimeoutError` if
+            timed out
+        """
+        result = b''.join(self.query_iter(qstr, raw=True, timeout=timeout))
+        return result if raw else result.decode(self.encoding)
+
+    def query_iter(self, qstr, raw=False, timeout=None):
+        """Send the query and iterate the chunks of the result
+
+        Same as :meth:`pyroonga.groonga.Groonga.query_iter`\ .
+
+        :param qstr: Query string.
+        :param raw: If True, yields the chunks as ``bytes``\ .
+        :param timeout: Seconds of timeout of this query. Default is
+            :attr:`timeout`\ .
+        :returns: iterator of chunks of result of query
+        """
+        deadline = utils.deadline(self.timeout if timeout is None else
+                                  timeout)
+        resp, sock = self._request(qstr, deadline)
+        finished = False
+        try:
+            chunks = self._read(resp, sock, qstr, deadline)
+            if 'msgpack' in resp.getheader('Content-Type', ''):
+                data = b''.join(chunks)
+                # the whole response has been read
+                finished = True
+                body = self._split_msgpack(data, qstr)
+            else:
+                try:
+                    header, raw_header, body = _strip_envelope(chunks)
+                except ValueError as e:
+                    raise GroongaError(rc.INVALID_FORMAT, str(e), qstr)
+                if header[0] != rc.SUCCESS:
+                    for _ in body:
+                        pass
+                    finished = True
+                    raise GroongaError.from_response(
+                        header[0],
+                        '[%s]' % raw_header.decode(self.encoding, 'replace'),
+                        qstr)
+            decoder = codecs.getincrementaldecoder(self.encoding)()
+            for chunk in body:
+                yield chunk if raw else decoder.decode(chunk)
+            if not raw:
+                rest = decoder.decode(b'', True)
+                if rest:
+                    yield rest
+            finished = True
+        finally:
+            if not finished:
+                # the rest of the response is left in the connection
+                self.close()
+
+    def _split_msgpack(self, data, qstr):
+        try:
+            header, body = _split_msgpack_envelope(data)
+        except ValueError as e:
+            raise GroongaError(rc.INVALID_FORMAT, str(e), qstr)
+        if header[0] != rc.SUCCESS:
+            reason = header[3] if len(header) > 3 else ''
+            if isinstance(reason, bytes):
+                reason = reason.decode(self.encoding, 'replace')
+            raise GroongaError(header[0], reason, qstr)
+        return [body]
+
+    def query_many(self, qstrs, raw=False, timeout=None):
+        """Send the queries and receive the results in order
+
+        Same as :meth:`pyroonga.groonga.Groonga.query_many` except that the
+        queries are sent one by one over the kept-alive connection.
+
+        :param qstrs: iterable of query strings
+        :param raw: If True, returns the results as ``bytes``\ .
+        :param timeout: Seconds of timeout of all queries. Default is
+            :attr:`timeout`\ .
+        :returns: list of results of queries. If a query failed, the item
+            is an instance of :class:`pyroonga.exceptions.GroongaError`
+            instead.
+        """
+        deadline = utils.deadline(self.timeout if timeout is None else
+                                  timeout)
+        results = []
+        for qstr in qstrs:
+            try:
+                remaining = utils.remaining(deadline)
+                if remaining == 0:
+                    raise GroongaTimeoutError("timed out", qstr)
+                results.append(self.query(qstr, raw=raw, timeout=remaining))
+            except GroongaError as e:
+                results.append(e)
+        return results
+
+    def _request(self, qstr, deadline):
+        try:
+            name, args = parse_command(qstr)
+        except ValueError as e:
+            raise GroongaError(rc.INVALID_ARGUMENT, str(e), qstr)
+        method, body = 'GET', None
+        headers = {}
+        if name == 'load' and 'values' in args:
+            method = 'POST'
+            body = args.pop('values').encode(self.encoding)
+            headers['Content-Type'] = 'application/json'
+        if self.gzip:
+            headers['Accept-Encoding'] = 'gzip'
+        url = '/d/%s' % quote(name)
+        if args:
+            url += '?' + '&'.join(
+                '%s=%s' % (quote(k), quote(v.encode(self.encoding), safe=''))
+                for k, v in sorted(args.items()))
+        reused = self._conn is not None
+        if not reused:
+            self.connect()
+        conn = self._conn
+        sent = False
+        try:
+            conn.timeout = utils.remaining(deadline)
+            if conn.sock is None:
+                conn.connect()
+            conn.sock.settimeout(conn.timeout)
+            sock = conn.sock
+            conn.request(method, url, body, headers)
+            sent = True
+            return conn.getresponse(), sock
+        except socket.timeout as e:
+            self.close()
+            raise GroongaTimeoutError(str(e), qstr)
+        except (httplib.HTTPException, socket.error) as e:
+            self.close()
+            # the server may have closed the idle connection. but 'load' is
+            # not retried once it is sent, because it may have been loaded.
+            if reused and not (sent and method == 'POST'):
+                logger.debug("retry %s: %s", url, e)
+                return self._request(qstr, deadline)
+            raise GroongaError(rc.SOCKET_IS_NOT_CONNECTED, str(e), qstr)
+
+    def _read(self, resp, sock, qstr, deadline):
+        decompressor = None
+        if resp.getheader('Content-Encoding', '').lower() == 'gzip':
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        while True:
+            try:
+                sock.settimeout(utils.remaining(deadline))
+                data = resp.read(CHUNK_SIZE)
+            except socket.timeout as e:
+                raise GroongaTimeoutError(str(e), qstr)
+            except (httplib.HTTPException, socket.error) as e:
+                raise GroongaError(rc.SOCKET_IS_NOT_CONNECTED, str(e), qstr)
+            if not data:
+                break
+            if decompressor is not None:
+                try:
+                    data = decompressor.decompress(data)
+                except zlib.error as e:
+                    raise GroongaError(rc.ZLIB_ERROR, str(e), qstr)
+            if data:
+                yield data
+        if decompressor is not None:
+            data = decompressor.flush()
+            if data:
+                yield data
+
+
+class GroongaHTTPPool(GroongaPool):
+    """Thread-safe pool of :class:`GroongaHTTP` connections
+
+    See also :class:`pyroonga.pool.GroongaPool`\ .
+    """
+
+    def __init__(self, host='0.0.0.0', port=10041, encoding='utf-8',
+                 gzip=False, query_timeout=None, **kwargs):
+        """Construct of GroongaHTTPPool
+
+        :param gzip: see :class:`GroongaHTTP`
+        :param query_timeout: see ``timeout`` of :class:`GroongaHTTP`
+        :param kwargs: see :class:`pyroonga.pool.GroongaPool`
+        """
+        super(GroongaHTTPPool, self).__init__(host, port, encoding, **kwargs)
+        self.gzip = gzip
+        self.query_timeout = query_timeout
+
+    def _create(self):
+        return GroongaHTTP(self.host, self.port, self.encoding, gzip=self.gzip,
+                           timeout=self.query_timeout)
@@ -8,16 +8,177 @@ __author__ = "Naoya Inada <naoina@kuune.org>"
 __all__ = [
 ]
 
+import array
+import collections
+import copy
+import functools
 import itertools
 import json
 import logging
+import sys
+import threading
+import time
 from datetime import date, datetime
 
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 from pyroonga import utils
-from pyroonga.odm.attributes import SuggestType
+from pyroonga.exceptions import GroongaError
+from pyroonga.pool import GroongaPool
+from pyroonga.odm.attributes import ColumnFlags, ColumnFlagsFlag, SuggestType
 
 logger = logging.getLogger(__name__)
 
+# type codes of array.array and dtypes of numpy by the types of column
+array_typecodes = {
+    'Bool': 'b',
+    'Int8': 'b',
+    'UInt8': 'B',
+    'Int16': 'h',
+    'UInt16': 'H',
+    'Int32': 'i',
+    'UInt32': 'I',
+    'Int64': 'q',
+    'UInt64': 'Q',
+    'Float': 'd',
+    'Time': 'd',
+}
+
+numpy_dtypes = {
+    'Bool': 'bool',
+    'Int8': 'int8',
+    'UInt8': 'uint8',
+    'Int16': 'int16',
+    'UInt16': 'uint16',
+    'Int32': 'int32',
+    'UInt32': 'uint32',
+    'Int64': 'int64',
+    'UInt64': 'uint64',
+    'Float': 'float64',
+    'Time': 'float64',
+}
+
+
+def _to_geo_point(value):
+    # "35681396x139766049" in milliseconds, or "35.681396x139.766049" in
+    # degrees
+    return tuple(float(v) if '.' in v else int(v) / 3600000.0
+                 for v in value.replace(',', 'x').split('x', 1))
+
+
+# converters of the values by the types of column for typed decoding
+type_converters = {
+    'Time': datetime.fromtimestamp,
+    'TokyoGeoPoint': _to_geo_point,
+    'WGS84GeoPoint': _to_geo_point,
+}
+
+
+def _from_datetime(value):
+    if isinstance(value, datetime):
+        return time.mktime(value.timetuple()) + value.microsecond / 1000000.0
+    return value
+
+
+def _from_geo_point(value):
+    if isinstance(value, (tuple, list)):
+        # "35.681396x139.766049" in degrees
+        return '%rx%r' % tuple(float(v) for v in value)
+    return value
+
+
+# reverse of type_converters for 'load' query
+type_encoders = {
+    'Time': _from_datetime,
+    'TokyoGeoPoint': _from_geo_point,
+    'WGS84GeoPoint': _from_geo_point,
+}
+
+
+def _vector_converter(convert):
+    return lambda values: [convert(v) for v in values]
+
+
+def _vector_encoder(encode):
+    def encoder(value):
+        if isinstance(value, (list, tuple)):
+            return [encode(v) for v in value]
+        return encode(value)
+    return encoder
+
+
+def _is_vector(column):
+    flags = getattr(column, 'flags', None)
+    return bool(isinstance(flags, ColumnFlagsFlag) and
+                flags & ColumnFlags.COLUMN_VECTOR)
+
+
+def _converters(cls, cols):
+    """Build the converters of the columns by the declared types of them
+
+    :param cls: Table class that has the columns.
+    :param cols: names of columns of the result.
+    :returns: list of tuple of (index, converter) of the columns that need
+        the conversion.
+    """
+    converters = []
+    for i, name in enumerate(cols):
+        column = getattr(cls, name, None)
+        convert = type_converters.get(str(getattr(column, 'type', None)))
+        if _is_vector(column):
+            convert = _vector_converter(convert) if convert else list
+        if convert is not None:
+            converters.append((i, convert))
+    return converters
+
+
+def _encoders(cls, cols):
+    """Build the encoders of the columns for 'load' query
+
+    Only the columns of the types in ``type_encoders`` are encoded. The
+    values of vector columns are encoded for each element if they are list
+    or tuple, and are left as is otherwise.
+
+    :param cls: Table class that has the columns.
+    :param cols: names of columns to load.
+    :returns: list of tuple of (index, encoder) of the columns that need
+        the encoding.
+    """
+    encoders = []
+    for i, name in enumerate(cols):
+        column = getattr(cls, name, None)
+        encode = type_encoders.get(str(getattr(column, 'type', None)))
+        if encode is None:
+            continue
+        if _is_vector(column):
+            encode = _vector_encoder(encode)
+        encoders.append((i, encode))
+    return encoders
+
+
+def _typed_maker(make, converters):
+    def typed(row):
+        row = list(row)
+        for i, convert in converters:
+            value = row[i]
+            if value is not None:
+                row[i] = convert(value)
+        return make(row)
+    return typed
+
+
+def _then(awaitable, func):
+    from pyroonga import aio
+    return aio.then(awaitable, func)
+
 
 class QueryError(Exception):
     def __init__(self, msg):
@@ -89,7 +250,7 @@ class QueryOptionsMixin(object):
         return self
 
     def _makelimit(self):
-        if self._limit:
+        if self._limit is not None:
             return '%s %d' % (self.__options__['limit'], self._limit)
         else:
             return ''
@@ -123,14 +284,72 @@ class QueryOptionsMixin(object):
             self._makeoutput_columns()))
 
 
+class OutputTypeMixin(object):
+    """Mixin of the queries that can choose the output type"""
+
+    _output_type = 'json'
+
+    def output_type(self, type_):
+        """Set the output type of the result
+
+        'msgpack' is cheaper to produce and parse than 'json', but requires
+        msgpack package.
+
+        :param type_: 'json' or 'msgpack'
+        :returns: self. for method chain.
+        :raises: ValueError if ``type_`` is unknown
+        """
+        if type_ not in utils.output_types:
+            raise ValueError("unknown output type: %r" % (type_,))
+        self._output_type = type_
+        return self
+
+    def _makeoutput_type(self):
+        if self._output_type == 'json':
+            return ''
+        return '--output_type %s' % self._output_type
+
+
+# names of the changed columns of the records that are not changed. it is
+# replaced with a set on the first change.
+_clean = frozenset()
+
+
+def _changes_query(table, record, dirty):
+    """Build the 'load' query of the changed columns of the record
+
+    :param table: Table class of the record.
+    :param record: the record.
+    :param dirty: names of the changed columns.
+    :returns: :class:`RowsLoadQuery` of ``_key``\ , or ``_id`` if the table
+        has no key, and the changed columns.
+    """
+    values = record.asdict()
+    columns = sorted(dirty.difference(('_id', '_key')))
+    for key in ('_key', '_id'):
+        if key in values:
+            columns.insert(0, key)
+            break
+    return RowsLoadQuery(table, columns, [[values[k] for k in columns]])
+
+
 class GroongaRecord(object):
+    # no __dict__ for the subclasses generated by record_class(). the records
+    # of any other class are _GenericRecord that has __dict__.
+    __slots__ = ()
+
+    def __new__(cls, *args, **kwargs):
+        if cls is GroongaRecord:
+            cls = _GenericRecord
+        return object.__new__(cls)
+
     def __init__(self, cls, **kwargs):
         """Construct of GroongaRecord
 
         :param kwargs: name and value of columns
         """
         object.__setattr__(self, '__cls', cls)
-        object.__setattr__(self, '__dirty', False)
+        object.__setattr__(self, '__dirty', _clean)
         for k, v in kwargs.items():
             try:
                 object.__getattribute__(cls, k)
@@ -155,12 +374,16 @@ class GroongaRecord(object):
     def commit(self):
         """Load changed data to Groonga
 
+        Only the changed columns are loaded with ``_key``\ , or ``_id`` if the
+        table has no key.
+
         :returns: Number of changed data. but if data isn't changed, returns 0
         """
-        if object.__getattribute__(self, '__dirty'):
-            object.__setattr__(self, '__dirty', False)
+        dirty = object.__getattribute__(self, '__dirty')
+        if dirty:
+            object.__setattr__(self, '__dirty', _clean)
             cls = object.__getattribute__(self, '__cls')
-            return LoadQuery(cls, [self]).commit()
+            return _changes_query(cls, self, dirty).commit()
         else:
             return 0
 
@@ -177,22 +400,159 @@ class GroongaRecord(object):
         except AttributeError:
             raise AttributeError('"%s" column is not defined in %s' %
                                  (name, cls.__name__))
-        object.__setattr__(self, '__dirty', True)
+        dirty = object.__getattribute__(self, '__dirty')
+        if dirty:
+            dirty.add(name)
+        else:
+            object.__setattr__(self, '__dirty', set((name,)))
+        object.__setattr__(self, name, value)
+
+
+class _GenericRecord(GroongaRecord):
+    pass
+
+
+class TableRecord(GroongaRecord):
+    """Base class of the record classes generated for each table
+
+    Unlike :class:`GroongaRecord`\ , the values of columns are stored in
+    ``__slots__`` and the names of columns are validated once when the class
+    is generated by :func:`record_class`\ .
+    """
+
+    __slots__ = ('_dirty',)
+    __table__ = None
+    __columns__ = frozenset()
+
+    def __init__(self, **kwargs):
+        """Construct of TableRecord
+
+        :param kwargs: name and value of columns
+        """
+        object.__setattr__(self, '_dirty', _clean)
+        for k, v in kwargs.items():
+            if k not in self.__columns__:
+                raise AttributeError('key "%s" is not defined in %s' %
+                                     (k, self.__table__.__name__))
+            object.__setattr__(self, k, v)
+
+    @classmethod
+    def _maker(cls, cols):
+        for k in cols:
+            if k not in cls.__columns__:
+                raise AttributeError('key "%s" is not defined in %s' %
+                                     (k, cls.__table__.__name__))
+        setters = [getattr(cls, k).__set__ for k in cols]
+        setters.append(cls._dirty.__set__)
+        new = object.__new__
+
+        def make(row):
+            record = new(cls)
+            for setter, v in zip(setters, itertools.chain(row, (_clean,))):
+                setter(record, v)
+            return record
+        return make
+
+    def delete(self, immediate=True):
+        """Delete the record
+
+        See :meth:`GroongaRecord.delete`\ .
+        """
+        query = SimpleQuery(self.__table__).delete(id=self._id)
+        return query.execute() if immediate else query
+
+    def commit(self):
+        """Load changed data to Groonga
+
+        See :meth:`GroongaRecord.commit`\ .
+        """
+        dirty = self._dirty
+        if dirty:
+            object.__setattr__(self, '_dirty', _clean)
+            return _changes_query(self.__table__, self, dirty).commit()
+        else:
+            return 0
+
+    def asdict(self, excludes=tuple()):
+        result = {}
+        for k in self.__columns__.difference(excludes):
+            try:
+                result[k] = object.__getattribute__(self, k)
+            except AttributeError:
+                # not set
+                pass
+        return result
+
+    def __setattr__(self, name, value):
+        if name not in self.__columns__:
+            raise AttributeError('"%s" column is not defined in %s' %
+                                 (name, self.__table__.__name__))
+        dirty = self._dirty
+        if dirty:
+            dirty.add(name)
+        else:
+            object.__setattr__(self, '_dirty', set((name,)))
         object.__setattr__(self, name, value)
 
 
+def record_class(table, columns):
+    """Generate the record class of the table
+
+    :param table: Table class.
+    :param columns: names of columns including the pseudo columns.
+    :returns: subclass of :class:`TableRecord`
+    """
+    columns = tuple(columns)
+    return type('%sRecord' % table.__name__, (TableRecord,), {
+        '__module__': table.__module__,
+        '__slots__': columns,
+        '__table__': table,
+        '__columns__': frozenset(columns),
+    })
+
+
+def _record_maker(cls, cols):
+    record = getattr(cls, '__record__', None)
+    if record is not None:
+        return record._maker(cols)
+    return lambda row: GroongaRecord(cls, **dict(zip(cols, row)))
+
+
+def _row_mapper(cls, cols, typed=False):
+    record = _record_maker(cls, cols)
+    if typed:
+        converters = _converters(cls, cols)
+        if converters:
+            return _typed_maker(record, converters)
+    return record
+
+
 class GroongaResultBase(object):
-    """Base class of query result"""
+    """Base class of query result
 
-    def __init__(self, cls, results, maxlen=None):
+    The records are mapped on iteration or indexing, so that the records that
+    are never accessed are not made. The mapped records are kept, so that
+    each access to the same index returns the same :class:`GroongaRecord`\ .
+    """
+
+    def __init__(self, cls, results, maxlen=None, typed=False):
         """Construct of GroongaResultBase
 
         :param cls: Class for mappings.
         :param results: query results.
         :param maxlen: maximum length of mapping results. Default is all.
+        :param typed: If True, convert the values of the records by the
+            declared types of columns of ``cls``\ . See
+            :meth:`SelectQueryBase.typed`\ .
         """
-        self._result = tuple(GroongaRecord(cls, **mapped) for mapped in
-            utils.to_python(results, 1, maxlen))
+        self._columns = [tuple(col[:2]) for col in results[1]]
+        self._record = _row_mapper(cls, [col[0] for col in self._columns],
+                                   typed)
+        rows = results[2:]
+        if maxlen is not None:
+            rows = rows[:maxlen]
+        self._rows = rows
+        self._records = [None] * len(rows)
         self._all_len = results[0][0]
 
     @property
@@ -204,33 +564,97 @@ class GroongaResultBase(object):
         return self._all_len
 
     def __len__(self):
-        return len(self._result)
+        return len(self._rows)
 
     def __iter__(self):
-        return iter(self._result)
+        for i in range(len(self._rows)):
+            yield self._get(i)
 
     def __getitem__(self, index):
         if isinstance(index, slice):
-            start, stop, step = index.indices(len(self))
-            return self._result[start:stop:step]
-        return self._result[index]
+            return tuple(self._get(i) for i in
+                         range(*index.indices(len(self._rows))))
+        return self._get(index)
 
     def __reversed__(self):
-        return reversed(self._result)
+        for i in reversed(range(len(self._rows))):
+            yield self._get(i)
+
+    def _get(self, index):
+        record = self._records[index]
+        if record is None:
+            record = self._records[index] = self._record(self._rows[index])
+        return record
+
+    def column(self, name, use_numpy=None):
+        """Get the values of a column without mapping the records
+
+        The values of numeric, 'Bool' and 'Time' columns are packed into the
+        typed array by the type of column. e.g. 'Int32' is ``int32`` and
+        'Time' is ``float64`` of seconds since the epoch. The values of the
+        other columns and the vector columns are ``list``\ .
+
+        :param name: name of column, or :class:`pyroonga.odm.table.Column`\ .
+        :param use_numpy: If True, returns ``numpy.ndarray``\ . If False,
+            returns ``array.array``\ . Default is None, it uses numpy only if
+            it is installed.
+        :returns: ``numpy.ndarray``\ , ``array.array`` or ``list``
+        :raises: KeyError if the result doesn't have the column
+        """
+        name = getattr(name, 'name', name)
+        for i, (colname, type_) in enumerate(self._columns):
+            if colname == name:
+                break
+        else:
+            raise KeyError(name)
+        if use_numpy is None:
+            use_numpy = numpy is not None
+        elif use_numpy and numpy is None:
+            raise ImportError("numpy is not installed")
+        values = (row[i] for row in self._rows)
+        try:
+            if use_numpy and type_ in numpy_dtypes:
+                return numpy.fromiter(values, numpy_dtypes[type_],
+                                      len(self._rows))
+            elif not use_numpy and type_ in array_typecodes:
+                return array.array(array_typecodes[type_], values)
+        except (TypeError, ValueError):
+            # values of vector column, or type code 'q' and 'Q' on Python 2
+            pass
+        return [row[i] for row in self._rows]
+
+    def columnar(self, names=None, use_numpy=None):
+        """Get the values of columns without mapping the records
+
+        :param names: names of columns. Default is all columns of the result.
+        :param use_numpy: see :meth:`column`
+        :returns: dict of name of column and values by :meth:`column`
+        """
+        if names is None:
+            names = [name for name, _ in self._columns]
+        return dict((getattr(name, 'name', name),
+                     self.column(name, use_numpy=use_numpy))
+                    for name in names)
 
 
 class GroongaSelectResult(GroongaResultBase):
     """Result class for 'select' query"""
 
-    def __init__(self, table, resultstr, maxlen=None):
+    def __init__(self, table, resultstr, maxlen=None, output_type='json',
+                 typed=False):
         """Construct of GroongaSelectResult
 
         :param table: Table class for mappings.
-        :param resultstr: result string of 'select' query.
+        :param resultstr: result string of 'select' query. ``bytes`` is
+            parsed as is without decoding.
         :param maxlen: maximum length of mapping results. Default is all.
+        :param output_type: output type of ``resultstr``\ . 'json' or
+            'msgpack'. Default is 'json'.
+        :param typed: see :class:`GroongaResultBase`\ .
         """
-        objs = json.loads(resultstr)
-        super(GroongaSelectResult, self).__init__(table, objs[0], maxlen)
+        objs = utils.loads(resultstr, output_type)
+        super(GroongaSelectResult, self).__init__(table, objs[0], maxlen,
+                                                  typed)
         self._drilldown = self._drilldown_mapping(objs[1:])
         self._table = table
 
@@ -253,8 +677,8 @@ class GroongaSuggestResults(object):
 
     __slots__ = ['complete', 'correct', 'suggest']
 
-    def __init__(self, resultstr):
-        result = json.loads(resultstr)
+    def __init__(self, resultstr, output_type='json'):
+        result = utils.loads(resultstr, output_type)
         complete = result.get('complete', [])
         correct = result.get('correct', [])
         suggest = result.get('suggest', [])
@@ -286,10 +710,22 @@ class Drilldown(object):
         self._nsubrecs = _nsubrecs
 
 
+class _ColumnName(object):
+    """Column by the name for the options of the query"""
+
+    __slots__ = ['name', '_desc']
+
+    def __init__(self, name, desc=False):
+        self.name = name
+        self._desc = desc
+
+
 @utils.python_2_unicode_compatible
-class SelectQueryBase(Query, QueryOptionsMixin):
+class SelectQueryBase(Query, QueryOptionsMixin, OutputTypeMixin):
     """'select' query representation base class"""
 
+    _typed = False
+
     def __init__(self, tbl, *args, **kwargs):
         """Construct of 'select' query
 
@@ -306,14 +742,109 @@ class SelectQueryBase(Query, QueryOptionsMixin):
         self._cache = True
         self._match_escalation_threshold = None
 
-    def all(self):
+    def typed(self, enabled=True):
+        """Convert the values of the result by the declared types of columns
+
+        The values of ``DataType.Time`` columns become :class:`datetime`\ ,
+        ``DataType.WGS84GeoPoint`` and ``DataType.TokyoGeoPoint`` become
+        tuple of (latitude, longitude) in degrees, and the vector columns
+        become list. The converters are built once per result, and the
+        other columns are left as decoded.
+
+        :param enabled: False to get the values as decoded. Default is True.
+        :returns: self. for method chain.
+        """
+        self._typed = enabled
+        return self
+
+    def all(self, timeout=None):
         """Obtain the all result from this query instance
 
+        :param timeout: Seconds of timeout of the query. If exceeded,
+            :class:`pyroonga.exceptions.GroongaTimeoutError` is raised.
+            Default is None, it waits forever.
         :returns: result of query as a Python's objects. (dict, list, etc...)
         """
         q = str(self)
-        result = self._table.grn.query(q)
-        return GroongaSelectResult(self._table, result)
+        result = self._table.grn.query(q, raw=True, timeout=timeout)
+        return GroongaSelectResult(self._table, result,
+                                   output_type=self._output_type,
+                                   typed=self._typed)
+
+    def all_async(self, timeout=None):
+        """Awaitable version of :meth:`all`
+
+        The table must be bound to :class:`pyroonga.aio.AsyncGroonga` or
+        :class:`pyroonga.aio.AsyncGroongaPool`\ .
+
+        :param timeout: see :meth:`all`
+        :returns: awaitable of :class:`GroongaSelectResult`
+        """
+        q = str(self)
+        return _then(self._table.grn.query(q, raw=True, timeout=timeout),
+                     lambda result: GroongaSelectResult(
+                         self._table, result, output_type=self._output_type,
+                         typed=self._typed))
+
+    @staticmethod
+    def all_many(queries, timeout=None):
+        """Obtain the all results of the queries in one pipelined batch
+
+        See also :meth:`pyroonga.groonga.Groonga.query_many`\ .
+
+        e.g.::
+
+           recent, popular = SelectQuery.all_many([
+               Site.select().sortby(-Site._id).limit(10),
+               Site.select().sortby(-Site.views).limit(10)])
+
+        :param queries: iterable of 'select' queries. All tables of queries
+            must be bound to the same connection.
+        :param timeout: Seconds of timeout of all queries. The queries that
+            didn't finish within it are
+            :class:`pyroonga.exceptions.GroongaTimeoutError`\ .
+        :returns: list of :class:`GroongaSelectResult`\ . If a query fails,
+            the item is an instance of
+            :class:`pyroonga.exceptions.GroongaError` instead.
+        """
+        queries = list(queries)
+        if not queries:
+            return []
+        grn = queries[0]._table.grn
+        if any(q._table.grn is not grn for q in queries):
+            raise ValueError("all tables must be bound to the same connection")
+        results = grn.query_many([str(q) for q in queries], raw=True,
+                                 timeout=timeout)
+        return [r if isinstance(r, Exception) else
+                GroongaSelectResult(q._table, r, output_type=q._output_type,
+                                    typed=q._typed)
+                for q, r in zip(queries, results)]
+
+    def stream(self, timeout=None):
+        """Iterate the result of this query as it arrives
+
+        Unlike :meth:`all`, the result is parsed incrementally while it is
+        received, so that a large result can be processed with bounded
+        memory. Result of drilldown is not available.
+
+        :param timeout: Seconds of timeout of receiving the whole result.
+            See :meth:`all`\ .
+        :returns: iterator of :class:`GroongaRecord`
+        :raises: ValueError if the output type is not 'json'. see
+            :meth:`output_type`\ .
+        """
+        if self._output_type != 'json':
+            raise ValueError("stream() supports only 'json' output type: %r" %
+                             (self._output_type,))
+        return self._stream(timeout)
+
+    def _stream(self, timeout):
+        chunks = self._table.grn.query_iter(str(self), timeout=timeout)
+        _, columns, rows = utils.parse_select_chunks(chunks)
+        record = _row_mapper(self._table, [col[0] for col in columns],
+                             self._typed)
+        for row in rows:
+            yield record(row)
 
     def match_columns(self, *args):
         """Set the match columns
@@ -402,7 +933,8 @@ class SelectQueryBase(Query, QueryOptionsMixin):
             self._makecache(),
             self._makematch_escalation_threshold(),
             self._makeparams(),
-            self._makefilters())).strip()
+            self._makefilters(),
+            self._makeoutput_type())).strip()
 
     def __str__(self):
         return utils.to_text('select --table %s %s' % (
@@ -421,6 +953,148 @@ class SelectQuery(SelectQueryBase):
         """
         return DrillDownQuery(self, *columns)
 
+    def count(self, timeout=None):
+        """Count the records that match this query
+
+        The query is sent with ``--limit 0``\ , so that only the number of
+        hits is received and no records are mapped.
+
+        :param timeout: Seconds of timeout of the query. See :meth:`all`\ .
+        :returns: number of the records that match this query
+        """
+        q = copy.copy(self).limit(0)
+        q._sortby = ()
+        q._output_columns = (_ColumnName('_id'),)
+        result = self._table.grn.query(str(q), raw=True, timeout=timeout)
+        return utils.loads(result, self._output_type)[0][0][0]
+
+    def exists(self, timeout=None):
+        """Whether any record matches this query
+
+        Same as ``count() > 0``\ . See :meth:`count`\ .
+
+        :param timeout: Seconds of timeout of the query. See :meth:`all`\ .
+        :returns: True if any record matches, otherwise False
+        """
+        return self.count(timeout) > 0
+
+    def iter_pages(self, page_size, prefetch=1, timeout=None):
+        """Iterate the result of this query page by page
+
+        Each page is the result of this query with ``--offset`` and
+        ``--limit`` of the page. The limit and offset of this query are the
+        range of all pages. If the table is bound to
+        :class:`pyroonga.pool.GroongaPool` or its subclass, the pages are
+        fetched in a background thread on its own connection ahead of the
+        page being processed, so that the time of the network and the server
+        overlaps with the processing. Otherwise each page is fetched on
+        demand, because the other queries while processing the page would be
+        mixed with the thread on the single connection.
+
+        e.g.::
+
+           for page in Site.select().sortby(Site._id).iter_pages(1000):
+               for site in page:
+                   ...
+
+        :param page_size: number of records of each page.
+        :param prefetch: maximum number of pages that are fetched ahead. 0
+            fetches each page on demand without the thread. It is ignored
+            unless the table is bound to a connection pool. Default is 1.
+        :param timeout: Seconds of timeout of each page. See :meth:`all`\ .
+        :returns: iterator of :class:`GroongaSelectResult`
+        :raises: ValueError if ``page_size`` is less than 1 or ``prefetch``
+            is negative
+        """
+        if page_size < 1:
+            raise ValueError("page_size must be positive: %r" % (page_size,))
+        if prefetch < 0:
+            raise ValueError("prefetch must not be negative: %r" %
+                             (prefetch,))
+        pages = self._iter_pages(page_size, timeout)
+        if prefetch and hasattr(self._table.grn, 'checkout'):
+            # each query of the pool checks out a connection
+            pages = utils.prefetch(pages, prefetch)
+        return pages
+
+    def _iter_pages(self, page_size, timeout):
+        offset = self._offset or 0
+        stop = None
+        if self._limit is not None and self._limit >= 0:
+            stop = offset + self._limit
+        while stop is None or offset < stop:
+            size = page_size if stop is None else min(page_size, stop - offset)
+            page = copy.copy(self).offset(offset).limit(size).all(timeout)
+            if not len(page):
+                return
+            yield page
+            offset += len(page)
+            if len(page) < size or offset >= page.all_len:
+                return
+
+    def scan(self, batch_size, timeout=None):
+        """Iterate all records of this query in batches by ``_id``
+
+        Unlike :meth:`iter_pages`\ , each batch is selected by ``_id``
+        greater than the last ``_id`` of the previous batch instead of
+        ``--offset``\ , so that the server doesn't sort and skip the records
+        before the batch, and scanning the whole table takes linear time.
+        The query and the filters of this query are kept. The records are
+        sorted by ``_id``\ , or in descending order if this query is sorted by
+        ``-Table._id``\ . The limit of this query is the number of all
+        records.
+
+        e.g.::
+
+           for site in Site.select(title='groonga').scan(1000):
+               ...
+
+        :param batch_size: number of records of each batch.
+        :param timeout: Seconds of timeout of each batch. See :meth:`all`\ .
+        :returns: iterator of :class:`GroongaRecord`
+        :raises: ValueError if ``batch_size`` is less than 1, or this query
+            has the offset or the sort keys other than ``_id``
+        """
+        if batch_size < 1:
+            raise ValueError("batch_size must be positive: %r" %
+                             (batch_size,))
+        if self._offset:
+            raise ValueError("scan() pages by _id instead of offset")
+        if any(key.name != '_id' for key in self._sortby):
+            raise ValueError("scan() sorts only by _id")
+        desc = any(key._desc for key in self._sortby)
+        return self._scan(batch_size, desc, timeout)
+
+    def _scan(self, batch_size, desc, timeout):
+        remains = self._limit
+        if remains is not None and remains < 0:
+            remains = None
+        output_columns = self._output_columns
+        if output_columns and '_id' not in [c.name for c in output_columns]:
+            output_columns = tuple(output_columns) + (_ColumnName('_id'),)
+        filters = None
+        if self._filters:
+            filters = functools.reduce(lambda a, b: a.or_(b), self._filters)
+        last_id = None
+        while remains is None or remains > 0:
+            size = batch_size if remains is None else min(batch_size, remains)
+            q = copy.copy(self).limit(size)
+            q._sortby = (_ColumnName('_id', desc),)
+            q._output_columns = output_columns
+            if last_id is not None:
+                after = (Expression('_id') < last_id if desc else
+                         Expression('_id') > last_id)
+                q._filters = [after if filters is None else
+                              filters.and_(after)]
+            batch = q.all(timeout)
+            for record in batch:
+                yield record
+            if len(batch) < size:
+                return
+            last_id = batch[-1]._id
+            if remains is not None:
+                remains -= len(batch)
+
     def _makeparams(self):
         params = ['%s:@%s' % (k, utils.escape(v, True)) for k, v in
                   sorted(self._target.items())]
@@ -464,6 +1138,34 @@ class DrillDownQuery(SelectQueryBase, QueryOptionsMixin):
         cols = [col.name for col in self.columns]
         return ('--drilldown %s' % ','.join(cols)) if cols else ''
 
+    def output_type(self, type_):
+        """Set the output type of the result
+
+        Same as :meth:`OutputTypeMixin.output_type` of the parent query.
+        """
+        self.parent.output_type(type_)
+        return self
+
+    @property
+    def _output_type(self):
+        return self.parent._output_type
+
+    def typed(self, enabled=True):
+        """Convert the values of the result by the declared types of columns
+
+        Same as :meth:`SelectQueryBase.typed` of the parent query.
+        """
+        self.parent.typed(enabled)
+        return self
+
+    @property
+    def _typed(self):
+        return self.parent._typed
+
+    def _makeoutput_type(self):
+        # it's in the parent query
+        return ''
+
     def __str__(self):
         return str(self.parent) + (' %s' % self._condition())
 
@@ -813,33 +1515,286 @@ class LoadQuery(Query):
         self._data = itertools.chain(self._data, data)
         return self
 
-    def commit(self):
+    def commit(self, timeout=None, batch_size=None):
         """Load data to groonga actually
 
+        :param timeout: Seconds of timeout of each query. If exceeded,
+            :class:`pyroonga.exceptions.GroongaTimeoutError` is raised. Note
+            that groonga may have loaded some of data even then.
+        :param batch_size: If given, the data are consumed in batches of this
+            number, and each batch is sent as a 'load' query, so that the
+            memory is bounded by the batch rather than the whole data.
+            Default is None, all data are sent in one query.
         :returns: number of loaded data
+        :raises: ValueError if ``batch_size`` is less than 1. If a batch
+            failed, the exception has ``loaded`` attribute that is the number
+            of data loaded by the preceding batches, and the failed batch and
+            the rest of data are kept, so that :meth:`commit` can be called
+            again to load them.
         """
         if self._data is None:
             raise RuntimeError('query is already commited or rollbacked')
-        q = str(self)
-        result = int(self._table.grn.query(q))
+        if batch_size is None:
+            q = str(self)
+            result = int(self._table.grn.query(q, timeout=timeout))
+            self.rollback()
+            return result
+        if batch_size < 1:
+            raise ValueError("batch_size must be positive: %r" %
+                             (batch_size,))
+        result = 0
+        while True:
+            batch = list(itertools.islice(self._data, batch_size))
+            if not batch:
+                break
+            try:
+                result += int(self._table.grn.query(self._makequery(batch),
+                                                    timeout=timeout))
+            except Exception as e:
+                self._data = itertools.chain(batch, self._data)
+                e.loaded = result
+                raise
         self.rollback()
         return result
 
+    def commit_async(self, timeout=None, batch_size=None):
+        """Awaitable version of :meth:`commit`
+
+        The table must be bound to :class:`pyroonga.aio.AsyncGroonga` or
+        :class:`pyroonga.aio.AsyncGroongaPool`\ .
+
+        :param timeout: see :meth:`commit`
+        :param batch_size: not supported. All data are sent in one query.
+        :returns: awaitable of number of loaded data
+        :raises: ValueError if ``batch_size`` is given
+        """
+        if batch_size is not None:
+            raise ValueError("batch_size is not supported by commit_async")
+        if self._data is None:
+            raise RuntimeError('query is already commited or rollbacked')
+        q = str(self)
+        self.rollback()
+        return _then(self._table.grn.query(q, timeout=timeout), int)
+
     def rollback(self):
         self._data = None
 
-    def _makejson(self):
-        return json.dumps([v.asdict(excludes=('_id',)) for v in self._data])
+    def _makejson(self, data):
+        names = [col.name for col in getattr(self._table, 'columns', ())]
+        encoders = [(names[i], encode) for i, encode in
+                    _encoders(self._table, names)]
+        values = [v.asdict(excludes=('_id',)) for v in data]
+        if encoders:
+            for value in values:
+                for name, encode in encoders:
+                    if value.get(name) is not None:
+                        value[name] = encode(value[name])
+        return json.dumps(values)
+
+    def _makequery(self, data):
+        return ' '.join((
+            'load',
+            '--table', self._table.__tablename__,
+            '--input-type', 'json',
+            '--values', utils.escape(self._makejson(data), True)))
 
     def __str__(self):
+        return self._makequery(self._data)
+
+
+class RowsLoadQuery(LoadQuery):
+    """'load' query of the rows of values representation class
+
+    The values of each row are in the order of the columns, and are sent by
+    ``--columns``\ , so that neither the record object nor the names of
+    columns are made for each row.
+    """
+
+    def __init__(self, tbl, columns, rows):
+        """Construct of RowsLoadQuery
+
+        :param tbl: Table class. see also :class:`Query`\ .
+        :param columns: iterable of names or
+            :class:`pyroonga.odm.table.Column` of the values of each row.
+        :param rows: iterable object of tuple or list of values.
+        :raises: ValueError if ``columns`` is empty
+        """
+        super(RowsLoadQuery, self).__init__(tbl, rows)
+        self._columns = [getattr(col, 'name', col) for col in columns]
+        if not self._columns:
+            raise ValueError("columns must be one or more")
+
+    def _makejson(self, rows):
+        encoders = _encoders(self._table, self._columns)
+        if encoders:
+            rows = map(_typed_maker(list, encoders), rows)
+        return json.dumps(list(rows), separators=(',', ':'))
+
+    def _makequery(self, rows):
         return ' '.join((
             'load',
             '--table', self._table.__tablename__,
             '--input-type', 'json',
-            '--values', utils.escape(self._makejson(), True)))
+            '--columns', ','.join(self._columns),
+            '--values', utils.escape(self._makejson(rows), True)))
+
+
+class LoadReport(collections.namedtuple(
+        'LoadReport', 'count batches retried errors elapsed')):
+    """Report of :func:`bulk_load`
 
+    ``count`` is the number of loaded data, ``batches`` is the number of
+    loaded batches, ``retried`` is the number of retries of the batches,
+    ``errors`` is list of :class:`FailedBatch` of the batches that failed even
+    after the retries in the order of the data, and ``elapsed`` is seconds of
+    the whole load.
+    """
+
+    __slots__ = ()
+
+    @property
+    def throughput(self):
+        """Number of loaded data per second"""
+        return self.count / self.elapsed if self.elapsed > 0 else 0.0
+
+
+class FailedBatch(collections.namedtuple(
+        'FailedBatch', 'offset data error')):
+    """Batch of :func:`bulk_load` that failed
 
-class SimpleQuery(Query):
+    ``offset`` is the index of the first data of the batch in the whole data,
+    ``data`` is list of the data of the batch, so that it can be loaded again,
+    and ``error`` is the exception of the last attempt.
+    """
+
+    __slots__ = ()
+
+
+def _is_async(grn):
+    # the asyncio client is imported on demand because it requires Python 3.5
+    # or later
+    if sys.version_info < (3, 5):
+        return False
+    from pyroonga.aio import AsyncGroonga, AsyncGroongaPool
+    return isinstance(grn, (AsyncGroonga, AsyncGroongaPool))
+
+
+def bulk_load(tbl, data, batch_size=1000, concurrency=4, retries=2,
+              timeout=None, backoff=0.1):
+    """Load the data in batches concurrently over the connections of a pool
+
+    The data are consumed in batches of ``batch_size``\ , and ``concurrency``
+    threads commit the batches as 'load' queries. The table must be bound to
+    :class:`pyroonga.pool.GroongaPool` or its subclass unless ``concurrency``
+    is 1, then each thread checks out its own connection. The data are read
+    no faster than the threads load them, so that at most ``concurrency``
+    batches are waiting in memory.
+
+    A batch that failed by :class:`pyroonga.exceptions.GroongaError` is
+    retried up to ``retries`` times, waiting ``backoff`` seconds doubled on
+    each retry. A connection that was disconnected by the failure, e.g. by
+    :class:`pyroonga.exceptions.GroongaTimeoutError`\ , is reconnected
+    before the retry. Note that a batch that timed out may have been loaded
+    partially, so that the retry may load the records of the table without
+    key twice. The batches that failed even then are skipped and reported in
+    :attr:`LoadReport.errors` with their data.
+
+    :param tbl: Table class.
+    :param data: iterable object of instance of Table.
+    :param batch_size: number of data of each batch. Default is 1000.
+    :param concurrency: number of threads. Default is 4.
+    :param retries: maximum number of retries of each batch. Default is 2.
+    :param timeout: Seconds of timeout of each batch. See
+        :meth:`LoadQuery.commit`\ .
+    :param backoff: Seconds to wait before the first retry. Default is 0.1.
+    :returns: :class:`LoadReport`
+    :raises: ValueError if the arguments are out of range, the table is bound
+        to an asyncio connection, or ``concurrency`` is more than 1 and the
+        table isn't bound to a connection pool
+    """
+    if batch_size < 1 or concurrency < 1 or retries < 0:
+        raise ValueError("invalid arguments: batch_size=%r, concurrency=%r,"
+                         " retries=%r" % (batch_size, concurrency, retries))
+    if _is_async(tbl.grn):
+        raise ValueError("bulk_load doesn't support the asyncio connections")
+    if concurrency > 1 and not isinstance(tbl.grn, GroongaPool):
+        raise ValueError("concurrency=%r requires a connection pool" %
+                         (concurrency,))
+    make = getattr(tbl, '_load', None)
+    if make is None:
+        make = functools.partial(LoadQuery, tbl)
+    batches = queue.Queue(concurrency)
+    lock = threading.Lock()
+    totals = {'count': 0, 'batches': 0, 'retried': 0}
+    errors = []
+
+    def commit(batch):
+        attempt = 0
+        while True:
+            try:
+                if attempt:
+                    grn = tbl.grn
+                    # a single connection is left disconnected by a timeout
+                    if (not getattr(grn, 'connected', True) and
+                            hasattr(grn, 'reconnect')):
+                        grn.reconnect()
+                return make(batch).commit(timeout=timeout)
+            except GroongaError:
+                if attempt >= retries:
+                    raise
+            with lock:
+                totals['retried'] += 1
+            time.sleep(backoff * 2 ** attempt)
+            attempt += 1
+
+    def work():
+        while True:
+            item = batches.get()
+            if item is None:
+                return
+            offset, batch = item
+            try:
+                count = commit(batch)
+            except Exception as e:
+                logger.warning("failed to load a batch of %d data at %d: %s",
+                               len(batch), offset, e)
+                with lock:
+                    errors.append(FailedBatch(offset, batch, e))
+            else:
+                with lock:
+                    totals['count'] += count
+                    totals['batches'] += 1
+
+    start = time.time()
+    threads = [threading.Thread(target=work) for _ in range(concurrency)]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    try:
+        data = iter(data)
+        offset = 0
+        while True:
+            batch = list(itertools.islice(data, batch_size))
+            if not batch:
+                break
+            # blocks while all threads are busy
+            batches.put((offset, batch))
+            offset += len(batch)
+    finally:
+        for _ in threads:
+            batches.put(None)
+        for thread in threads:
+            thread.join()
+    errors.sort(key=lambda failed: failed.offset)
+    report = LoadReport(totals['count'], totals['batches'], totals['retried'],
+                        errors, time.time() - start)
+    logger.info("loaded %d data in %d batches in %.2f seconds (%.1f/s)",
+                report.count, report.batches, report.elapsed,
+                report.throughput)
+    return report
+
+
+class SimpleQuery(Query, OutputTypeMixin):
     """simple true or false returning query representation class"""
 
     def __init__(self, table_cls):
@@ -925,13 +1880,27 @@ class SimpleQuery(Query):
 
         :returns: True if query is successful, otherwise False
         """
-        return json.loads(self._table.grn.query(str(self)))
+        if self._output_type == 'json':
+            return utils.json_loads(self._table.grn.query(str(self)))
+        return utils.loads(self._table.grn.query(str(self), raw=True),
+                           self._output_type)
+
+    def execute_async(self):
+        """Awaitable version of :meth:`execute`
+
+        The table must be bound to :class:`pyroonga.aio.AsyncGroonga` or
+        :class:`pyroonga.aio.AsyncGroongaPool`\ .
+
+        :returns: awaitable of the result
+        """
+        return _then(self._table.grn.query(str(self), raw=True),
+                     lambda result: utils.loads(result, self._output_type))
 
     def __str__(self):
-        return ' '.join(self._query)
+        return ' '.join(self._query + [self._makeoutput_type()]).strip()
 
 
-class SuggestQuery(Query, QueryOptionsMixin):
+class SuggestQuery(Query, QueryOptionsMixin, OutputTypeMixin):
     """'suggest' query representation class"""
 
     __options__ = {
@@ -962,23 +1931,41 @@ class SuggestQuery(Query, QueryOptionsMixin):
         self._similar_search = None
         self._result = None
 
-    def all(self):
+    def all(self, timeout=None):
         """Get results of suggest
 
+        :param timeout: Seconds of timeout of the query. If exceeded,
+            :class:`pyroonga.exceptions.GroongaTimeoutError` is raised.
+            Default is None, it waits forever.
         :returns: :class:`GroongaSuggestResults`
         """
         query = str(self)
-        result = self._table.grn.query(query)
-        return GroongaSuggestResults(result)
+        result = self._table.grn.query(query, raw=True, timeout=timeout)
+        return GroongaSuggestResults(result, self._output_type)
+
+    def all_async(self, timeout=None):
+        """Awaitable version of :meth:`all`
+
+        The table must be bound to :class:`pyroonga.aio.AsyncGroonga` or
+        :class:`pyroonga.aio.AsyncGroongaPool`\ .
+
+        :param timeout: see :meth:`all`
+        :returns: awaitable of :class:`GroongaSuggestResults`
+        """
+        query = str(self)
+        return _then(self._table.grn.query(query, raw=True, timeout=timeout),
+                     lambda result: GroongaSuggestResults(
+                         result, self._output_type))
 
-    def get(self, type_):
+    def get(self, type_, timeout=None):
         """Get a result of suggest by type name
 
         :param type_: type name of suggest. 'complete', 'correct' or 'suggest'.
+        :param timeout: see :meth:`all`
         :returns: :class:`GroongaSuggestResult`\ .
         :raises: KeyError
         """
-        result = self.all()
+        result = self.all(timeout=timeout)
         try:
             return getattr(result, type_)
         except AttributeError:
@@ -1072,7 +2059,8 @@ class SuggestQuery(Query, QueryOptionsMixin):
             self._makefrequency_threshold(),
             self._makeconditional_probability_threshold(),
             self._makeprefix_search(),
-            self._makesimilar_search())).strip()
+            self._makesimilar_search(),
+            self._makeoutput_type())).strip()
 
     def __str__(self):
         return ' '.join((
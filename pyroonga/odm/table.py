@@ -11,10 +11,12 @@ __all__ = [
     'event_query',
 ]
 
-import json
 import logging
+import sys
 
-from pyroonga.groonga import Groonga
+from pyroonga.gqtp import GroongaGQTP, GroongaGQTPPool
+from pyroonga.http import GroongaHTTP, GroongaHTTPPool
+from pyroonga.pool import GroongaPool
 from pyroonga.odm.attributes import (
     TableFlags,
     ColumnFlagsFlag,
@@ -28,6 +30,7 @@ from pyroonga.odm import query
 from pyroonga.odm.query import (
     GroongaRecord,
     LoadQuery,
+    RowsLoadQuery,
     SuggestQuery,
     SuggestLoadQuery,
     SelectQuery,
@@ -35,8 +38,28 @@ from pyroonga.odm.query import (
     )
 from pyroonga import utils
 
+try:
+    from pyroonga.groonga import Groonga
+except ImportError:
+    # the C extension is not built. only the HTTP transport is available.
+    Groonga = None
+
 logger = logging.getLogger(__name__)
 
+# types of object that can be bound to the tables
+connection_types = tuple(t for t in (Groonga, GroongaPool, GroongaGQTP,
+                                     GroongaGQTPPool, GroongaHTTP,
+                                     GroongaHTTPPool) if t is not None)
+
+
+def _connection_types():
+    # the asyncio client is imported on demand because it requires Python 3.5
+    # or later
+    if sys.version_info < (3, 5):
+        return connection_types
+    from pyroonga.aio import AsyncGroonga, AsyncGroongaPool
+    return connection_types + (AsyncGroonga, AsyncGroongaPool)
+
 
 class prop_attr(property):
     """Property decorator for class method
@@ -63,8 +86,14 @@ class TableMeta(type):
                     cls._setcolumn(k, v)
                     cls.columns.append(v)
             cls._set_pseudocolumns()
+            cls.__record__ = query.record_class(cls, cls._record_columns())
         return type.__init__(cls, name, bases, dict_)
 
+    def _record_columns(cls):
+        # columns of the base tables are also available
+        return [k for k in dir(cls) if k != 'ALL' and
+                isinstance(getattr(cls, k, None), Column)]
+
     def _set_pseudocolumns(cls):
         for attr, name, typ in (('_id', '_id', DataType.UInt32),
                                 ('_nsubrecs', '_nsubrecs', DataType.Int32),
@@ -142,11 +171,20 @@ class TableBase(object):
     def bind(cls, grn):
         """Bind the :class:`pyroonga.groonga.Groonga` object to the this table
 
-        :param grn: :class:`pyroonga.groonga.Groonga` object.
+        :param grn: :class:`pyroonga.groonga.Groonga`\ ,
+            :class:`pyroonga.pool.GroongaPool`\ ,
+            :class:`pyroonga.gqtp.GroongaGQTP`\ ,
+            :class:`pyroonga.gqtp.GroongaGQTPPool`\ ,
+            :class:`pyroonga.http.GroongaHTTP`\ ,
+            :class:`pyroonga.http.GroongaHTTPPool`\ ,
+            :class:`pyroonga.aio.AsyncGroonga` or
+            :class:`pyroonga.aio.AsyncGroongaPool` object.
         """
-        if not isinstance(grn, Groonga):
-            raise TypeError("not %s instance" % Groonga.__name__)
-        if not grn.connected:
+        types = _connection_types()
+        if not isinstance(grn, types):
+            raise TypeError("not %s instance" %
+                            ' or '.join(t.__name__ for t in types))
+        if not grn.connected and not getattr(grn, 'connect_on_demand', False):
             grn.connect()
         cls.grn = grn
 
@@ -156,11 +194,11 @@ class TableBase(object):
 
         :param grn: instance of :class:`pyroonga.groonga.Groonga`\ .
         """
-        if not isinstance(cls.grn, Groonga):
-            raise TypeError("%s object is not bind" % Groonga.__name__)
+        if not isinstance(cls.grn, _connection_types()):
+            raise TypeError("Groonga object is not bind")
         table_queries = []
         column_queries = []
-        json_results = json.loads(cls.grn.query('table_list'))
+        json_results = utils.json_loads(cls.grn.query('table_list'))
         defined_tables = utils.to_python(json_results, 0)
         defined_table_names = tuple(v['name'] for v in defined_tables)
         for tbl in (t for t in cls._tables if t.__tablename__ not in
@@ -193,17 +231,62 @@ class TableBase(object):
         return query
 
     @classmethod
-    def load(cls, data, immediate=True):
+    def load(cls, data, immediate=True, batch_size=None):
         """Load data to the groonga
 
         :param data: iterable object of instance of Table.
         :param immediate: load data to groonga immediately if True. Otherwise,
             Must call :meth:`pyroonga.odm.query.LoadQuery.commit` explicitly
             for data load.
+        :param batch_size: number of data of each 'load' query if
+            ``immediate`` is True. See
+            :meth:`pyroonga.odm.query.LoadQuery.commit`\ .
         :returns: :class:`pyroonga.odm.query.LoadQuery`\ .
         """
         query = cls._load(data)
-        return query.commit() if immediate else query
+        return query.commit(batch_size=batch_size) if immediate else query
+
+    @classmethod
+    def load_rows(cls, columns, rows, immediate=True, batch_size=None):
+        """Load the rows of values to the groonga
+
+        Unlike :meth:`load`\ , each row is a plain tuple or list of values in
+        the order of ``columns``\ , so that no instance of Table is needed.
+
+        e.g.::
+
+           Site.load_rows([Site._key, Site.title], [('key1', 'foo'),
+                                                    ('key2', 'bar')])
+
+        :param columns: iterable of :class:`Column` or names of columns.
+        :param rows: iterable object of tuple or list of values.
+        :param immediate: see :meth:`load`\ .
+        :param batch_size: see :meth:`load`\ .
+        :returns: number of loaded rows if ``immediate`` is True. Otherwise,
+            :class:`pyroonga.odm.query.RowsLoadQuery`\ .
+        """
+        query = RowsLoadQuery(cls, columns, rows)
+        return query.commit(batch_size=batch_size) if immediate else query
+
+    @classmethod
+    def bulk_load(cls, data, batch_size=1000, concurrency=4, retries=2,
+                  timeout=None):
+        """Load a large data in batches concurrently
+
+        The table must be bound to a connection pool. See
+        :func:`pyroonga.odm.query.bulk_load`\ .
+
+        :param data: iterable object of instance of Table.
+        :param batch_size: number of data of each batch. Default is 1000.
+        :param concurrency: number of connections that load the batches at
+            the same time. Default is 4.
+        :param retries: maximum number of retries of each batch. Default is 2.
+        :param timeout: Seconds of timeout of each batch.
+        :returns: :class:`pyroonga.odm.query.LoadReport`
+        """
+        return query.bulk_load(cls, data, batch_size=batch_size,
+                               concurrency=concurrency, retries=retries,
+                               timeout=timeout)
 
     @classmethod
     def _load(cls, data):
@@ -380,8 +463,8 @@ class SuggestTableBase(TableBase):
 
         :param grn: instance of :class:`pyroonga.groonga.Groonga`\ .
         """
-        if not isinstance(cls.grn, Groonga):
-            raise TypeError("%s object is not bind" % Groonga.__name__)
+        if not isinstance(cls.grn, _connection_types()):
+            raise TypeError("Groonga object is not bind")
         table_queries = []
         column_queries = []
         for tbl in cls._tables:
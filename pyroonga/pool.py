@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2013 Naoya Inada <naoina@kuune.org>
+# Licensed under the MIT License.
+
+__author__ = "Naoya Inada <naoina@kuune.org>"
+
+__all__ = [
+    'GroongaPool',
+]
+
+import collections
+import contextlib
+import logging
+import threading
+import time
+
+from pyroonga.exceptions import GroongaError, PoolTimeoutError
+
+try:
+    from pyroonga.groonga import Groonga
+except ImportError:
+    # the C extension is not built. only the HTTP transport is available.
+    Groonga = None
+
+logger = logging.getLogger(__name__)
+
+
+class GroongaPool(object):
+    """Thread-safe pool of :class:`pyroonga.groonga.Groonga` connections
+
+    The pool can be bound to the tables instead of
+    :class:`pyroonga.groonga.Groonga`\ , then each query checks out a
+    connection from the pool and checks in it after the query::
+
+       pool = GroongaPool(minsize=2, maxsize=10)
+       Table.bind(pool)
+    """
+
+    def __init__(self, host='0.0.0.0', port=10041, encoding='utf-8',
+                 minsize=1, maxsize=10, timeout=30, check_interval=30):
+        """Construct of GroongaPool
+
+        :param host: String of host for connect to groonga server,
+            default is '0.0.0.0'
+        :param port: Port number for connect to groonga server,
+            default is 10041
+        :param encoding: Encoding of groonga. Default is 'utf-8'.
+        :param minsize: Number of connections that are opened by
+            :meth:`connect`\ . Default is 1.
+        :param maxsize: Maximum number of connections. Default is 10.
+        :param timeout: Seconds to wait for a connection to be checked in
+            when all connections are in use. None means wait forever.
+            Default is 30.
+        :param check_interval: Idle connections longer than this seconds are
+            checked whether alive on checkout. None means never check.
+            Default is 30.
+        """
+        if not 0 <= minsize <= maxsize or maxsize < 1:
+            raise ValueError("invalid pool size: minsize=%r, maxsize=%r" %
+                             (minsize, maxsize))
+        self.host = host
+        self.port = port
+        self.encoding = encoding
+        self.minsize = minsize
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.check_interval = check_interval
+        self.connected = False
+        self._idle = collections.deque()
+        self._size = 0
+        self._cond = threading.Condition(threading.Lock())
+
+    @property
+    def size(self):
+        """Number of connections that are opened by this pool"""
+        return self._size
+
+    @property
+    def idle(self):
+        """Number of connections that are not checked out"""
+        return len(self._idle)
+
+    def connect(self):
+        """Open the connections until the number of them reaches minsize"""
+        conns = []
+        try:
+            while self._size < self.minsize:
+                conns.append(self.checkout())
+        finally:
+            for grn in conns:
+                self.checkin(grn)
+        self.connected = True
+
+    def close(self):
+        """Close the all idle connections"""
+        with self._cond:
+            idle = [grn for grn, _ in self._idle]
+            self._size -= len(self._idle)
+            self._idle.clear()
+            self.connected = False
+            self._cond.notify_all()
+        for grn in idle:
+            grn.close()
+
+    def checkout(self, timeout=None):
+        """Check out a connection from the pool
+
+        The connection must be returned to the pool by :meth:`checkin`\ .
+
+        :param timeout: Seconds to wait for a connection. Default is
+            :attr:`timeout`\ .
+        :returns: :class:`pyroonga.groonga.Groonga`
+        :raises: :class:`pyroonga.exceptions.PoolTimeoutError` if no
+            connection is checked in within ``timeout``
+        """
+        if timeout is None:
+            timeout = self.timeout
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            grn, last_used = self._acquire(deadline)
+            if grn is None:
+                return self._open()
+            if (self.check_interval is None or
+                    time.time() - last_used < self.check_interval or
+                    self._ping(grn)):
+                return grn
+            logger.debug("discard the dead connection %r", grn)
+            # the connection may have been reconnected by the failed query
+            grn.close()
+            self._discard()
+
+    def checkin(self, grn):
+        """Return the connection to the pool
+
+        The connection is closed and discarded if it is not connected.
+
+        :param grn: :class:`pyroonga.groonga.Groonga` that was checked out
+        """
+        alive = grn.connected
+        with self._cond:
+            if alive:
+                self._idle.append((grn, time.time()))
+            else:
+                self._size -= 1
+            self._cond.notify()
+        if not alive:
+            grn.close()
+
+    @contextlib.contextmanager
+    def connection(self, timeout=None):
+        """Context manager that checks out and checks in a connection
+
+        e.g.::
+
+           with pool.connection() as grn:
+               grn.query('status')
+
+        :param timeout: see :meth:`checkout`
+        """
+        grn = self.checkout(timeout)
+        try:
+            yield grn
+        finally:
+            self.checkin(grn)
+
+    def query(self, qstr, raw=False, timeout=None):
+        """Same as :meth:`pyroonga.groonga.Groonga.query` on a connection
+        checked out from the pool
+
+        A connection that timed out is discarded from the pool.
+        """
+        with self.connection() as grn:
+            return grn.query(qstr, raw=raw, timeout=timeout)
+
+    def query_iter(self, qstr, raw=False, timeout=None):
+        """Same as :meth:`pyroonga.groonga.Groonga.query_iter` on a
+        connection checked out from the pool
+
+        The connection is checked out until the iteration is finished.
+        """
+        with self.connection() as grn:
+            for chunk in grn.query_iter(qstr, raw=raw, timeout=timeout):
+                yield chunk
+
+    def query_many(self, qstrs, raw=False, timeout=None):
+        """Same as :meth:`pyroonga.groonga.Groonga.query_many` on a
+        connection checked out from the pool
+        """
+        with self.connection() as grn:
+            return grn.query_many(qstrs, raw=raw, timeout=timeout)
+
+    def _acquire(self, deadline):
+        with self._cond:
+            while True:
+                if self._idle:
+                    return self._idle.pop()
+                if self._size < self.maxsize:
+                    self._size += 1
+                    return None, None
+                if deadline is None:
+                    self._cond.wait()
+                    continue
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise PoolTimeoutError(
+                        "all of %d connections are in use" % self.maxsize)
+                self._cond.wait(remaining)
+
+    def _open(self):
+        try:
+            grn = self._create()
+            grn.connect()
+        except:
+            self._discard()
+            raise
+        return grn
+
+    def _create(self):
+        if Groonga is None:
+            raise ImportError("GroongaPool requires the _groonga extension."
+                              " Use GroongaGQTPPool or GroongaHTTPPool"
+                              " without it")
+        return Groonga(self.host, self.port, self.encoding)
+
+    def _discard(self):
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    def _ping(self, grn):
+        try:
+            grn.query('status')
+        except GroongaError:
+            return False
+        return True
@@ -0,0 +1,9 @@
+# -*- coding: utf-8 -*-
+
+import sys
+
+collect_ignore = []
+
+if sys.version_info < (3, 5):
+    # 'async def' of the asyncio client is a SyntaxError on collection
+    collect_ignore.extend(['unit/test_aio.py', 'functional/test_aio.py'])
@@ -5,7 +5,7 @@ import random
 
 import pytest
 
-from pyroonga import Groonga, exceptions
+from pyroonga import Groonga, GroongaPool, exceptions
 from pyroonga.odm import attributes, query
 from pyroonga.odm.attributes import (
     TableFlags,
@@ -204,6 +204,25 @@ class TestTable(object):
         Table.bind(grn)
         assert Table.grn is grn
 
+    def test_bind_with_pool(self, Table):
+        pool = GroongaPool(maxsize=2)
+        Table.bind(pool)
+        assert Table.grn is pool
+        assert pool.connected is True
+
+    def test_select_with_pool(self, Table):
+        class Tb(Table):
+            name = Column()
+
+        pool = GroongaPool(maxsize=2)
+        Table.bind(pool)
+        Table.create_all()
+        assert Tb.load([Tb(_key='key1', name='foo')]) == 1
+        result = Tb.select().all()
+        assert [(r._key, r.name) for r in result] == [('key1', 'foo')]
+        assert pool.size == 1
+        assert pool.idle == 1
+
     def test_create_all(self, Table):
         class Tb1(Table):
             name = Column(flags=ColumnFlags.COLUMN_SCALAR,
@@ -1768,3 +1787,84 @@ class TestSuggestTable(object):
         self.assertEqual(str(query),
             'suggest --table "item_query" --column '
             '"kana" --types "complete" --similar_search no --query "en"')
+
+
+class TestTableEmbedded(object):
+    @pytest.fixture
+    def Tb(self, tmpdir):
+        Table = tablebase()
+
+        class Tb(Table):
+            name = Column()
+
+        grn = Groonga(path=str(tmpdir.join('test.db')))
+        Table.bind(grn)
+        Table.create_all()
+        return Tb
+
+    def test_load_and_select(self, Tb):
+        result = Tb.load([Tb(_key='key1', name='foo'),
+                          Tb(_key='key2', name='bar')])
+        assert result == 2
+        records = Tb.select().sortby(Tb._key).all()
+        assert records.all_len == 2
+        assert [(r._key, r.name) for r in records] == [('key1', 'foo'),
+                                                      ('key2', 'bar')]
+
+    def test_select_stream(self, Tb):
+        Tb.load(Tb(_key='key%d' % i, name='name%d' % i) for i in range(1000))
+        records = Tb.select().sortby(Tb._id).limit(-1).stream()
+        result = [(r._id, r._key, r.name) for r in records]
+        assert result == [(i + 1, 'key%d' % i, 'name%d' % i)
+                          for i in range(1000)]
+
+    def test_select_iter_pages(self, Tb):
+        Tb.load(Tb(_key='key%d' % i, name='name%d' % i) for i in range(1000))
+        pages = Tb.select().sortby(Tb._id).iter_pages(300)
+        result = [[r._id for r in page] for page in pages]
+        assert [len(page) for page in result] == [300, 300, 300, 100]
+        assert sum(result, []) == list(range(1, 1001))
+
+    def test_select_scan(self, Tb):
+        Tb.load(Tb(_key='key%d' % i, name='name%d' % (i % 3))
+                for i in range(1000))
+        records = Tb.select().filter(Tb.name == 'name1').scan(100)
+        assert [r._id for r in records] == list(range(2, 1001, 3))
+
+    def test_select_count(self, Tb):
+        Tb.load(Tb(_key='key%d' % i, name='name%d' % (i % 3))
+                for i in range(100))
+        assert Tb.select().count() == 100
+        assert Tb.select().filter(Tb.name == 'name1').count() == 33
+        assert Tb.select().filter(Tb.name == 'name1').exists() is True
+        assert Tb.select().filter(Tb.name == 'none').exists() is False
+
+    def test_load_with_batch_size(self, Tb):
+        result = Tb.load((Tb(_key='key%d' % i, name='name%d' % i)
+                          for i in range(1000)), batch_size=300)
+        assert result == 1000
+        assert Tb.select().count() == 1000
+
+    def test_bulk_load(self, Tb):
+        report = Tb.bulk_load((Tb(_key='key%d' % i, name='name%d' % i)
+                               for i in range(1000)), batch_size=300,
+                              concurrency=1)
+        assert (report.count, report.batches, report.errors) == (1000, 4, [])
+        assert Tb.select().count() == 1000
+
+    def test_load_rows(self, Tb):
+        result = Tb.load_rows([Tb._key, Tb.name],
+                              [('key1', 'foo'), ['key2', 'bar']])
+        assert result == 2
+        records = Tb.select().sortby(Tb._key).all()
+        assert [(r._key, r.name) for r in records] == [('key1', 'foo'),
+                                                      ('key2', 'bar')]
+
+    def test_record_commit(self, Tb):
+        Tb.load_rows([Tb._key, Tb.name], [('key1', 'foo'), ('key2', 'bar')])
+        record = Tb.select().sortby(Tb._key).all()[1]
+        record.name = 'baz'
+        assert record.commit() == 1
+        records = Tb.select().sortby(Tb._key).all()
+        assert [(r._id, r._key, r.name) for r in records] == [
+            (1, 'key1', 'foo'), (2, 'key2', 'baz')]
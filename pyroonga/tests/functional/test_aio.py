@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import json
+
+import pytest
+
+from pyroonga import aio
+from pyroonga.exceptions import GroongaError
+
+
+def run(coro):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+class TestAsyncGroonga(object):
+    def test_query(self):
+        grn = aio.AsyncGroonga()
+        result = json.loads(run(grn.query('status')))
+        assert 'version' in result
+
+    def test_query_with_invalid_command(self):
+        grn = aio.AsyncGroonga()
+        with pytest.raises(GroongaError):
+            run(grn.query('a'))
+
+    def test_query_many(self):
+        grn = aio.AsyncGroonga()
+        result = run(grn.query_many(['status', 'a', 'cache_limit']))
+        assert 'version' in json.loads(result[0])
+        assert isinstance(result[1], GroongaError)
+        assert isinstance(json.loads(result[2]), int)
+
+
+class TestAsyncGroongaPool(object):
+    def test_query(self):
+        pool = aio.AsyncGroongaPool(maxsize=4)
+
+        async def func():
+            try:
+                return await asyncio.gather(*[pool.query('status')
+                                              for _ in range(20)])
+            finally:
+                pool.close()
+        results = run(func())
+        assert len(results) == 20
+        assert all('version' in json.loads(r) for r in results)
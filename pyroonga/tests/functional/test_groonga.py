@@ -1,5 +1,7 @@
 # -*- coding: utf-8 -*-
 
+import json
+
 import pytest
 
 from pyroonga.exceptions import GroongaError
@@ -70,3 +72,64 @@ class TestGroonga(object):
             grn.query('unknown command')
         result = grn.query('cache_limit')
         assert result == '100'
+
+    def test_query_many(self):
+        grn = Groonga()
+        grn.connect()
+        result = grn.query_many(['cache_limit', 'unknown command',
+                                 'cache_limit'])
+        assert result[0] == '100'
+        assert isinstance(result[1], GroongaError)
+        assert result[2] == '100'
+        assert grn.connected is True
+        assert grn.query('cache_limit') == '100'
+
+
+class TestGroongaEmbedded(object):
+    @pytest.fixture
+    def grn(self, tmpdir):
+        grn = Groonga(path=str(tmpdir.join('test.db')))
+        grn.connect()
+        return grn
+
+    def test_connect(self, grn):
+        assert grn.connected is True
+        assert grn.embedded is True
+
+    def test_query(self, grn):
+        grn.query('table_create --name Site --flags TABLE_HASH_KEY'
+                  ' --key_type ShortText')
+        grn.query('load --table Site --input_type json'
+                  ' --values \'[{"_key": "key1"}]\'')
+        result = json.loads(grn.query('select --table Site'))
+        assert result == [[[1], [['_id', 'UInt32'], ['_key', 'ShortText']],
+                           [1, 'key1']]]
+
+    def test_reopen(self, tmpdir, grn):
+        grn.query('table_create --name Site --flags TABLE_HASH_KEY'
+                  ' --key_type ShortText')
+        del grn
+        grn = Groonga(path=str(tmpdir.join('test.db')))
+        grn.connect()
+        names = [t[1] for t in json.loads(grn.query('table_list'))[1:]]
+        assert 'Site' in names
+
+    def test_query_with_invalid_command(self, grn):
+        with pytest.raises(GroongaError):
+            grn.query('a')
+        assert grn.connected is True
+        grn.query('table_list')
+
+    def test_query_iter(self, grn):
+        grn.query('table_create --name Site --flags TABLE_HASH_KEY'
+                  ' --key_type ShortText')
+        result = ''.join(grn.query_iter('select --table Site'))
+        assert json.loads(result) == [[[0], [['_id', 'UInt32'],
+                                             ['_key', 'ShortText']]]]
+
+    def test_query_many(self, grn):
+        result = grn.query_many(['table_list', 'unknown command',
+                                 'cache_limit'])
+        assert json.loads(result[0])[0][0] == ['id', 'UInt32']
+        assert isinstance(result[1], GroongaError)
+        assert result[2] == '100'
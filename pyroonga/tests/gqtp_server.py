@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2013 Naoya Inada <naoina@kuune.org>
+# Licensed under the MIT License.
+
+"""Fake groonga server that speaks GQTP for tests"""
+
+__author__ = "Naoya Inada <naoina@kuune.org>"
+
+__all__ = [
+]
+
+import threading
+import time
+
+try:
+    import socketserver
+except ImportError:
+    import SocketServer as socketserver
+
+from pyroonga import gqtp
+
+
+def echo(command):
+    """Default handler that returns the command as is"""
+    return 0, command
+
+
+class GQTPHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        server = self.server
+        while True:
+            header = self._recvexactly(gqtp.HEADER_SIZE)
+            if header is None:
+                return
+            header = gqtp.Header.unpack(header)
+            command = self._recvexactly(header.size)
+            if command is None:
+                return
+            server.commands.append(command)
+            if server.delay:
+                time.sleep(server.delay)
+            response = server.handler(command)
+            if response is None:
+                # never respond
+                continue
+            status, body = response
+            self.request.sendall(self._pack(body, status))
+
+    def _pack(self, body, status):
+        size = self.server.chunk_size or len(body) or 1
+        chunks = [body[i:i + size] for i in range(0, len(body), size)] or [b'']
+        return b''.join(
+            gqtp.pack(chunk, flags=gqtp.TAIL if i == len(chunks) - 1 else
+                      gqtp.MORE, status=status)
+            for i, chunk in enumerate(chunks))
+
+    def _recvexactly(self, size):
+        buf = []
+        while size > 0:
+            data = self.request.recv(size)
+            if not data:
+                return None
+            buf.append(data)
+            size -= len(data)
+        return b''.join(buf)
+
+
+class GQTPServer(socketserver.ThreadingTCPServer):
+    """Fake groonga server on localhost
+
+    :param handler: callable that takes the command as ``bytes`` and returns
+        tuple of status and body of the response, or None not to respond.
+        Default is :func:`echo`\ .
+    :param chunk_size: If given, the response is split into packets of this
+        size.
+    :param delay: seconds to sleep before the response
+    """
+
+    allow_reuse_address = True
+    daemon_threads = True
+    # don't wait for the connections left open by clients on close
+    block_on_close = False
+
+    def __init__(self, handler=echo, chunk_size=None, delay=0):
+        socketserver.ThreadingTCPServer.__init__(self, ('127.0.0.1', 0),
+                                                 GQTPHandler)
+        self.handler = handler
+        self.chunk_size = chunk_size
+        self.delay = delay
+        self.commands = []
+        self._thread = None
+
+    @property
+    def host(self):
+        return self.server_address[0]
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        self._thread.join()
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2013 Naoya Inada <naoina@kuune.org>
+# Licensed under the MIT License.
+
+"""Stand-in of the HTTP interface of groonga for tests"""
+
+__author__ = "Naoya Inada <naoina@kuune.org>"
+
+__all__ = [
+]
+
+import gzip
+import io
+import json
+import threading
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import parse_qsl, urlsplit
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import parse_qsl, urlsplit
+
+
+def echo(command, args, body):
+    """Default handler that returns the arguments as the body"""
+    return 0, json.dumps(args)
+
+
+class GroongaHTTPHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self._handle(None)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        self._handle(self.rfile.read(length))
+
+    def _handle(self, body):
+        server = self.server
+        url = urlsplit(self.path)
+        command = url.path[len('/d/'):]
+        args = dict(parse_qsl(url.query))
+        server.requests.append((self.command, command, args, body))
+        status, result = server.handler(command, args, body)
+        header = [status, 0.0, 0.0]
+        content_type = 'application/json'
+        if args.get('output_type') == 'msgpack':
+            # the result is given as JSON
+            content_type = 'application/x-msgpack'
+            if status != 0:
+                header.append(result)
+                data = msgpack.packb([header])
+            else:
+                data = msgpack.packb([header, json.loads(result)])
+        elif status != 0:
+            header.append(result)
+            data = json.dumps([header]).encode('utf-8')
+        else:
+            data = ('[%s,%s]' % (json.dumps(header), result)).encode('utf-8')
+        self.send_response(200 if status == 0 else 400)
+        self.send_header('Content-Type', content_type)
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            buf = io.BytesIO()
+            f = gzip.GzipFile(fileobj=buf, mode='wb')
+            f.write(data)
+            f.close()
+            data = buf.getvalue()
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class GroongaHTTPServer(ThreadingMixIn, HTTPServer):
+    """Stand-in HTTP server of groonga on localhost
+
+    :param handler: callable that takes the name of command, dict of
+        arguments and the request body, and returns tuple of status and the
+        body of the response as JSON string. Default is :func:`echo`\ .
+    """
+
+    allow_reuse_address = True
+    daemon_threads = True
+    # don't wait for the kept-alive connections on close
+    block_on_close = False
+
+    def __init__(self, handler=echo):
+        HTTPServer.__init__(self, ('127.0.0.1', 0), GroongaHTTPHandler)
+        self.handler = handler
+        self.requests = []
+        self.connections = 0
+        self._thread = None
+
+    def process_request(self, request, client_address):
+        self.connections += 1
+        ThreadingMixIn.process_request(self, request, client_address)
+
+    @property
+    def host(self):
+        return self.server_address[0]
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        self._thread.join()
@@ -1,12 +1,18 @@
 # -*- coding: utf-8 -*-
 
+import array
+import json
 import random
+import re
+import threading
 from datetime import date, datetime
 
 import pytest
 
+from pyroonga.exceptions import GroongaError, GroongaTimeoutError
 from pyroonga.odm import attributes, query, table
 
+from pyroonga.pool import GroongaPool
 from pyroonga.tests import utils, mock
 
 
@@ -88,9 +94,43 @@ class TestGroongaRecord(object):
         expected = random.randint(1, 100)
         A.grn.query.return_value = expected
         record = query.GroongaRecord(A, foo='hoge')
-        object.__setattr__(record, '__dirty', True)
+        record.foo = 'fuga'
         result = record.commit()
         assert result == expected
+        A.grn.query.assert_called_once_with(
+            'load --table test_table_name --input-type json --columns foo '
+            '--values "[[\\"fuga\\"]]"', timeout=None)
+        assert record.commit() == 0
+
+    def test_commit_with_changed_columns(self):
+        class A(object):
+            __tablename__ = 'test_table_name'
+            _id = _key = title = body = views = None
+            grn = mock.Mock()
+        A.grn.query.return_value = 1
+        record = query.GroongaRecord(A, _id=1, _key='a', title='foo',
+                                     body='long body', views=1)
+        record.views = 2
+        record.title = 'bar'
+        record.views = 3
+        assert record.commit() == 1
+        A.grn.query.assert_called_once_with(
+            'load --table test_table_name --input-type json '
+            '--columns _key,title,views '
+            '--values "[[\\"a\\",\\"bar\\",3]]"', timeout=None)
+
+    def test_commit_without_key(self):
+        class A(object):
+            __tablename__ = 'test_table_name'
+            _id = body = views = None
+            grn = mock.Mock()
+        A.grn.query.return_value = 1
+        record = query.GroongaRecord(A, _id=3, body='long body', views=1)
+        record.views = 2
+        assert record.commit() == 1
+        A.grn.query.assert_called_once_with(
+            'load --table test_table_name --input-type json '
+            '--columns _id,views --values "[[3,2]]"', timeout=None)
 
     def test_asdict_with_no_attrs(self):
         record = query.GroongaRecord(None)
@@ -145,11 +185,11 @@ class TestGroongaRecord(object):
             foo = None
         record = query.GroongaRecord(A, foo='bar')
         assert record.foo == 'bar'
-        assert object.__getattribute__(record, '__dirty') is False
+        assert object.__getattribute__(record, '__dirty') == set()
         expected = utils.random_string()
         record.foo = expected
         assert record.foo == expected
-        assert object.__getattribute__(record, '__dirty') is True
+        assert object.__getattribute__(record, '__dirty') == set(['foo'])
 
 
 class TestDrilldown(object):
@@ -170,7 +210,586 @@ def make_match_column(name, tablename='T'):
     return c
 
 
+class TestTableRecord(object):
+    @pytest.fixture
+    def A(self):
+        class A(object):
+            __tablename__ = 'A'
+            grn = mock.Mock()
+        A.__record__ = query.record_class(A, ['_id', '_key', 'name'])
+        return A
+
+    def test___init__(self, A):
+        record = A.__record__(_id=1, name='foo')
+        assert isinstance(record, query.GroongaRecord)
+        assert record._id == 1
+        assert record.name == 'foo'
+        assert record._dirty == set()
+        assert not hasattr(record, '__dict__')
+        with pytest.raises(AttributeError):
+            record._key
+
+    def test___init___with_not_defined_key(self, A):
+        with pytest.raises(AttributeError):
+            A.__record__(missing='foo')
+
+    def test__maker(self, A):
+        make = A.__record__._maker(['_id', 'name'])
+        record = make([1, 'foo'])
+        assert type(record) is A.__record__
+        assert (record._id, record.name, record._dirty) == (1, 'foo', set())
+
+    def test__maker_with_not_defined_column(self, A):
+        with pytest.raises(AttributeError):
+            A.__record__._maker(['_id', 'missing'])
+
+    def test___setattr__(self, A):
+        record = A.__record__(_id=1, name='foo')
+        record.name = 'bar'
+        assert record.name == 'bar'
+        assert record._dirty == set(['name'])
+        with pytest.raises(AttributeError):
+            record.missing = 'foo'
+
+    def test_asdict(self, A):
+        record = A.__record__(_id=1, name='foo')
+        assert record.asdict() == {'_id': 1, 'name': 'foo'}
+        assert record.asdict(excludes=('_id',)) == {'name': 'foo'}
+
+    def test_commit(self, A):
+        A.grn.query.return_value = '1'
+        record = A.__record__(_id=1, _key='a', name='foo')
+        assert record.commit() == 0
+        record.name = 'bar'
+        assert record.commit() == 1
+        assert record._dirty == set()
+        A.grn.query.assert_called_once_with(
+            'load --table A --input-type json --columns _key,name '
+            '--values "[[\\"a\\",\\"bar\\"]]"', timeout=None)
+
+    def test_commit_with_typed_values(self, A):
+        A.grn.query.return_value = '1'
+        A.updated = table.Column(type=attributes.DataType.Time)
+        A.__record__ = query.record_class(A, ['_id', '_key', 'updated'])
+        make = A.__record__._maker(['_id', '_key', 'updated'])
+        record = query._typed_maker(make, query._converters(
+            A, ['_id', '_key', 'updated']))([1, 'a', 1.5])
+        assert record.updated == datetime.fromtimestamp(1.5)
+        record.updated = datetime.fromtimestamp(2.5)
+        assert record.commit() == 1
+        A.grn.query.assert_called_once_with(
+            'load --table A --input-type json --columns _key,updated '
+            '--values "[[\\"a\\",2.5]]"', timeout=None)
+
+    def test_delete(self, A):
+        A.grn.query.return_value = 'true'
+        record = A.__record__(_id=1)
+        assert record.delete() is True
+        assert isinstance(record.delete(immediate=False), query.SimpleQuery)
+
+
+class TestGroongaSelectResult(object):
+    class A(object):
+        __tablename__ = 'A'
+        _id = None
+        name = None
+
+    resultstr = (b'[[[5],[["_id","UInt32"],["name","ShortText"]],'
+                 b'[1,"a"],[2,"b"],[3,"c"]],'
+                 b'[[2],[["_key","ShortText"],["_nsubrecs","Int32"]],'
+                 b'["x",1],["y",2]]]')
+
+    def test___init__(self):
+        result = query.GroongaSelectResult(self.A, self.resultstr)
+        assert result.all_len == 5
+        assert len(result) == 3
+        assert [(r._id, r.name) for r in result] == [(1, 'a'), (2, 'b'),
+                                                     (3, 'c')]
+        drilldown = result.drilldown[0]
+        assert drilldown.all_len == 2
+        assert [(r._key, r._nsubrecs) for r in drilldown] == [('x', 1),
+                                                             ('y', 2)]
+
+    def test___init___with_maxlen(self):
+        result = query.GroongaSelectResult(self.A, self.resultstr, maxlen=2)
+        assert len(result) == 2
+        assert [r._id for r in result] == [1, 2]
+
+    def test___getitem__(self):
+        result = query.GroongaSelectResult(self.A, self.resultstr)
+        assert isinstance(result[0], query.GroongaRecord)
+        assert result[0]._id == 1
+        assert result[-1]._id == 3
+        assert [r._id for r in result[1:]] == [2, 3]
+        assert [r._id for r in result[::-2]] == [3, 1]
+        assert isinstance(result[:1], tuple)
+        with pytest.raises(IndexError):
+            result[3]
+
+    def test___reversed__(self):
+        result = query.GroongaSelectResult(self.A, self.resultstr)
+        assert [r._id for r in reversed(result)] == [3, 2, 1]
+
+    def test___init___with_record_class(self):
+        class B(self.A):
+            pass
+        B.__record__ = query.record_class(B, ['_id', 'name'])
+        result = query.GroongaSelectResult(B, self.resultstr)
+        assert [type(r) for r in result] == [B.__record__] * 3
+        assert [r.name for r in result] == ['a', 'b', 'c']
+
+    typed_resultstr = (b'[[[2],[["_id","UInt32"],["price","Int32"],'
+                       b'["rate","Float"],["updated","Time"],'
+                       b'["public","Bool"],["tags","ShortText"],'
+                       b'["name","ShortText"]],'
+                       b'[1,-3,0.5,1380000000.25,true,["a","b"],"foo"],'
+                       b'[2,7,1.5,1380000001.5,false,[],"bar"]]]')
+
+    @pytest.mark.parametrize(('name', 'typecode', 'expected'), (
+        ('_id', 'I', [1, 2]),
+        ('price', 'i', [-3, 7]),
+        ('rate', 'd', [0.5, 1.5]),
+        ('updated', 'd', [1380000000.25, 1380000001.5]),
+        ('public', 'b', [1, 0]),
+    ))
+    def test_column(self, name, typecode, expected):
+        result = query.GroongaSelectResult(self.A, self.typed_resultstr)
+        values = result.column(name, use_numpy=False)
+        assert isinstance(values, array.array)
+        assert values.typecode == typecode
+        assert values.tolist() == expected
+
+    def test_column_with_not_numeric(self):
+        result = query.GroongaSelectResult(self.A, self.typed_resultstr)
+        assert result.column('name', use_numpy=False) == ['foo', 'bar']
+        assert result.column('tags', use_numpy=False) == [['a', 'b'], []]
+
+    def test_column_with_column(self):
+        col = table.Column()
+        col.name = 'price'
+        result = query.GroongaSelectResult(self.A, self.typed_resultstr)
+        assert result.column(col, use_numpy=False).tolist() == [-3, 7]
+
+    def test_column_with_unknown(self):
+        result = query.GroongaSelectResult(self.A, self.typed_resultstr)
+        with pytest.raises(KeyError):
+            result.column('missing')
+
+    def test_column_with_maxlen(self):
+        result = query.GroongaSelectResult(self.A, self.typed_resultstr,
+                                           maxlen=1)
+        assert result.column('price', use_numpy=False).tolist() == [-3]
+
+    def test_column_with_numpy(self):
+        numpy = pytest.importorskip('numpy')
+        result = query.GroongaSelectResult(self.A, self.typed_resultstr)
+        values = result.column('price', use_numpy=True)
+        assert values.dtype == numpy.int32
+        assert values.tolist() == [-3, 7]
+        assert result.column('updated').dtype == numpy.float64
+        assert result.column('name') == ['foo', 'bar']
+
+    def test_column_without_numpy(self, monkeypatch):
+        monkeypatch.setattr(query, 'numpy', None)
+        result = query.GroongaSelectResult(self.A, self.typed_resultstr)
+        assert isinstance(result.column('price'), array.array)
+        with pytest.raises(ImportError):
+            result.column('price', use_numpy=True)
+
+    def test_columnar(self):
+        result = query.GroongaSelectResult(self.A, self.typed_resultstr)
+        with mock.patch.object(query, 'GroongaRecord') as record:
+            values = result.columnar(['_id', 'name'], use_numpy=False)
+        assert record.mock_calls == []
+        assert values['_id'].tolist() == [1, 2]
+        assert values['name'] == ['foo', 'bar']
+        assert sorted(result.columnar(use_numpy=False)) == [
+            '_id', 'name', 'price', 'public', 'rate', 'tags', 'updated']
+
+    def test_mapping_is_lazy(self):
+        result = query.GroongaSelectResult(self.A, self.resultstr)
+        with mock.patch.object(query, 'GroongaRecord') as record:
+            it = iter(result)
+            assert record.mock_calls == []
+            next(it)
+            assert record.mock_calls == [mock.call(self.A, _id=1, name='a')]
+
+    def test_mapped_records_are_kept(self):
+        result = query.GroongaSelectResult(self.A, self.resultstr)
+        first = result[0]
+        assert result[0] is first
+        assert result[-3] is first
+        assert next(iter(result)) is first
+        assert result[:1][0] is first
+        assert list(reversed(result))[-1] is first
+        first.name = 'x'
+        assert result[0].name == 'x'
+        with mock.patch.object(query, 'GroongaRecord') as record:
+            list(result)
+            assert record.mock_calls == []
+
+    class Typed(object):
+        __tablename__ = 'Typed'
+        _id = None
+        updated = table.Column(type=attributes.DataType.Time)
+        location = table.Column(type=attributes.DataType.WGS84GeoPoint)
+        times = table.Column(flags=attributes.ColumnFlags.COLUMN_VECTOR,
+                             type=attributes.DataType.Time)
+        tags = table.Column(flags=attributes.ColumnFlags.COLUMN_VECTOR)
+        name = table.Column()
+
+    typed_values = (b'[[[2],[["_id","UInt32"],["updated","Time"],'
+                    b'["location","WGS84GeoPoint"],["times","Time"],'
+                    b'["tags","ShortText"],["name","ShortText"]],'
+                    b'[1,1380000000.5,"128452975x503157902",[0.0,1.5],'
+                    b'["a"],"foo"],'
+                    b'[2,null,"35.681396x139.766049",[],[],"bar"]]]')
+
+    def test___init___with_typed(self):
+        result = query.GroongaSelectResult(self.Typed, self.typed_values,
+                                           typed=True)
+        first, second = result
+        assert first._id == 1
+        assert first.updated == datetime.fromtimestamp(1380000000.5)
+        assert first.location == (128452975 / 3600000.0,
+                                  503157902 / 3600000.0)
+        assert first.times == [datetime.fromtimestamp(0.0),
+                               datetime.fromtimestamp(1.5)]
+        assert first.tags == ['a']
+        assert first.name == 'foo'
+        assert second.updated is None
+        assert second.location == (35.681396, 139.766049)
+        assert second.times == []
+        assert result.column('updated', use_numpy=False) == [1380000000.5,
+                                                             None]
+
+    def test___init___without_typed(self):
+        result = query.GroongaSelectResult(self.Typed, self.typed_values)
+        assert result[0].updated == 1380000000.5
+        assert result[0].location == '128452975x503157902'
+
+    def test___init___with_typed_converters_once(self):
+        with mock.patch.object(query, '_converters',
+                               wraps=query._converters) as converters:
+            result = query.GroongaSelectResult(self.Typed, self.typed_values,
+                                               typed=True)
+            list(result)
+            list(result)
+        assert converters.call_count == 1
+
+    def test___init___with_typed_nothing_to_convert(self):
+        result = query.GroongaSelectResult(self.A, self.resultstr, typed=True)
+        assert [(r._id, r.name) for r in result] == [(1, 'a'), (2, 'b'),
+                                                     (3, 'c')]
+
+
 class TestSelectQuery(object):
+    def test_all_many(self):
+        class A(object):
+            __tablename__ = 'A'
+            _id = None
+            grn = mock.MagicMock()
+        error = GroongaError(-22)
+        A.grn.query_many.return_value = [
+            b'[[[1],[["_id","UInt32"]],[1]]]', error]
+        q1 = query.SelectQuery(A)
+        q2 = query.SelectQuery(A).limit(1)
+        result = query.SelectQuery.all_many([q1, q2])
+        assert A.grn.query_many.mock_calls == [
+            mock.call(['select --table A', 'select --table A --limit 1'],
+                      raw=True, timeout=None)]
+        assert isinstance(result[0], query.GroongaSelectResult)
+        assert [r._id for r in result[0]] == [1]
+        assert result[1] is error
+
+    def test_all_with_timeout(self):
+        class A(object):
+            __tablename__ = 'A'
+            _id = None
+            grn = mock.MagicMock()
+        A.grn.query.return_value = b'[[[1],[["_id","UInt32"]],[1]]]'
+        result = query.SelectQuery(A).all(timeout=3)
+        assert [r._id for r in result] == [1]
+        assert A.grn.query.mock_calls == [
+            mock.call('select --table A', raw=True, timeout=3)]
+
+    def test_stream(self):
+        class A(object):
+            __tablename__ = 'A'
+            _id = None
+            updated = table.Column(type=attributes.DataType.Time)
+            grn = mock.MagicMock()
+        A.__record__ = query.record_class(A, ['_id', 'updated'])
+        s = '[[[2],[["_id","UInt32"],["updated","Time"]],[1,0.0],[2,1.5]]]'
+        A.grn.query_iter.side_effect = lambda qstr, timeout: iter(s)
+        records = list(query.SelectQuery(A).typed().stream(timeout=3))
+        assert [type(r) for r in records] == [A.__record__] * 2
+        assert [(r._id, r.updated) for r in records] == [
+            (1, datetime.fromtimestamp(0.0)), (2, datetime.fromtimestamp(1.5))]
+        assert A.grn.query_iter.mock_calls == [
+            mock.call('select --table A', timeout=3)]
+
+    def test_stream_with_msgpack(self):
+        class A(object):
+            __tablename__ = 'A'
+            grn = mock.MagicMock()
+        with pytest.raises(ValueError):
+            query.SelectQuery(A).output_type('msgpack').stream()
+        assert A.grn.query_iter.mock_calls == []
+
+    def test_count(self):
+        class A(object):
+            __tablename__ = 'A'
+            grn = mock.MagicMock()
+        name = table.Column()
+        name.name = 'name'
+        A.grn.query.return_value = b'[[[42],[["_id","UInt32"]]]]'
+        q = query.SelectQuery(A, name='foo').sortby(name).limit(5)
+        assert q.count(timeout=3) == 42
+        assert A.grn.query.mock_calls == [
+            mock.call('select --table A --limit 0   --output_columns _id   '
+                      r'--query "(name:@\"foo\")"', raw=True, timeout=3)]
+        assert str(q).startswith('select --table A --limit 5  --sortby name')
+
+    def test_count_with_msgpack(self):
+        msgpack = pytest.importorskip('msgpack')
+
+        class A(object):
+            __tablename__ = 'A'
+            grn = mock.MagicMock()
+        A.grn.query.return_value = msgpack.packb([[[3], [['_id', 'UInt32']]]])
+        assert query.SelectQuery(A).output_type('msgpack').count() == 3
+
+    @pytest.mark.parametrize(('count', 'expected'), ((0, False), (1, True)))
+    def test_exists(self, count, expected):
+        class A(object):
+            __tablename__ = 'A'
+            grn = mock.MagicMock()
+        A.grn.query.return_value = (
+            '[[[%d],[["_id","UInt32"]]]]' % count).encode('utf-8')
+        assert query.SelectQuery(A).exists() is expected
+
+    @pytest.fixture
+    def Paged(self):
+        class A(object):
+            __tablename__ = 'A'
+            _id = None
+            grn = mock.MagicMock()
+
+        def query(qstr, raw=False, timeout=None):
+            args = qstr.split()
+            offset = int(args[args.index('--offset') + 1]
+                         if '--offset' in args else 0)
+            limit = int(args[args.index('--limit') + 1])
+            ids = range(1, 8)[offset:offset + limit]
+            return ('[[[7],[["_id","UInt32"]]%s]]' %
+                    ''.join(',[%d]' % i for i in ids)).encode('utf-8')
+        A.grn.query.side_effect = query
+        return A
+
+    @pytest.mark.parametrize('prefetch', (0, 1, 3))
+    def test_iter_pages(self, Paged, prefetch):
+        pages = query.SelectQuery(Paged).iter_pages(3, prefetch=prefetch)
+        assert [[r._id for r in page] for page in pages] == [
+            [1, 2, 3], [4, 5, 6], [7]]
+        assert Paged.grn.query.mock_calls == [
+            mock.call('select --table A --limit 3%s' % offset, raw=True,
+                      timeout=None)
+            for offset in ('', ' --offset 3', ' --offset 6')]
+
+    def test_iter_pages_with_single_connection(self, Paged):
+        grn = Paged.grn
+        Paged.grn = mock.Mock(spec=['query'])
+        Paged.grn.query.side_effect = grn.query.side_effect
+        with mock.patch('pyroonga.utils.prefetch') as prefetch:
+            pages = query.SelectQuery(Paged).iter_pages(3, prefetch=1)
+            assert [[r._id for r in page] for page in pages] == [
+                [1, 2, 3], [4, 5, 6], [7]]
+        assert prefetch.mock_calls == []
+
+    def test_iter_pages_with_pool(self, Paged):
+        with mock.patch('pyroonga.utils.prefetch') as prefetch:
+            query.SelectQuery(Paged).iter_pages(3, prefetch=2)
+        assert len(prefetch.mock_calls) == 1
+        assert prefetch.call_args[0][1] == 2
+
+    def test_iter_pages_with_limit_and_offset(self, Paged):
+        q = query.SelectQuery(Paged).limit(4).offset(1)
+        pages = q.iter_pages(3, timeout=5)
+        assert [[r._id for r in page] for page in pages] == [[2, 3, 4], [5]]
+        assert Paged.grn.query.mock_calls == [
+            mock.call('select --table A --limit 3 --offset 1', raw=True,
+                      timeout=5),
+            mock.call('select --table A --limit 1 --offset 4', raw=True,
+                      timeout=5)]
+        assert str(q) == 'select --table A --limit 4 --offset 1'
+
+    def test_iter_pages_with_exact_pages(self, Paged):
+        pages = query.SelectQuery(Paged).iter_pages(7)
+        assert [len(page) for page in pages] == [7]
+        assert len(Paged.grn.query.mock_calls) == 1
+
+    def test_iter_pages_with_error(self, Paged):
+        error = GroongaError(-22)
+        Paged.grn.query.side_effect = error
+        pages = query.SelectQuery(Paged).iter_pages(3)
+        with pytest.raises(GroongaError) as excinfo:
+            next(pages)
+        assert excinfo.value is error
+
+    @pytest.mark.parametrize(('page_size', 'prefetch'), ((0, 1), (1, -1)))
+    def test_iter_pages_with_invalid_args(self, Paged, page_size, prefetch):
+        with pytest.raises(ValueError):
+            query.SelectQuery(Paged).iter_pages(page_size, prefetch)
+
+    @pytest.fixture
+    def Scanned(self):
+        class A(object):
+            __tablename__ = 'A'
+            _id = None
+            grn = mock.MagicMock()
+
+        def query(qstr, raw=False, timeout=None):
+            args = qstr.split()
+            limit = int(args[args.index('--limit') + 1])
+            ids = list(range(1, 8))
+            if '-_id' in args:
+                ids.reverse()
+            after = re.search(r'_id ([<>]) (\d+)', qstr)
+            if after:
+                op, last_id = after.group(1), int(after.group(2))
+                ids = [i for i in ids if (i < last_id if op == '<' else
+                                          i > last_id)]
+            return ('[[[%d],[["_id","UInt32"]]%s]]' % (
+                len(ids), ''.join(',[%d]' % i for i in ids[:limit]))
+            ).encode('utf-8')
+        A.grn.query.side_effect = query
+        return A
+
+    def test_scan(self, Scanned):
+        records = query.SelectQuery(Scanned).scan(3, timeout=5)
+        assert [r._id for r in records] == [1, 2, 3, 4, 5, 6, 7]
+        assert Scanned.grn.query.mock_calls == [
+            mock.call('select --table A --limit 3  --sortby _id', raw=True,
+                      timeout=5),
+            mock.call('select --table A --limit 3  --sortby _id     '
+                      '--filter "(_id > 3)"', raw=True, timeout=5),
+            mock.call('select --table A --limit 3  --sortby _id     '
+                      '--filter "(_id > 6)"', raw=True, timeout=5)]
+
+    def test_scan_with_filters(self, Scanned):
+        q = query.SelectQuery(Scanned).filter(query.GE('a') == 1,
+                                              query.GE('b') == 2)
+        assert [r._id for r in q.scan(4)] == [1, 2, 3, 4, 5, 6, 7]
+        assert Scanned.grn.query.mock_calls[1] == mock.call(
+            'select --table A --limit 4  --sortby _id     --filter '
+            '"(((a == 1) || (b == 2)) && (_id > 4))"', raw=True,
+            timeout=None)
+        assert q._filters[0].build(query.FilterExpression) == '(a == 1)'
+
+    def test_scan_with_desc_and_limit(self, Scanned):
+        _id = table.Column()
+        _id.name = '_id'
+        q = query.SelectQuery(Scanned).sortby(-_id).limit(5)
+        assert [r._id for r in q.scan(2)] == [7, 6, 5, 4, 3]
+        assert [c[1][0].split()[4] for c in
+                Scanned.grn.query.mock_calls] == ['2', '2', '1']
+        assert '(_id < 4)' in Scanned.grn.query.mock_calls[-1][1][0]
+
+    def test_scan_with_output_columns(self, Scanned):
+        name = table.Column()
+        name.name = 'name'
+        q = query.SelectQuery(Scanned).output_columns(name)
+        list(q.scan(10))
+        assert '--output_columns name,_id' in (
+            Scanned.grn.query.mock_calls[0][1][0])
+        assert [c.name for c in q._output_columns] == ['name']
+
+    def test_scan_with_invalid_args(self, Scanned):
+        key = table.Column()
+        key.name = '_key'
+        with pytest.raises(ValueError):
+            query.SelectQuery(Scanned).scan(0)
+        with pytest.raises(ValueError):
+            query.SelectQuery(Scanned).offset(10).scan(10)
+        with pytest.raises(ValueError):
+            query.SelectQuery(Scanned).sortby(key).scan(10)
+
+    def test_all_many_with_empty(self):
+        assert query.SelectQuery.all_many([]) == []
+
+    def test_all_many_with_different_connections(self):
+        class A(object):
+            __tablename__ = 'A'
+            grn = mock.MagicMock()
+
+        class B(object):
+            __tablename__ = 'B'
+            grn = mock.MagicMock()
+        with pytest.raises(ValueError):
+            query.SelectQuery.all_many([query.SelectQuery(A),
+                                        query.SelectQuery(B)])
+
+    def test_output_type(self):
+        class A(object):
+            __tablename__ = 'A'
+        q = query.SelectQuery(A)
+        assert q.output_type('msgpack') is q
+        assert str(q) == 'select --table A --output_type msgpack'
+        assert str(q.output_type('json')) == 'select --table A'
+        with pytest.raises(ValueError):
+            q.output_type('xml')
+
+    def test_output_type_with_drilldown(self):
+        class A(object):
+            __tablename__ = 'A'
+            name = table.Column()
+        A.name.name = 'name'
+        q = query.SelectQuery(A).drilldown(A.name).output_type('msgpack')
+        assert q._output_type == 'msgpack'
+        assert str(q) == ('select --table A --output_type msgpack'
+                          ' --drilldown name')
+
+    def test_typed(self):
+        class A(object):
+            __tablename__ = 'A'
+            updated = table.Column(type=attributes.DataType.Time)
+            grn = mock.MagicMock()
+        A.grn.query.return_value = (b'[[[1],[["updated","Time"]],'
+                                    b'[1380000000.0]]]')
+        q = query.SelectQuery(A)
+        assert q.typed() is q
+        assert str(q) == 'select --table A'
+        result = q.all()
+        assert result[0].updated == datetime.fromtimestamp(1380000000.0)
+        assert q.typed(False).all()[0].updated == 1380000000.0
+
+    def test_typed_with_drilldown(self):
+        class A(object):
+            __tablename__ = 'A'
+            name = table.Column()
+        A.name.name = 'name'
+        parent = query.SelectQuery(A)
+        q = parent.drilldown(A.name)
+        assert q.typed() is q
+        assert parent._typed is True
+        assert q._typed is True
+
+    def test_all_with_msgpack(self):
+        msgpack = pytest.importorskip('msgpack')
+
+        class A(object):
+            __tablename__ = 'A'
+            _id = None
+            grn = mock.MagicMock()
+        A.grn.query.return_value = msgpack.packb(
+            [[[1], [['_id', 'UInt32']], [1]]])
+        result = query.SelectQuery(A).output_type('msgpack').all()
+        assert [r._id for r in result] == [1]
+        assert A.grn.query.mock_calls == [
+            mock.call('select --table A --output_type msgpack', raw=True,
+                      timeout=None)]
+
     def test_match_columns(self):
         q = query.SelectQuery(mock.MagicMock())
         result = q.match_columns()
@@ -839,6 +1458,299 @@ class TestExpressionTree(BaseTestExpression):
         assert et3.build(A) == '(left3+((left1|right1)&right2))'
 
 
+class TestLoadQuery(object):
+    class Data(object):
+        def __init__(self, key):
+            self.key = key
+
+        def asdict(self, excludes=()):
+            return {'_key': self.key}
+
+    @pytest.fixture
+    def A(self):
+        class A(object):
+            __tablename__ = 'A'
+            grn = mock.MagicMock()
+        A.grn.query.side_effect = lambda q, timeout: str(q.count('_key'))
+        return A
+
+    def test_commit(self, A):
+        q = query.LoadQuery(A, [self.Data('a'), self.Data('b')])
+        assert q.commit(timeout=3) == 2
+        assert A.grn.query.mock_calls == [
+            mock.call('load --table A --input-type json --values '
+                      r'"[{\"_key\": \"a\"}, {\"_key\": \"b\"}]"',
+                      timeout=3)]
+        with pytest.raises(RuntimeError):
+            q.commit()
+
+    def test_commit_with_typed_values(self, A):
+        class Data(object):
+            def asdict(self, excludes=()):
+                return {'_key': 'a', 'updated': datetime.fromtimestamp(1.5)}
+        updated = table.Column(type=attributes.DataType.Time)
+        updated.name = 'updated'
+        A.updated = updated
+        A.columns = [updated]
+        q = query.LoadQuery(A, [Data()])
+        assert q.commit(timeout=3) == 1
+        assert A.grn.query.call_args[0][0].endswith(r'\"updated\": 1.5}]"')
+
+    def test_commit_with_vector_values(self, A):
+        class Data(object):
+            def __init__(self, tags, times):
+                self.tags, self.times = tags, times
+
+            def asdict(self, excludes=()):
+                return {'tags': self.tags, 'times': self.times}
+        tags = table.Column(flags=attributes.ColumnFlags.COLUMN_VECTOR,
+                            type=attributes.DataType.ShortText)
+        tags.name = 'tags'
+        times = table.Column(flags=attributes.ColumnFlags.COLUMN_VECTOR,
+                             type=attributes.DataType.Time)
+        times.name = 'times'
+        A.tags, A.times = tags, times
+        A.columns = [tags, times]
+        q = query.LoadQuery(A, [
+            Data('single', datetime.fromtimestamp(1.5)),
+            Data(['a', 'b'], (datetime.fromtimestamp(2.5),))])
+        values = json.loads(q._makejson(q._data))
+        assert [(v['tags'], v['times']) for v in values] == [
+            ('single', 1.5), (['a', 'b'], [2.5])]
+
+    def test_commit_with_batch_size(self, A):
+        data = (self.Data(k) for k in 'abcde')
+        q = query.LoadQuery(A, data)
+        assert q.commit(timeout=3, batch_size=2) == 5
+        assert [c[1][0].count('_key') for c in A.grn.query.mock_calls] == [
+            2, 2, 1]
+        assert A.grn.query.mock_calls[-1] == mock.call(
+            'load --table A --input-type json --values '
+            r'"[{\"_key\": \"e\"}]"', timeout=3)
+        with pytest.raises(RuntimeError):
+            q.commit(batch_size=2)
+
+    def test_commit_with_batch_size_consumes_lazily(self, A):
+        consumed = []
+
+        def data():
+            for k in 'abc':
+                consumed.append(k)
+                yield self.Data(k)
+
+        def query_(q, timeout):
+            calls.append(list(consumed))
+            return str(q.count('_key'))
+        calls = []
+        A.grn.query.side_effect = query_
+        assert query.LoadQuery(A, data()).commit(batch_size=1) == 3
+        assert calls == [['a'], ['a', 'b'], ['a', 'b', 'c']]
+
+    def test_commit_with_batch_size_and_empty(self, A):
+        assert query.LoadQuery(A, []).commit(batch_size=10) == 0
+        assert A.grn.query.mock_calls == []
+
+    def test_commit_with_invalid_batch_size(self, A):
+        with pytest.raises(ValueError):
+            query.LoadQuery(A, []).commit(batch_size=0)
+
+    def test_commit_with_batch_size_and_error(self, A):
+        error = GroongaError(-2)
+        results = ['2', error, '2', '1']
+
+        def load(q, timeout):
+            result = results.pop(0)
+            if isinstance(result, Exception):
+                raise result
+            return result
+        A.grn.query.side_effect = load
+        q = query.LoadQuery(A, (self.Data(k) for k in 'abcde'))
+        with pytest.raises(GroongaError) as excinfo:
+            q.commit(batch_size=2)
+        assert excinfo.value is error
+        assert excinfo.value.loaded == 2
+        assert q.commit(batch_size=2) == 3
+        assert [re.findall(r'_key\\": \\"(\w)', c[1][0]) for c in
+                A.grn.query.mock_calls] == [
+            ['a', 'b'], ['c', 'd'], ['c', 'd'], ['e']]
+
+    def test_commit_async_with_batch_size(self, A):
+        with pytest.raises(ValueError):
+            query.LoadQuery(A, []).commit_async(batch_size=2)
+        assert A.grn.query.mock_calls == []
+
+
+class TestRowsLoadQuery(object):
+    @pytest.fixture
+    def A(self):
+        class A(object):
+            __tablename__ = 'A'
+            grn = mock.MagicMock()
+        A.grn.query.side_effect = lambda q, timeout: str(q.count('],['))
+        return A
+
+    def test___str__(self, A):
+        name = table.Column()
+        name.name = 'name'
+        q = query.RowsLoadQuery(A, ['_key', name], [('a', u'さくら'),
+                                                    ['b', 'x y']])
+        assert str(q) == (
+            'load --table A --input-type json --columns _key,name --values '
+            r'"[[\"a\",\"\\u3055\\u304f\\u3089\"],[\"b\",\"x y\"]]"')
+
+    def test_commit_with_batch_size(self, A):
+        rows = ((str(i), i) for i in range(5))
+        q = query.RowsLoadQuery(A, ['_key', 'n'], rows)
+        q.commit(batch_size=2)
+        assert [c[1][0].split(' --values ')[1] for c in
+                A.grn.query.mock_calls] == [
+            r'"[[\"0\",0],[\"1\",1]]"', r'"[[\"2\",2],[\"3\",3]]"',
+            r'"[[\"4\",4]]"']
+
+    def test___init___without_columns(self, A):
+        with pytest.raises(ValueError):
+            query.RowsLoadQuery(A, [], [])
+
+    def test___str___with_typed_values(self, A):
+        A.updated = table.Column(type=attributes.DataType.Time)
+        A.location = table.Column(type=attributes.DataType.WGS84GeoPoint)
+        q = query.RowsLoadQuery(A, ['_key', 'updated', 'location'], [
+            ('a', datetime.fromtimestamp(1.5), (35.5, 139.25)),
+            ('b', 2.5, None)])
+        assert str(q).split(' --values ')[1] == (
+            r'"[[\"a\",1.5,\"35.5x139.25\"],[\"b\",2.5,null]]"')
+
+    def test___str___with_vector_values(self, A):
+        A.tags = table.Column(flags=attributes.ColumnFlags.COLUMN_VECTOR,
+                              type=attributes.DataType.ShortText)
+        A.times = table.Column(flags=attributes.ColumnFlags.COLUMN_VECTOR,
+                               type=attributes.DataType.Time)
+        q = query.RowsLoadQuery(A, ['_key', 'tags', 'times'], [
+            ('a', 'single', [datetime.fromtimestamp(1.5)]),
+            ('b', ('x', 'y'), datetime.fromtimestamp(2.5))])
+        assert str(q).split(' --values ')[1] == (
+            r'"[[\"a\",\"single\",[1.5]],[\"b\",[\"x\",\"y\"],2.5]]"')
+
+
+class TestBulkLoad(object):
+    Data = TestLoadQuery.Data
+
+    @pytest.fixture
+    def A(self):
+        class A(object):
+            __tablename__ = 'A'
+            grn = mock.MagicMock(spec=GroongaPool)
+        A.grn.query.side_effect = lambda q, timeout: str(q.count('_key'))
+        return A
+
+    def test_bulk_load(self, A):
+        data = (self.Data(str(i)) for i in range(10))
+        report = query.bulk_load(A, data, batch_size=3, concurrency=2,
+                                 timeout=5)
+        assert report.count == 10
+        assert report.batches == 4
+        assert report.retried == 0
+        assert report.errors == []
+        assert report.throughput > 0
+        assert sorted(c[1][0].count('_key') for c in
+                      A.grn.query.mock_calls) == [1, 3, 3, 3]
+        assert set(c[2]['timeout'] for c in A.grn.query.mock_calls) == set([5])
+
+    def test_bulk_load_uses_load_of_table(self, A):
+        A._load = mock.MagicMock()
+        A._load.return_value.commit.return_value = 1
+        report = query.bulk_load(A, [self.Data('a')], concurrency=1)
+        assert report.count == 1
+        assert A._load.mock_calls[0] == mock.call([mock.ANY])
+
+    def test_bulk_load_concurrently(self, A):
+        started = [threading.Event(), threading.Event()]
+        concurrent = []
+
+        def load(q, timeout):
+            i = int(q.split('\\"')[3])
+            started[i].set()
+            concurrent.append(started[1 - i].wait(1))
+            return '1'
+        A.grn.query.side_effect = load
+        report = query.bulk_load(A, [self.Data('0'), self.Data('1')],
+                                 batch_size=1, concurrency=2)
+        assert report.count == 2
+        assert concurrent == [True, True]
+
+    def test_bulk_load_with_retry(self, A):
+        results = [GroongaError(-2), GroongaError(-2), '1', '1']
+        lock = threading.Lock()
+
+        def load(q, timeout):
+            with lock:
+                result = results.pop(0)
+            if isinstance(result, Exception):
+                raise result
+            return result
+        A.grn.query.side_effect = load
+        report = query.bulk_load(A, [self.Data('a'), self.Data('b')],
+                                 batch_size=1, concurrency=1, backoff=0)
+        assert report.count == 2
+        assert report.batches == 2
+        assert report.retried == 2
+        assert report.errors == []
+
+    def test_bulk_load_with_error(self, A):
+        error = GroongaError(-2)
+
+        def load(q, timeout):
+            if '\\"b\\"' in q:
+                raise error
+            return '1'
+        A.grn.query.side_effect = load
+        data = [self.Data(k) for k in 'abcb']
+        report = query.bulk_load(A, data, batch_size=1, retries=1, backoff=0)
+        assert report.count == 2
+        assert report.batches == 2
+        assert report.retried == 2
+        assert report.errors == [query.FailedBatch(1, [data[1]], error),
+                                 query.FailedBatch(3, [data[3]], error)]
+
+    def test_bulk_load_reconnects_before_retry(self, A):
+        A.grn = mock.Mock(spec=['query', 'connected', 'reconnect'])
+        A.grn.connected = True
+
+        def load(q, timeout):
+            if not A.grn.connected:
+                raise GroongaError(-2)
+            if not A.grn.reconnect.called:
+                A.grn.connected = False
+                raise GroongaTimeoutError('timed out')
+            return '1'
+
+        def reconnect():
+            A.grn.connected = True
+        A.grn.query.side_effect = load
+        A.grn.reconnect.side_effect = reconnect
+        report = query.bulk_load(A, [self.Data('a')], concurrency=1,
+                                 backoff=0)
+        assert report.count == 1
+        assert report.retried == 1
+        assert A.grn.reconnect.mock_calls == [mock.call()]
+
+    @pytest.mark.parametrize('kwargs', (
+        {'batch_size': 0}, {'concurrency': 0}, {'retries': -1}))
+    def test_bulk_load_with_invalid_args(self, A, kwargs):
+        with pytest.raises(ValueError):
+            query.bulk_load(A, [], **kwargs)
+
+    def test_bulk_load_without_pool(self, A):
+        A.grn = mock.Mock(spec=['query', 'checkout'])
+        with pytest.raises(ValueError):
+            query.bulk_load(A, [], concurrency=2)
+        assert query.bulk_load(A, [], concurrency=1).count == 0
+
+    def test_throughput(self):
+        assert query.LoadReport(10, 1, 0, [], 2.0).throughput == 5.0
+        assert query.LoadReport(0, 0, 0, [], 0).throughput == 0.0
+
+
 class TestSimpleQuery(object):
     @pytest.fixture
     def query(self):
@@ -951,3 +1863,14 @@ class TestSimpleQuery(object):
         result = record.execute()
         assert result == expected
         assert A.grn.query.mock_calls == [mock.call('')]
+
+    def test_output_type(self):
+        class A(object):
+            grn = mock.MagicMock()
+        msgpack = pytest.importorskip('msgpack')
+        A.grn.query.return_value = msgpack.packb([True])
+        q = query.SimpleQuery(A).log_reopen().output_type('msgpack')
+        assert str(q) == 'log_reopen --output_type msgpack'
+        assert q.execute() == [True]
+        assert A.grn.query.mock_calls == [
+            mock.call('log_reopen --output_type msgpack', raw=True)]
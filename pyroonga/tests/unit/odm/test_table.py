@@ -21,6 +21,29 @@ class TestTable(object):
             pass
         assert isinstance(getattr(T, attr, None), table.Column)
 
+    def test___record__(self):
+        Table = table.tablebase()
+
+        class T(Table):
+            name = table.Column()
+
+        class U(T):
+            age = table.Column()
+        assert issubclass(T.__record__, query.TableRecord)
+        assert T.__record__.__table__ is T
+        assert sorted(T.__record__.__slots__) == [
+            '_id', '_key', '_nsubrecs', '_score', 'name']
+        assert U.__record__.__table__ is U
+        assert sorted(U.__record__.__columns__) == [
+            '_id', '_key', '_nsubrecs', '_score', 'age', 'name']
+
+    def test___record___without_key(self):
+        Table = table.tablebase()
+
+        class T(Table):
+            __tableflags__ = a.TableFlags.TABLE_NO_KEY
+        assert '_key' not in T.__record__.__columns__
+
 
 class TestColumn(test_query.BaseTestExpression):
     @pytest.fixture
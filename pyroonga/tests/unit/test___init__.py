@@ -2,10 +2,16 @@
 
 import random
 
+import pytest
+
 import pyroonga
 from pyroonga.tests import utils, mock
 
+needs_extension = pytest.mark.skipif(not hasattr(pyroonga, 'Groonga'),
+                                     reason="_groonga extension is not built")
+
 
+@needs_extension
 def test_connect_with_default():
     with mock.patch('pyroonga.groonga.Context') as m:
         m.return_value.connect.return_value = 0
@@ -16,6 +22,7 @@ def test_connect_with_default():
         assert grn.connected is True
 
 
+@needs_extension
 def test_connect():
     host = utils.random_string()
     port = random.randint(1025, 65535)
@@ -31,8 +38,15 @@ def test_connect():
 def test_import():
     from pyroonga import (
         connect,
-        Groonga,
+        GroongaPool,
+        GroongaGQTP,
+        GroongaGQTPPool,
+        fanout,
+        GroongaHTTP,
+        GroongaHTTPPool,
         GroongaError,
+        GroongaTimeoutError,
+        PoolTimeoutError,
         Symbol,
         TableFlags,
         ColumnFlagsFlag,
@@ -55,3 +69,10 @@ def test_import():
         sequence_query,
         event_query,
         )
+
+
+@needs_extension
+def test_import_with_extension():
+    from pyroonga import (
+        Groonga,
+        )
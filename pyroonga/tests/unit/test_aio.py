@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import os
+import subprocess
+import sys
+
+import pytest
+
+import pyroonga
+from pyroonga import aio, rc
+from pyroonga.exceptions import (GroongaError, GroongaTimeoutError,
+                                 PoolTimeoutError)
+from pyroonga.odm import query, table
+
+from pyroonga.tests import mock
+from pyroonga.tests.gqtp_server import GQTPServer
+
+
+def run(coro):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+@pytest.fixture
+def server(request):
+    server = GQTPServer()
+    server.start()
+    request.addfinalizer(server.stop)
+    return server
+
+
+class TestAsyncGroonga(object):
+    def test___init___with_default_params(self):
+        grn = aio.AsyncGroonga()
+        assert grn.host == '0.0.0.0'
+        assert grn.port == 10041
+        assert grn.encoding == 'utf-8'
+        assert grn.connected is False
+
+    def test_connect_with_refused(self, server):
+        port = server.port
+        server.stop()
+        grn = aio.AsyncGroonga('127.0.0.1', port)
+        with pytest.raises(GroongaError) as excinfo:
+            run(grn.connect())
+        assert excinfo.value.errmsg == 'connection refused'
+        assert grn.connected is False
+
+    def test_query(self, server):
+        grn = aio.AsyncGroonga(server.host, server.port)
+
+        async def func():
+            result1 = await grn.query('status')
+            result2 = await grn.query(u'select --query さくら', raw=True)
+            return result1, result2
+        result1, result2 = run(func())
+        assert result1 == 'status'
+        assert result2 == u'select --query さくら'.encode('utf-8')
+        assert server.commands == [b'status',
+                                   u'select --query さくら'.encode('utf-8')]
+
+    def test_query_with_chunks(self, server):
+        server.chunk_size = 3
+        grn = aio.AsyncGroonga(server.host, server.port)
+        assert run(grn.query(u'さくら')) == u'さくら'
+
+    def test_query_with_error(self, server):
+        server.handler = lambda command: (
+            rc.INVALID_ARGUMENT,
+            b'[[-22,0.0,0.0,"invalid table name"]]')
+        grn = aio.AsyncGroonga(server.host, server.port)
+        with pytest.raises(GroongaError) as excinfo:
+            run(grn.query('select --table Unknown'))
+        assert excinfo.value.reason == 'invalid table name'
+        assert excinfo.value.cause == 'select --table Unknown'
+
+    def test_query_with_closed_by_server(self, server):
+        server.handler = lambda command: 1 / 0
+        grn = aio.AsyncGroonga(server.host, server.port)
+        with pytest.raises(GroongaError) as excinfo:
+            run(grn.query('status'))
+        assert excinfo.value.errmsg == 'socket is not connected'
+        assert grn.connected is False
+
+    def test_query_with_timeout(self, server):
+        server.handler = lambda command: None if command == b'slow' else (
+            0, command)
+        grn = aio.AsyncGroonga(server.host, server.port)
+
+        async def func():
+            with pytest.raises(GroongaTimeoutError) as excinfo:
+                await grn.query('slow', timeout=0.05)
+            assert excinfo.value.cause == 'slow'
+            assert grn.connected is False
+            return await grn.query('status', timeout=5)
+        assert run(func()) == 'status'
+
+    def test_query_concurrently(self, server):
+        server.delay = 0.01
+        grn = aio.AsyncGroonga(server.host, server.port)
+
+        async def func():
+            return await asyncio.gather(*[grn.query(str(i))
+                                          for i in range(10)])
+        assert run(func()) == [str(i) for i in range(10)]
+
+    def test_query_many(self, server):
+        server.handler = lambda command: (
+            (rc.INVALID_ARGUMENT, b'invalid') if command == b'error'
+            else (0, command))
+        grn = aio.AsyncGroonga(server.host, server.port)
+        result = run(grn.query_many(['a', 'error', 'b']))
+        assert result[0] == 'a'
+        assert isinstance(result[1], GroongaError)
+        assert result[1].reason == 'invalid'
+        assert result[2] == 'b'
+        assert run(grn.query_many([])) == []
+
+
+class TestAsyncGroongaPool(object):
+    def test___init___with_default_params(self):
+        pool = aio.AsyncGroongaPool()
+        assert pool.host == '0.0.0.0'
+        assert pool.port == 10041
+        assert pool.encoding == 'utf-8'
+        assert pool.maxsize == 10
+        assert pool.timeout == 30
+        assert pool.size == 0
+        assert pool.idle == 0
+
+    def test___init___with_invalid_size(self):
+        with pytest.raises(ValueError):
+            aio.AsyncGroongaPool(maxsize=0)
+
+    def test_checkout_and_checkin(self, server):
+        pool = aio.AsyncGroongaPool(server.host, server.port, maxsize=2)
+
+        async def func():
+            grn1 = await pool.checkout()
+            grn2 = await pool.checkout()
+            assert grn1 is not grn2
+            assert pool.size == 2
+            assert pool.idle == 0
+            pool.checkin(grn1)
+            assert pool.idle == 1
+            assert (await pool.checkout()) is grn1
+        run(func())
+
+    def test_checkout_with_timeout(self, server):
+        pool = aio.AsyncGroongaPool(server.host, server.port, maxsize=1,
+                                    timeout=0.01)
+
+        async def func():
+            await pool.checkout()
+            with pytest.raises(PoolTimeoutError):
+                await pool.checkout()
+        run(func())
+
+    def test_checkin_with_not_connected(self, server):
+        pool = aio.AsyncGroongaPool(server.host, server.port)
+
+        async def func():
+            grn = await pool.checkout()
+            grn.close()
+            pool.checkin(grn)
+        run(func())
+        assert pool.size == 0
+        assert pool.idle == 0
+
+    def test_query(self, server):
+        server.delay = 0.01
+        pool = aio.AsyncGroongaPool(server.host, server.port, maxsize=3)
+
+        async def func():
+            result = await asyncio.gather(*[pool.query(str(i))
+                                            for i in range(10)])
+            assert pool.size == 3
+            assert pool.idle == 3
+            pool.close()
+            return result
+        assert run(func()) == [str(i) for i in range(10)]
+        assert pool.size == 0
+
+    def test_query_many(self, server):
+        pool = aio.AsyncGroongaPool(server.host, server.port)
+        assert run(pool.query_many(['a', 'b'], raw=True)) == [b'a', b'b']
+
+
+class TestAsyncQuery(object):
+    def _table(self, server, body):
+        server.handler = lambda command: (0, body)
+
+        class A(object):
+            __tablename__ = 'A'
+            _id = None
+            kana = mock.MagicMock()
+            grn = aio.AsyncGroonga(server.host, server.port)
+        A.kana.name = 'kana'
+        return A
+
+    def test_bind(self, server):
+        Table = table.tablebase()
+        grn = aio.AsyncGroonga(server.host, server.port)
+        Table.bind(grn)
+        assert Table.grn is grn
+        assert grn.connected is False
+
+    def test_bind_without_import(self):
+        code = ("import sys; from pyroonga.odm import table; "
+                "Table = table.tablebase(); "
+                "assert 'pyroonga.aio' not in sys.modules; "
+                "from pyroonga.aio import AsyncGroonga; "
+                "Table.bind(AsyncGroonga()); "
+                "assert AsyncGroonga not in table.connection_types")
+        cwd = os.path.dirname(os.path.dirname(os.path.abspath(
+            pyroonga.__file__)))
+        subprocess.check_call([sys.executable, '-c', code], cwd=cwd)
+
+    def test_select_all_async(self, server):
+        A = self._table(server, b'[[[1],[["_id","UInt32"]],[1]]]')
+        result = run(query.SelectQuery(A).all_async())
+        assert isinstance(result, query.GroongaSelectResult)
+        assert [r._id for r in result] == [1]
+        assert server.commands == [b'select --table A']
+
+    def test_load_commit_async(self, server):
+        A = self._table(server, b'2')
+        q = query.LoadQuery(A, [])
+        assert run(q.commit_async()) == 2
+        with pytest.raises(RuntimeError):
+            q.commit_async()
+
+    def test_bulk_load(self, server):
+        A = self._table(server, b'1')
+        with pytest.raises(ValueError):
+            query.bulk_load(A, [], concurrency=1)
+        A.grn = aio.AsyncGroongaPool(server.host, server.port)
+        with pytest.raises(ValueError):
+            query.bulk_load(A, [])
+        assert server.commands == []
+
+    def test_simple_execute_async(self, server):
+        A = self._table(server, b'true')
+        q = query.SimpleQuery(A).cache_limit()
+        assert run(q.execute_async()) is True
+        assert server.commands == [b'cache_limit']
+
+    def test_suggest_all_async(self, server):
+        A = self._table(server, b'{"complete":[[0],[["_key","ShortText"]]]}')
+        result = run(query.SuggestQuery(A, 'f').all_async())
+        assert isinstance(result, query.GroongaSuggestResults)
+        assert result.complete.all_len == 0
+        assert len(result.complete) == 0
@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+
+import time
+
+import pytest
+
+from pyroonga import gqtp, rc
+from pyroonga.exceptions import (GroongaError, GroongaTimeoutError,
+                                 error_messages)
+
+from pyroonga.tests.gqtp_server import GQTPServer
+
+
+class TestGQTP(object):
+    def test_pack(self):
+        packet = gqtp.pack(b'status')
+        assert len(packet) == gqtp.HEADER_SIZE + 6
+        assert packet == (b'\xc7\x00\x00\x00\x00\x02\x00\x00'
+                          b'\x00\x00\x00\x06\x00\x00\x00\x00'
+                          b'\x00\x00\x00\x00\x00\x00\x00\x00status')
+
+    def test_pack_with_params(self):
+        packet = gqtp.pack(b'', flags=gqtp.MORE, status=-22,
+                           query_type=gqtp.CONTENT_JSON)
+        header = gqtp.Header.unpack(packet)
+        assert header == (gqtp.CONTENT_JSON, gqtp.MORE, -22, 0)
+        assert header.tail is False
+
+    def test_unpack(self):
+        header = gqtp.Header.unpack(gqtp.pack(b'[1,2]')[:gqtp.HEADER_SIZE])
+        assert header.query_type == gqtp.CONTENT_NONE
+        assert header.flags == gqtp.TAIL
+        assert header.status == 0
+        assert header.size == 5
+        assert header.tail is True
+
+    def test_unpack_with_invalid_protocol(self):
+        with pytest.raises(ValueError):
+            gqtp.Header.unpack(b'\x00' * gqtp.HEADER_SIZE)
+
+
+class TestParser(object):
+    def test_feed(self):
+        parser = gqtp.Parser()
+        data = (gqtp.pack(b'[1,', flags=gqtp.MORE) + gqtp.pack(b'2]') +
+                gqtp.pack(b'', status=-22))
+        assert parser.feed(data[:10]) == []
+        assert parser.feed(data[10:gqtp.HEADER_SIZE + 1]) == []
+        packets = parser.feed(data[gqtp.HEADER_SIZE + 1:])
+        assert [(h.flags, h.status, body) for h, body in packets] == [
+            (gqtp.MORE, 0, b'[1,'),
+            (gqtp.TAIL, 0, b'2]'),
+            (gqtp.TAIL, -22, b''),
+        ]
+
+    def test_feed_with_invalid_protocol(self):
+        with pytest.raises(ValueError):
+            gqtp.Parser().feed(b'\x00' * gqtp.HEADER_SIZE)
+
+
+@pytest.fixture
+def server(request):
+    server = GQTPServer()
+    server.start()
+    request.addfinalizer(server.stop)
+    return server
+
+
+class TestGroongaGQTP(object):
+    def test___init___with_default_params(self):
+        grn = gqtp.GroongaGQTP()
+        assert grn.host == '0.0.0.0'
+        assert grn.port == 10041
+        assert grn.encoding == 'utf-8'
+        assert grn.timeout is None
+        assert grn.connected is False
+
+    def test_connect(self, server):
+        grn = gqtp.GroongaGQTP(server.host, server.port)
+        grn.connect()
+        assert grn.connected is True
+        grn.close()
+        assert grn.connected is False
+
+    def test_connect_with_refused(self, server):
+        port = server.port
+        server.stop()
+        grn = gqtp.GroongaGQTP('127.0.0.1', port)
+        with pytest.raises(GroongaError) as excinfo:
+            grn.connect()
+        assert excinfo.value.errmsg == 'connection refused'
+
+    def test_query(self, server):
+        grn = gqtp.GroongaGQTP(server.host, server.port)
+        assert grn.query(u'select --query さくら') == u'select --query さくら'
+        assert grn.query('status', raw=True) == b'status'
+        assert server.commands == [u'select --query さくら'.encode('utf-8'),
+                                   b'status']
+
+    def test_query_with_chunks(self, server):
+        server.chunk_size = 2
+        grn = gqtp.GroongaGQTP(server.host, server.port)
+        assert grn.query(u'さくら') == u'さくら'
+        assert list(grn.query_iter('abcde', raw=True)) == [b'ab', b'cd', b'e']
+
+    def test_query_with_error(self, server):
+        server.handler = lambda command: (
+            rc.INVALID_ARGUMENT, b'[[-22,0.0,0.0,"invalid table name"]]')
+        grn = gqtp.GroongaGQTP(server.host, server.port)
+        with pytest.raises(GroongaError) as excinfo:
+            grn.query('select --table Unknown')
+        assert excinfo.value.errmsg == error_messages[rc.INVALID_ARGUMENT]
+        assert excinfo.value.reason == 'invalid table name'
+        assert grn.connected is True
+
+    def test_query_with_timeout(self, server):
+        server.handler = lambda command: None if command == b'slow' else (
+            0, command)
+        grn = gqtp.GroongaGQTP(server.host, server.port, timeout=5)
+        with pytest.raises(GroongaTimeoutError) as excinfo:
+            grn.query('slow', timeout=0.05)
+        assert excinfo.value.errmsg == 'operation timeout'
+        assert grn.connected is False
+        assert grn.query('status') == 'status'
+
+    def test_query_with_closed_by_server(self, server):
+        server.handler = lambda command: 1 / 0
+        grn = gqtp.GroongaGQTP(server.host, server.port)
+        with pytest.raises(GroongaError) as excinfo:
+            grn.query('status')
+        assert excinfo.value.errmsg == 'socket is not connected'
+        assert grn.connected is False
+
+    def test_query_iter_with_stop(self, server):
+        server.chunk_size = 1
+        grn = gqtp.GroongaGQTP(server.host, server.port)
+        it = grn.query_iter('abc')
+        assert next(it) == 'a'
+        it.close()
+        assert grn.connected is False
+
+    def test_query_many(self, server):
+        server.handler = lambda command: (
+            (rc.INVALID_ARGUMENT, b'invalid') if command == b'error'
+            else (0, command))
+        grn = gqtp.GroongaGQTP(server.host, server.port)
+        result = grn.query_many(['a', 'error', 'b'])
+        assert result[0] == 'a'
+        assert isinstance(result[1], GroongaError)
+        assert result[1].reason == 'invalid'
+        assert result[2] == 'b'
+        assert grn.query_many([]) == []
+
+
+class TestFanout(object):
+    def test_fanout(self, request):
+        servers = []
+        for delay in (0.1, 0, 0.05):
+            server = GQTPServer(delay=delay)
+            server.start()
+            request.addfinalizer(server.stop)
+            servers.append(server)
+        nodes = [gqtp.GroongaGQTP(s.host, s.port) for s in servers]
+        start = time.time()
+        result = gqtp.fanout([(grn, 'q%d' % i) for i, grn in
+                              enumerate(nodes)] + [(nodes[1], 'q3')])
+        assert time.time() - start < 0.2
+        assert result == ['q0', 'q1', 'q2', 'q3']
+
+    def test_fanout_with_timeout(self, request):
+        fast = GQTPServer()
+        slow = GQTPServer(handler=lambda command: None)
+        for server in (fast, slow):
+            server.start()
+            request.addfinalizer(server.stop)
+        grn1 = gqtp.GroongaGQTP(fast.host, fast.port)
+        grn2 = gqtp.GroongaGQTP(slow.host, slow.port)
+        result = gqtp.fanout([(grn1, 'a'), (grn2, 'b')], raw=True,
+                             timeout=0.05)
+        assert result[0] == b'a'
+        assert isinstance(result[1], GroongaTimeoutError)
+        assert result[1].errmsg == 'operation timeout'
+        assert grn1.connected is True
+        assert grn2.connected is False
+
+    def test_fanout_with_refused(self, server):
+        port = server.port
+        server.stop()
+        grn = gqtp.GroongaGQTP('127.0.0.1', port)
+        result = gqtp.fanout([(grn, 'a')])
+        assert result[0].errmsg == 'connection refused'
+
+    def test_fanout_without_selectors(self, server, monkeypatch):
+        monkeypatch.setattr(gqtp, 'selectors', None)
+        grns = [gqtp.GroongaGQTP(server.host, server.port) for _ in range(2)]
+        assert gqtp.fanout([(grns[0], 'a'), (grns[1], 'b')]) == ['a', 'b']
+
+    def test_fanout_with_empty(self):
+        assert gqtp.fanout([]) == []
+
+
+class TestGroongaGQTPPool(object):
+    def test_query(self, server):
+        pool = gqtp.GroongaGQTPPool(server.host, server.port,
+                                    query_timeout=1)
+        assert pool.query('status') == 'status'
+        with pool.connection() as grn:
+            assert isinstance(grn, gqtp.GroongaGQTP)
+            assert grn.timeout == 1
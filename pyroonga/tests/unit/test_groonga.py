@@ -1,12 +1,14 @@
 # -*- coding: utf-8 -*-
 
 import random
+import time
 
 import pytest
 
-import _groonga
+_groonga = pytest.importorskip('_groonga')
 
-from pyroonga.exceptions import GroongaError, error_messages
+from pyroonga.exceptions import (GroongaError, GroongaTimeoutError,
+                                 error_messages)
 from pyroonga.groonga import Groonga
 
 from pyroonga.tests import utils, mock
@@ -87,3 +89,242 @@ class TestGroonga(object):
         grn = Groonga()
         with pytest.raises(GroongaError):
             grn._raise_if_notsuccess(rc, "", "")
+
+    def test___init___with_path(self):
+        grn = Groonga(path='/tmp/test.db')
+        assert grn.path == '/tmp/test.db'
+        assert grn.embedded is True
+        assert grn.connected is False
+
+    def test_connect_with_path(self, tmpdir):
+        path = str(tmpdir.join('test.db'))
+        grn = Groonga(path=path)
+        grn._ctx = mock.MagicMock()
+        grn._ctx.db_create.return_value = 0
+        grn.connect()
+        assert grn.connected is True
+        assert grn._ctx.db_create.mock_calls == [mock.call(path)]
+        assert grn._ctx.connect.mock_calls == []
+
+    def test_open_with_existing_path(self, tmpdir):
+        path = str(tmpdir.join('test.db'))
+        tmpdir.join('test.db').write('')
+        grn = Groonga()
+        grn._ctx = mock.MagicMock()
+        grn._ctx.db_open.return_value = 0
+        grn.open(path)
+        assert grn.connected is True
+        assert grn.path == path
+        assert grn.embedded is True
+        assert grn._ctx.db_open.mock_calls == [mock.call(path)]
+
+    def test_open_without_path(self):
+        grn = Groonga()
+        with pytest.raises(ValueError):
+            grn.open()
+
+    def test_open_with_failure(self, tmpdir):
+        grn = Groonga(path=str(tmpdir.join('test.db')))
+        grn._ctx = mock.MagicMock()
+        grn._ctx.db_create.return_value = _groonga.NO_SUCH_FILE_OR_DIRECTORY
+        with pytest.raises(GroongaError):
+            grn.open()
+        assert grn.connected is False
+
+    def test_close(self):
+        grn = Groonga()
+        grn._ctx = ctx = mock.MagicMock()
+        grn.connected = True
+        grn.close()
+        assert grn.connected is False
+        assert grn._ctx is not ctx
+
+    def test_query(self):
+        grn = Groonga()
+        grn._ctx = mock.MagicMock()
+        grn._ctx.recv_bytes.return_value = (_groonga.SUCCESS, b'100', 0)
+        grn.connected = True
+        result = grn.query('cache_limit')
+        assert result == u'100'
+        assert grn._ctx.send.mock_calls == [mock.call('cache_limit',
+                                                      flags=0,
+                                                      deadline=None)]
+
+    def test_query_with_raw(self):
+        grn = Groonga()
+        grn._ctx = mock.MagicMock()
+        grn._ctx.recv_bytes.return_value = (_groonga.SUCCESS, b'100', 0)
+        grn.connected = True
+        result = grn.query('cache_limit', raw=True)
+        assert result == b'100'
+
+    def test__raise_if_notsuccess_with_bytes(self):
+        grn = Groonga()
+        msg = b'[[-22,0.0,0.0,"invalid argument"]]'
+        with pytest.raises(GroongaError) as excinfo:
+            grn._raise_if_notsuccess(_groonga.INVALID_ARGUMENT, msg, "")
+        assert excinfo.value.reason == 'invalid argument'
+
+    def test__raise_if_notsuccess_with_msgpack(self):
+        msgpack = pytest.importorskip('msgpack')
+        grn = Groonga()
+        msg = msgpack.packb([[-22, 0.0, 0.0, u'invalid argument']])
+        with pytest.raises(GroongaError) as excinfo:
+            grn._raise_if_notsuccess(_groonga.INVALID_ARGUMENT, msg, "")
+        assert excinfo.value.reason == 'invalid argument'
+
+    def _grn_with_chunks(self, chunks):
+        grn = Groonga()
+        grn._ctx = mock.MagicMock()
+        flags = [_groonga.CTX_MORE] * (len(chunks) - 1) + [0]
+        grn._ctx.recv_bytes.side_effect = [(_groonga.SUCCESS, c, f) for c, f in
+                                           zip(chunks, flags)]
+        grn.connected = True
+        return grn
+
+    def test_query_with_multiple_chunks(self):
+        encoded = u'"さくら"]'.encode('utf-8')
+        chunks = [b'["abc",', encoded[:6], encoded[6:]]
+        grn = self._grn_with_chunks(chunks)
+        assert grn.query('select') == u'["abc","さくら"]'
+
+    def test_query_iter(self):
+        encoded = u'"さくら"]'.encode('utf-8')
+        chunks = [b'["abc",', encoded[:6], encoded[6:]]
+        grn = self._grn_with_chunks(chunks)
+        result = list(grn.query_iter('select'))
+        assert result == [u'["abc",', u'"さ', u'くら"]']
+
+    def test_query_iter_with_raw(self):
+        chunks = [b'[1,', b'2,', b'3]']
+        grn = self._grn_with_chunks(chunks)
+        assert list(grn.query_iter('select', raw=True)) == chunks
+
+    def test_query_iter_with_stop(self):
+        grn = self._grn_with_chunks([b'[1,', b'2,', b'3]'])
+        grn.reconnect = mock.MagicMock()
+        it = grn.query_iter('select', raw=True)
+        assert next(it) == b'[1,'
+        it.close()
+        assert grn.reconnect.mock_calls == [mock.call()]
+
+    def test_query_iter_with_error(self):
+        grn = self._grn_with_chunks([b'[1,', b'2,', b'3]'])
+        grn._ctx.recv_bytes.side_effect = [
+            (_groonga.SUCCESS, b'[1,', _groonga.CTX_MORE),
+            (_groonga.INVALID_ARGUMENT, b'', 0)]
+        grn.reconnect = mock.MagicMock()
+        with pytest.raises(GroongaError):
+            list(grn.query_iter('select', raw=True))
+        assert grn.reconnect.mock_calls == [mock.call()]
+
+    def test_query_with_timeout(self):
+        grn = self._grn_with_chunks([b'[1,', b''])
+        grn._ctx.recv_bytes.side_effect = [
+            (_groonga.SUCCESS, b'[1,', _groonga.CTX_MORE),
+            (_groonga.OPERATION_TIMEOUT, b'', 0)]
+        ctx = grn._ctx
+        with pytest.raises(GroongaTimeoutError) as excinfo:
+            grn.query('select', timeout=0.05)
+        assert excinfo.value.errmsg == 'operation timeout'
+        assert excinfo.value.cause == 'select'
+        assert grn.connected is False
+        assert grn._ctx is not ctx
+        deadline = ctx.send.call_args[1]['deadline']
+        assert deadline > time.time() - 1
+        assert ctx.recv_bytes.mock_calls == [mock.call(deadline=deadline)] * 2
+
+    def test_query_with_timeout_on_send(self):
+        grn = self._grn_with_chunks([b'[1]'])
+        grn._ctx.send.return_value = _groonga.OPERATION_TIMEOUT
+        ctx = grn._ctx
+        with pytest.raises(GroongaTimeoutError):
+            grn.query('select', timeout=0.05)
+        assert ctx.recv_bytes.mock_calls == []
+        assert grn._ctx is not ctx
+
+    def test_query_with_operation_timeout_without_timeout(self):
+        grn = self._grn_with_chunks([b''])
+        grn._ctx.recv_bytes.side_effect = [
+            (_groonga.OPERATION_TIMEOUT, b'', 0)]
+        with pytest.raises(GroongaError) as excinfo:
+            grn.query('select')
+        assert not isinstance(excinfo.value, GroongaTimeoutError)
+
+    def test_query_with_timeout_not_exceeded(self):
+        grn = self._grn_with_chunks([b'[1,', b'2]'])
+        assert grn.query('select', timeout=5) == u'[1,2]'
+        assert grn.connected is True
+
+    def test_query_with_timeout_and_error(self):
+        grn = self._grn_with_chunks([b''])
+        grn._ctx.recv_bytes.side_effect = [(_groonga.INVALID_ARGUMENT, b'', 0)]
+        with pytest.raises(GroongaError) as excinfo:
+            grn.query('select', timeout=5)
+        assert not isinstance(excinfo.value, GroongaTimeoutError)
+
+    def test_query_with_timeout_in_embedded_mode(self):
+        grn = self._grn_with_chunks([b'[1]'])
+        grn.path = 'test.db'
+        with pytest.raises(ValueError):
+            grn.query('select', timeout=1)
+
+    def test_query_many(self):
+        grn = Groonga()
+        grn._ctx = mock.MagicMock()
+        grn._ctx.query_many.return_value = [
+            (_groonga.SUCCESS, b'100'),
+            (_groonga.INVALID_ARGUMENT, b''),
+            (_groonga.SUCCESS, u'さくら'.encode('utf-8'))]
+        grn.connected = True
+        grn.reconnect = mock.MagicMock()
+        result = grn.query_many(['cache_limit', 'unknown', u'echo さくら'])
+        assert result[0] == u'100'
+        assert isinstance(result[1], GroongaError)
+        assert result[2] == u'さくら'
+        assert grn._ctx.query_many.mock_calls == [mock.call([
+            b'cache_limit', b'unknown', u'echo さくら'.encode('utf-8')],
+            deadline=None)]
+        assert grn.connected is True
+        assert grn.reconnect.mock_calls == []
+
+    def test_query_many_with_raw(self):
+        grn = Groonga()
+        grn._ctx = mock.MagicMock()
+        grn._ctx.query_many.return_value = [(_groonga.SUCCESS, b'100'),
+                                            (_groonga.SUCCESS, b'true')]
+        grn.connected = True
+        assert grn.query_many(['a', 'b'], raw=True) == [b'100', b'true']
+
+    def test_query_many_with_broken_connection(self):
+        grn = Groonga()
+        grn._ctx = mock.MagicMock()
+        grn._ctx.query_many.return_value = [
+            (_groonga.SUCCESS, b'100'),
+            (_groonga.SOCKET_IS_NOT_CONNECTED, b'')]
+        grn.connected = True
+        grn.reconnect = mock.MagicMock()
+        result = grn.query_many(['a', 'b'])
+        assert result[0] == u'100'
+        assert isinstance(result[1], GroongaError)
+        assert grn.reconnect.mock_calls == [mock.call()]
+
+    def test_query_many_with_timeout(self):
+        grn = Groonga()
+        grn._ctx = mock.MagicMock()
+        grn._ctx.query_many.return_value = [
+            (_groonga.SUCCESS, b'100'),
+            (_groonga.OPERATION_TIMEOUT, b'')]
+        grn.connected = True
+        ctx = grn._ctx
+        with pytest.raises(GroongaTimeoutError) as excinfo:
+            grn.query_many(['a', 'b'], timeout=0.05)
+        assert excinfo.value.cause == 'b'
+        assert grn.connected is False
+        assert grn._ctx is not ctx
+        assert ctx.query_many.call_args[1]['deadline'] > time.time() - 1
+
+    def test_query_many_with_not_connected(self):
+        grn = Groonga()
+        with pytest.raises(GroongaError):
+            grn.query_many(['a'])
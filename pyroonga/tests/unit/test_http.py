@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import subprocess
+import sys
+import threading
+
+import pytest
+
+import pyroonga
+
+from pyroonga import rc
+from pyroonga.exceptions import GroongaError, GroongaTimeoutError
+from pyroonga.http import GroongaHTTP, GroongaHTTPPool, parse_command
+from pyroonga.odm import table
+
+from pyroonga.tests.http_server import GroongaHTTPServer
+
+
+def respond(result):
+    return lambda command, args, body: (0, result)
+
+
+@pytest.fixture
+def server(request):
+    server = GroongaHTTPServer()
+    server.start()
+    request.addfinalizer(server.stop)
+    return server
+
+
+class TestParseCommand(object):
+    @pytest.mark.parametrize(('qstr', 'expected'), (
+        ('status', ('status', {})),
+        ('select --table Site', ('select', {'table': 'Site'})),
+        ('select Site --limit 10', ('select', {'table': 'Site',
+                                               'limit': '10'})),
+        ('select --query "foo bar" Site', ('select', {'table': 'Site',
+                                                      'query': 'foo bar'})),
+        ("select --filter 'title == \"a\"'",
+         ('select', {'filter': 'title == "a"'})),
+        (r'load --values "[{\"a\":\"b\\\\c\"}]" --table Site',
+         ('load', {'values': r'[{"a":"b\\c"}]', 'table': 'Site'})),
+        ('load --values "a\\nb"', ('load', {'values': 'a\nb'})),
+        ('select --query "--foo"', ('select', {'query': '--foo'})),
+        ('truncate  Site ', ('truncate', {'table': 'Site'})),
+        ('log_put info "a message"', ('log_put', {'level': 'info',
+                                                  'message': 'a message'})),
+    ))
+    def test_parse_command(self, qstr, expected):
+        assert parse_command(qstr) == expected
+
+    @pytest.mark.parametrize('qstr', (
+        '',
+        ' ',
+        'select --table',
+        'status unknown',
+    ))
+    def test_parse_command_with_invalid(self, qstr):
+        with pytest.raises(ValueError):
+            parse_command(qstr)
+
+
+class TestGroongaHTTP(object):
+    def test___init___with_default_params(self):
+        grn = GroongaHTTP()
+        assert grn.host == '0.0.0.0'
+        assert grn.port == 10041
+        assert grn.encoding == 'utf-8'
+        assert grn.gzip is False
+        assert grn.timeout is None
+        assert grn.connected is False
+
+    def test_connect(self, server):
+        grn = GroongaHTTP(server.host, server.port)
+        grn.connect()
+        assert grn.connected is True
+        grn.close()
+        assert grn.connected is False
+
+    def test_connect_with_refused(self, server):
+        port = server.port
+        server.stop()
+        grn = GroongaHTTP('127.0.0.1', port)
+        with pytest.raises(GroongaError) as excinfo:
+            grn.connect()
+        assert excinfo.value.errmsg == 'connection refused'
+        assert grn.connected is False
+
+    def test_query(self, server):
+        grn = GroongaHTTP(server.host, server.port)
+        result = grn.query(u'select --table Site --query "さくら 桜"')
+        assert json.loads(result) == {'table': 'Site', 'query': u'さくら 桜'}
+        assert server.requests[0][:2] == ('GET', 'select')
+
+    def test_query_with_raw(self, server):
+        server.handler = respond('[1,[2]]')
+        grn = GroongaHTTP(server.host, server.port)
+        assert grn.query('status', raw=True) == b'[1,[2]]'
+
+    def test_query_with_empty_body(self, server):
+        server.handler = respond('')
+        grn = GroongaHTTP(server.host, server.port)
+        assert grn.query('status') == ''
+
+    def test_query_with_gzip(self, server):
+        server.handler = respond('["%s"]' % ('a' * 1000))
+        grn = GroongaHTTP(server.host, server.port, gzip=True)
+        assert grn.query('status') == '["%s"]' % ('a' * 1000)
+
+    def test_query_with_error(self, server):
+        server.handler = lambda command, args, body: (
+            rc.INVALID_ARGUMENT, u'invalid table name: <さくら>')
+        grn = GroongaHTTP(server.host, server.port)
+        with pytest.raises(GroongaError) as excinfo:
+            grn.query('select --table Unknown')
+        assert excinfo.value.errmsg == 'invalid argument'
+        assert excinfo.value.reason == u'invalid table name: <さくら>'
+        assert excinfo.value.cause == 'select --table Unknown'
+        assert grn.connected is True
+
+    def test_query_with_invalid_command(self, server):
+        grn = GroongaHTTP(server.host, server.port)
+        with pytest.raises(GroongaError) as excinfo:
+            grn.query('status unknown')
+        assert excinfo.value.errmsg == 'invalid argument'
+        assert server.requests == []
+
+    def test_query_with_keep_alive(self, server):
+        grn = GroongaHTTP(server.host, server.port)
+        for _ in range(3):
+            grn.query('status')
+        assert len(server.requests) == 3
+        assert server.connections == 1
+
+    def test_query_with_closed_connection(self, server):
+        grn = GroongaHTTP(server.host, server.port)
+        grn.query('status')
+        grn._conn.sock.close()
+        assert json.loads(grn.query('select --table Site')) == {
+            'table': 'Site'}
+        assert server.connections == 2
+
+    def test_query_with_dropped_load(self, server):
+        def handler(command, args, body):
+            # close the connection without the response
+            raise RuntimeError(command)
+        grn = GroongaHTTP(server.host, server.port)
+        grn.query('status')
+        server.handler = handler
+        server.handle_error = lambda request, client_address: None
+        qstr = 'load --table Site --values "[{\\"_key\\":\\"a\\"}]"'
+        with pytest.raises(GroongaError):
+            grn.query(qstr)
+        assert [r[1] for r in server.requests] == ['status', 'load']
+        server.handler = respond('true')
+        grn.query('status')
+        server.handler = handler
+        with pytest.raises(GroongaError):
+            grn.query('status')
+        # only the queries other than 'load' are retried
+        assert [r[1] for r in server.requests] == [
+            'status', 'load', 'status', 'status', 'status']
+
+    def test_query_with_load(self, server):
+        server.handler = lambda command, args, body: (
+            0, str(len(json.loads(body.decode('utf-8')))))
+        grn = GroongaHTTP(server.host, server.port)
+        qstr = 'load --table Site --values "[{\\"_key\\":\\"a\\"}]"'
+        assert grn.query(qstr) == '1'
+        assert server.requests == [
+            ('POST', 'load', {'table': 'Site'}, b'[{"_key":"a"}]')]
+
+    def test_query_with_timeout(self, server, request):
+        event = threading.Event()
+        request.addfinalizer(event.set)
+
+        def handler(command, args, body):
+            if command == 'slow':
+                event.wait()
+            return 0, '"%s"' % command
+        server.handler = handler
+        grn = GroongaHTTP(server.host, server.port, timeout=5)
+        with pytest.raises(GroongaTimeoutError) as excinfo:
+            grn.query('slow', timeout=0.05)
+        assert excinfo.value.errmsg == 'operation timeout'
+        assert excinfo.value.cause == 'slow'
+        assert grn.connected is False
+        assert len(server.requests) == 1
+        assert grn.query('status') == '"status"'
+
+    def test_query_with_default_timeout(self, server, request):
+        event = threading.Event()
+        request.addfinalizer(event.set)
+        server.handler = lambda command, args, body: event.wait()
+        grn = GroongaHTTP(server.host, server.port, timeout=0.05)
+        with pytest.raises(GroongaTimeoutError):
+            grn.query('status')
+
+    def test_query_with_msgpack(self, server):
+        msgpack = pytest.importorskip('msgpack')
+        server.handler = respond('[[[1],[["_id","UInt32"]],[1]]]')
+        grn = GroongaHTTP(server.host, server.port)
+        result = grn.query('select Site --output_type msgpack', raw=True)
+        assert msgpack.unpackb(result) == [[[1], [['_id', 'UInt32']], [1]]]
+        assert grn.connected is True
+
+    def test_query_with_msgpack_error(self, server):
+        pytest.importorskip('msgpack')
+        server.handler = lambda command, args, body: (
+            rc.INVALID_ARGUMENT, u'invalid table name: <さくら>')
+        grn = GroongaHTTP(server.host, server.port)
+        with pytest.raises(GroongaError) as excinfo:
+            grn.query('select Unknown --output_type msgpack', raw=True)
+        assert excinfo.value.errmsg == 'invalid argument'
+        assert excinfo.value.reason == u'invalid table name: <さくら>'
+        assert grn.connected is True
+
+    def test_query_iter(self, server):
+        server.handler = respond('[1,"%s"]' % ('a' * 100000))
+        grn = GroongaHTTP(server.host, server.port)
+        chunks = list(grn.query_iter('select --table Site'))
+        assert len(chunks) > 1
+        assert ''.join(chunks) == '[1,"%s"]' % ('a' * 100000)
+
+    def test_query_iter_with_stop(self, server):
+        server.handler = respond('[1,"%s"]' % ('a' * 100000))
+        grn = GroongaHTTP(server.host, server.port)
+        it = grn.query_iter('select --table Site')
+        next(it)
+        it.close()
+        assert grn.connected is False
+        assert grn.query('status')
+
+    def test_query_many(self, server):
+        server.handler = lambda command, args, body: (
+            (rc.INVALID_ARGUMENT, 'invalid') if command == 'error'
+            else (0, '"%s"' % command))
+        grn = GroongaHTTP(server.host, server.port)
+        result = grn.query_many(['a', 'error', 'b'], raw=True)
+        assert result[0] == b'"a"'
+        assert isinstance(result[1], GroongaError)
+        assert result[2] == b'"b"'
+
+    def test_query_many_with_timeout(self, server, request):
+        event = threading.Event()
+        request.addfinalizer(event.set)
+
+        def handler(command, args, body):
+            if command == 'slow':
+                event.wait()
+            return 0, '"%s"' % command
+        server.handler = handler
+        grn = GroongaHTTP(server.host, server.port)
+        result = grn.query_many(['a', 'slow', 'b'], raw=True, timeout=0.05)
+        assert result[0] == b'"a"'
+        assert isinstance(result[1], GroongaTimeoutError)
+        assert isinstance(result[2], GroongaTimeoutError)
+
+
+class TestGroongaHTTPPool(object):
+    def test_query(self, server):
+        pool = GroongaHTTPPool(server.host, server.port, gzip=True,
+                               query_timeout=1, maxsize=2)
+        assert json.loads(pool.query('select --table Site')) == {
+            'table': 'Site'}
+        with pool.connection() as grn:
+            assert isinstance(grn, GroongaHTTP)
+            assert grn.gzip is True
+            assert grn.timeout == 1
+        assert pool.size == 1
+
+    def test_bind(self, server):
+        Table = table.tablebase()
+        pool = GroongaHTTPPool(server.host, server.port)
+        Table.bind(pool)
+        assert Table.grn is pool
+        assert pool.connected is True
+
+
+def test_import_without_extension():
+    code = ("import sys; sys.modules['_groonga'] = None; import pyroonga; "
+            "from pyroonga.odm import table; "
+            "assert table.connection_types == "
+            "(pyroonga.GroongaPool, pyroonga.GroongaGQTP, "
+            "pyroonga.GroongaGQTPPool, pyroonga.GroongaHTTP, "
+            "pyroonga.GroongaHTTPPool)")
+    cwd = os.path.dirname(os.path.dirname(os.path.abspath(pyroonga.__file__)))
+    subprocess.check_call([sys.executable, '-c', code], cwd=cwd)
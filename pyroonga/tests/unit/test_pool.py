@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+
+import threading
+
+import pytest
+
+from pyroonga.exceptions import GroongaError, PoolTimeoutError
+from pyroonga.pool import GroongaPool
+
+from pyroonga.tests import mock
+
+
+@pytest.fixture
+def Groonga(request):
+    patcher = mock.patch('pyroonga.pool.Groonga')
+    request.addfinalizer(patcher.stop)
+    m = patcher.start()
+    m.side_effect = lambda *args: mock.MagicMock(connected=True)
+    return m
+
+
+class TestGroongaPool(object):
+    def test___init___with_default_params(self):
+        pool = GroongaPool()
+        assert pool.host == '0.0.0.0'
+        assert pool.port == 10041
+        assert pool.encoding == 'utf-8'
+        assert pool.minsize == 1
+        assert pool.maxsize == 10
+        assert pool.timeout == 30
+        assert pool.connected is False
+        assert pool.size == 0
+        assert pool.idle == 0
+
+    @pytest.mark.parametrize(('minsize', 'maxsize'), (
+        (-1, 10),
+        (2, 1),
+        (0, 0),
+    ))
+    def test___init___with_invalid_size(self, minsize, maxsize):
+        with pytest.raises(ValueError):
+            GroongaPool(minsize=minsize, maxsize=maxsize)
+
+    def test_connect(self, Groonga):
+        pool = GroongaPool(host='localhost', port=10042, minsize=3)
+        pool.connect()
+        assert pool.connected is True
+        assert pool.size == 3
+        assert pool.idle == 3
+        assert Groonga.mock_calls[0] == mock.call('localhost', 10042, 'utf-8')
+
+    def test_checkout_and_checkin(self, Groonga):
+        pool = GroongaPool(maxsize=2)
+        grn1 = pool.checkout()
+        grn2 = pool.checkout()
+        assert grn1 is not grn2
+        assert pool.size == 2
+        assert pool.idle == 0
+        pool.checkin(grn1)
+        assert pool.idle == 1
+        assert pool.checkout() is grn1
+
+    def test_checkout_with_timeout(self, Groonga):
+        pool = GroongaPool(maxsize=1, timeout=0.01)
+        pool.checkout()
+        with pytest.raises(PoolTimeoutError):
+            pool.checkout()
+        with pytest.raises(PoolTimeoutError):
+            pool.checkout(timeout=0)
+
+    def test_checkout_with_waiting(self, Groonga):
+        pool = GroongaPool(maxsize=1, timeout=5)
+        grn = pool.checkout()
+        timer = threading.Timer(0.05, pool.checkin, (grn,))
+        timer.start()
+        assert pool.checkout() is grn
+        timer.join()
+
+    def test_checkout_with_failure_of_connect(self, Groonga):
+        Groonga.side_effect = None
+        Groonga.return_value.connect.side_effect = GroongaError(-50)
+        pool = GroongaPool(maxsize=1)
+        with pytest.raises(GroongaError):
+            pool.checkout()
+        assert pool.size == 0
+
+    def test_checkout_with_dead_connection(self, Groonga):
+        pool = GroongaPool(check_interval=0)
+        grn1 = pool.checkout()
+        pool.checkin(grn1)
+        grn1.query.side_effect = GroongaError(-47)
+        grn2 = pool.checkout()
+        assert grn2 is not grn1
+        assert grn1.query.mock_calls == [mock.call('status')]
+        assert grn1.close.mock_calls == [mock.call()]
+        assert pool.size == 1
+
+    def test_checkout_without_check(self, Groonga):
+        pool = GroongaPool(check_interval=None)
+        grn = pool.checkout()
+        pool.checkin(grn)
+        assert pool.checkout() is grn
+        assert grn.query.mock_calls == []
+
+    def test_checkin_with_not_connected(self, Groonga):
+        pool = GroongaPool()
+        grn = pool.checkout()
+        grn.connected = False
+        pool.checkin(grn)
+        assert pool.size == 0
+        assert pool.idle == 0
+        assert grn.close.mock_calls == [mock.call()]
+
+    def test_connection(self, Groonga):
+        pool = GroongaPool()
+        with pool.connection() as grn:
+            assert pool.idle == 0
+        assert pool.idle == 1
+        assert pool.checkout() is grn
+
+    def test_close(self, Groonga):
+        pool = GroongaPool(minsize=2)
+        pool.connect()
+        conns = [grn for grn, _ in pool._idle]
+        pool.close()
+        assert pool.connected is False
+        assert pool.size == 0
+        assert pool.idle == 0
+        assert [grn.close.mock_calls for grn in conns] == [[mock.call()]] * 2
+
+    def test_checkout_without_extension(self):
+        with mock.patch('pyroonga.pool.Groonga', None):
+            pool = GroongaPool()
+            with pytest.raises(ImportError):
+                pool.checkout()
+            assert pool.size == 0
+
+    def test_query(self, Groonga):
+        pool = GroongaPool()
+        with pool.connection() as grn:
+            grn.query.return_value = '100'
+        assert pool.query('cache_limit') == '100'
+        assert grn.query.mock_calls == [mock.call('cache_limit', raw=False,
+                                                  timeout=None)]
+        assert pool.idle == 1
+
+    def test_query_iter(self, Groonga):
+        pool = GroongaPool()
+        with pool.connection() as grn:
+            grn.query_iter.return_value = iter(['[1,', '2]'])
+        it = pool.query_iter('select')
+        assert next(it) == '[1,'
+        assert pool.idle == 0
+        assert list(it) == ['2]']
+        assert pool.idle == 1
+
+    def test_query_many(self, Groonga):
+        pool = GroongaPool()
+        with pool.connection() as grn:
+            grn.query_many.return_value = ['100', 'true']
+        assert pool.query_many(['a', 'b'], raw=True) == ['100', 'true']
+        assert grn.query_many.mock_calls == [mock.call(['a', 'b'], raw=True,
+                                                       timeout=None)]
@@ -0,0 +1,14 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from pyroonga import rc
+
+_groonga = pytest.importorskip('_groonga')
+
+
+def test_same_as_extension():
+    names = [name for name in dir(rc) if name.isupper()]
+    assert names
+    for name in names:
+        assert getattr(rc, name) == getattr(_groonga, name)
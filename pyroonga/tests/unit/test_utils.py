@@ -1,8 +1,14 @@
 # -*- coding: utf-8 -*-
 
+import json
+import sys
+import threading
+import types
+
 import pytest
 
 from pyroonga import utils
+from pyroonga.tests import mock
 
 
 class ToTextUnicodeHelper(object):
@@ -24,6 +30,15 @@ def test_to_text(value, expected):
     assert utils.to_text(value) == expected
 
 
+@pytest.fixture(params=['python', 'c'])
+def escape_impl(request, monkeypatch):
+    if request.param == 'python':
+        monkeypatch.setattr(utils, '_speedups_escape', None)
+    elif utils._speedups_escape is None:
+        pytest.skip('pyroonga._speedups is not built')
+    return request.param
+
+
 @pytest.mark.parametrize(('values', 'expected'), (
     (['https://github.com/naoina/pyroonga', False],
      'https://github.com/naoina/pyroonga'),
@@ -41,10 +56,24 @@ def test_to_text(value, expected):
     (['さ\\く ら"咲\nき', True], r'"さ\\く ら\"咲\nき"'),
     ([u'さくら咲き', True], u'"さくら咲き"'),
     ([u'さ\\く ら"咲\nき', True], u'"さ\\\\く ら\\"咲\\nき"'),
+    ([u'', False], u''),
+    ([u'', True], u'""'),
+    ([u'\U0001f338 "\U0001f338"', False], u'"\U0001f338 \\"\U0001f338\\""'),
+    ([u'\\\n"', None], u'\\\\\\n\\"'),
 ))
-def test_escape(values, expected):
+def test_escape(escape_impl, values, expected):
     result = utils.escape(*values)
     assert result == expected
+    assert type(result) is type(expected)
+
+
+def test_escape_with_speedups():
+    if utils._speedups_escape is None:
+        pytest.skip('pyroonga._speedups is not built')
+    s = u'nothing to escape'.replace(' ', '')
+    assert utils._speedups_escape(s) is s
+    with pytest.raises(TypeError):
+        utils._speedups_escape(b'bytes')
 
 
 class TestToPython(object):
@@ -130,3 +159,199 @@ class TestToPython(object):
              'type': ''}]
         result = utils.to_python(values, 0, maxlen=2)
         assert result == expected
+
+    def test_to_python_iter(self):
+        values = [[3],
+                  [['_id', 'UInt32'], ['name', 'ShortText']],
+                  [1, 'a'], [2, 'b'], [3, 'c']]
+        result = utils.to_python_iter(values, 1, maxlen=2)
+        assert next(result) == {'_id': 1, 'name': 'a'}
+        assert list(result) == [{'_id': 2, 'name': 'b'}]
+
+
+@pytest.mark.parametrize('value', (
+    '[[1],[["_id","UInt32"]],[1]]',
+    b'[[1],[["_id","UInt32"]],[1]]',
+))
+def test_json_loads(value):
+    assert utils.json_loads(value) == [[1], [['_id', 'UInt32']], [1]]
+
+
+class TestLoads(object):
+    def test_loads(self):
+        assert utils.loads(b'[1]') == [1]
+        assert utils.loads('[1]', 'json') == [1]
+
+    def test_loads_with_msgpack(self):
+        msgpack = pytest.importorskip('msgpack')
+        data = msgpack.packb([[1], [u'さくら']])
+        assert utils.loads(data, 'msgpack') == [[1], [u'さくら']]
+
+    def test_loads_without_msgpack(self, monkeypatch):
+        monkeypatch.setattr(utils, 'msgpack', None)
+        with pytest.raises(ImportError):
+            utils.loads(b'\x91\x01', 'msgpack')
+
+    def test_loads_with_unknown_output_type(self):
+        with pytest.raises(ValueError):
+            utils.loads(b'<xml/>', 'xml')
+
+
+class TestSetJSONDecoder(object):
+    @pytest.fixture(autouse=True)
+    def restore(self, request):
+        request.addfinalizer(utils.set_json_decoder)
+
+    @pytest.fixture
+    def fake_module(self, monkeypatch):
+        def install(name):
+            module = types.ModuleType(name)
+            module.loads = lambda s: (name, s)
+            monkeypatch.setitem(sys.modules, name, module)
+            return module
+        return install
+
+    def test_set_json_decoder_with_name(self):
+        decoder = utils.set_json_decoder('json')
+        assert decoder is utils.stdlib_json_loads
+        assert utils.json_loads is decoder
+        assert utils.json_loads(b'[1]') == [1]
+
+    @pytest.mark.parametrize('name', ('orjson', 'ujson', 'simdjson'))
+    def test_set_json_decoder_with_module(self, name, fake_module):
+        fake_module(name)
+        utils.set_json_decoder(name)
+        assert utils.json_loads(b'[1]') == (name, b'[1]')
+
+    def test_set_json_decoder_with_callable(self):
+        utils.set_json_decoder(lambda s: 'decoded')
+        assert utils.json_loads('[1]') == 'decoded'
+
+    def test_set_json_decoder_with_default(self, fake_module, monkeypatch):
+        monkeypatch.setitem(sys.modules, 'orjson', None)
+        fake_module('simdjson')
+        monkeypatch.setitem(sys.modules, 'ujson', None)
+        utils.set_json_decoder()
+        assert utils.json_loads('[1]') == ('simdjson', '[1]')
+
+    def test_set_json_decoder_with_fallback(self, monkeypatch):
+        for name in ('orjson', 'ujson', 'simdjson'):
+            monkeypatch.setitem(sys.modules, name, None)
+        assert utils.set_json_decoder() is utils.stdlib_json_loads
+
+    def test_set_json_decoder_with_unknown(self):
+        with pytest.raises(ValueError):
+            utils.set_json_decoder('yaml')
+
+    def test_set_json_decoder_with_not_installed(self, monkeypatch):
+        monkeypatch.setitem(sys.modules, 'ujson', None)
+        with pytest.raises(ImportError):
+            utils.set_json_decoder('ujson')
+
+
+class TestIterToPython(object):
+    resultstr = (u'[[[3],[["_id","UInt32"],["name","ShortText"]],'
+                 u'[1,"foo"],\n[2,"さくら"], [3,"[\\"]"]],'
+                 u'[[2],[["_key","ShortText"]],["a"],["b"]]]')
+    expected = [{'_id': 1, 'name': 'foo'},
+                {'_id': 2, 'name': u'さくら'},
+                {'_id': 3, 'name': '["]'}]
+
+    @pytest.mark.parametrize('size', (1, 2, 7, 1024))
+    def test_iter_to_python(self, size):
+        s = self.resultstr
+        chunks = (s[i:i + size] for i in range(0, len(s), size))
+        assert list(utils.iter_to_python(chunks)) == self.expected
+
+    def test_with_empty_result(self):
+        chunks = ['[[[0],[["_id","UInt32"]]]]']
+        assert list(utils.iter_to_python(chunks)) == []
+
+    def test_drain(self):
+        chunks = iter([self.resultstr[:40], self.resultstr[40:]])
+        list(utils.iter_to_python(chunks))
+        assert list(chunks) == []
+
+    def test_with_truncated_result(self):
+        chunks = [self.resultstr[:40]]
+        with pytest.raises(ValueError):
+            list(utils.iter_to_python(chunks))
+
+
+class TestParseSelectChunks(object):
+    resultstr = TestIterToPython.resultstr
+
+    @pytest.mark.parametrize('size', (1, 3, 1024))
+    def test_parse_select_chunks(self, size):
+        s = self.resultstr
+        chunks = (s[i:i + size] for i in range(0, len(s), size))
+        all_len, columns, rows = utils.parse_select_chunks(chunks)
+        assert all_len == 3
+        assert columns == [['_id', 'UInt32'], ['name', 'ShortText']]
+        assert list(rows) == [[1, 'foo'], [2, u'さくら'], [3, '["]']]
+
+    def test_reads_rows_lazily(self):
+        chunks = iter([self.resultstr[:50], self.resultstr[50:]])
+        _, columns, rows = utils.parse_select_chunks(chunks)
+        assert columns[0] == ['_id', 'UInt32']
+        assert next(chunks) == self.resultstr[50:]
+
+    def test_with_large_value(self):
+        body = 'x' * 100000
+        s = '[[[1],[["body","Text"]],["%s"]]]' % body
+        decoder = mock.Mock(wraps=json.JSONDecoder())
+        with mock.patch.object(utils.json, 'JSONDecoder',
+                               return_value=decoder):
+            _, _, rows = utils.parse_select_chunks(iter(s))
+            assert list(rows) == [[body]]
+        # the incomplete value is retried on doubling, not on each chunk
+        assert decoder.raw_decode.call_count < 50
+
+    def test_with_invalid_result(self):
+        with pytest.raises(ValueError):
+            utils.parse_select_chunks(['{"a": 1}'])
+
+
+class TestPrefetch(object):
+    def test_prefetch(self):
+        assert list(utils.prefetch(iter(range(5)))) == [0, 1, 2, 3, 4]
+        assert list(utils.prefetch([], 3)) == []
+
+    def test_prefetch_ahead(self):
+        produced = []
+        ready = threading.Event()
+
+        def produce():
+            for i in range(5):
+                produced.append(i)
+                if i == 2:
+                    ready.set()
+                yield i
+        it = utils.prefetch(produce(), 2)
+        assert next(it) == 0
+        # 1 and 2 are waiting, 3 is produced and blocked
+        assert ready.wait(1)
+        assert list(it) == [1, 2, 3, 4]
+
+    def test_prefetch_with_error(self):
+        def produce():
+            yield 1
+            raise ValueError('error')
+        it = utils.prefetch(produce())
+        assert next(it) == 1
+        with pytest.raises(ValueError):
+            next(it)
+
+    def test_prefetch_with_close(self):
+        finished = threading.Event()
+
+        def produce():
+            try:
+                for i in range(100):
+                    yield i
+            finally:
+                finished.set()
+        it = utils.prefetch(produce())
+        assert next(it) == 0
+        it.close()
+        assert finished.wait(1)
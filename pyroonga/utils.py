@@ -8,7 +8,28 @@ __author__ = "Naoya Inada <naoina@kuune.org>"
 __all__ = [
 ]
 
+import itertools
+import json
+import re
 import sys
+import threading
+import time
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    from pyroonga._speedups import escape as _speedups_escape
+except ImportError:
+    # the C extension is not built
+    _speedups_escape = None
 
 PY2 = sys.version_info[0] == 2
 
@@ -44,14 +65,193 @@ def to_text(s):
     return text_type(s)
 
 
+if PY2 or sys.version_info >= (3, 6):
+    stdlib_json_loads = json.loads
+else:
+    def stdlib_json_loads(s):
+        """Deserialize JSON ``s`` of either text or bytes
+
+        :param s: JSON string. ``bytes`` is decoded as UTF-8.
+        :returns: Python object
+        """
+        if isinstance(s, bytes):
+            s = s.decode('utf-8')
+        return json.loads(s)
+
+
+def _orjson_loads():
+    import orjson
+    return orjson.loads
+
+
+def _ujson_loads():
+    import ujson
+    return ujson.loads
+
+
+def _simdjson_loads():
+    import simdjson
+    return simdjson.loads
+
+
+# JSON decoders in order of preference
+json_decoders = (
+    ('orjson', _orjson_loads),
+    ('ujson', _ujson_loads),
+    ('simdjson', _simdjson_loads),
+    ('json', lambda: stdlib_json_loads),
+)
+
+
+def set_json_decoder(decoder=None):
+    """Set the JSON decoder that is used for the results of queries
+
+    The decoder must accept both of text and ``bytes`` of UTF-8.
+
+    :param decoder: name of decoder in :data:`json_decoders`\ , or callable
+        that deserializes JSON. Default is None, it uses the first available
+        decoder of :data:`json_decoders`\ .
+    :returns: the decoder function
+    :raises: ValueError if ``decoder`` is unknown name, or ImportError if the
+        module of ``decoder`` is not installed
+    """
+    global json_loads
+    if decoder is None:
+        for name, factory in json_decoders:
+            try:
+                decoder = factory()
+            except ImportError:
+                continue
+            break
+    elif not callable(decoder):
+        factories = dict(json_decoders)
+        if decoder not in factories:
+            raise ValueError("unknown JSON decoder: %r" % (decoder,))
+        decoder = factories[decoder]()
+    json_loads = decoder
+    return decoder
+
+
+json_loads = set_json_decoder()
+
+# values of --output_type that the results can be decoded
+output_types = ('json', 'msgpack')
+
+
+def msgpack_loads(data):
+    """Deserialize MessagePack ``data``
+
+    :param data: ``bytes`` of MessagePack
+    :returns: Python object. The strings are decoded as UTF-8.
+    :raises: ImportError if msgpack is not installed
+    """
+    if msgpack is None:
+        raise ImportError("msgpack is required for output_type 'msgpack'")
+    try:
+        return msgpack.unpackb(data, raw=False)
+    except TypeError:
+        # msgpack < 0.5.2 doesn't have 'raw' argument
+        return msgpack.unpackb(data, encoding='utf-8')
+
+
+def loads(data, output_type='json'):
+    """Deserialize the result of query
+
+    :param data: result of query. It must be ``bytes`` unless
+        ``output_type`` is 'json'.
+    :param output_type: 'json' or 'msgpack'. Default is 'json'.
+    :returns: Python object
+    :raises: ValueError if ``output_type`` is unknown
+    """
+    if output_type == 'json':
+        return json_loads(data)
+    elif output_type == 'msgpack':
+        return msgpack_loads(data)
+    raise ValueError("unknown output type: %r" % (output_type,))
+
+
+def deadline(timeout):
+    """Get the deadline from the timeout
+
+    :param timeout: seconds of timeout, or None
+    :returns: time of deadline by :func:`time.time`\ , or None if ``timeout``
+        is None
+    """
+    return None if timeout is None else time.time() + timeout
+
+
+def remaining(deadline):
+    """Get the remaining seconds until the deadline
+
+    :param deadline: time of deadline, or None
+    :returns: remaining seconds that is not negative, or None if
+        ``deadline`` is None
+    """
+    if deadline is None:
+        return None
+    return max(deadline - time.time(), 0)
+
+
+def prefetch(iterable, size=1):
+    """Iterate ``iterable`` in a background thread
+
+    The thread takes up to ``size`` items ahead of the consumer, so that
+    producing the next item overlaps with processing the current one. An
+    exception from ``iterable`` is raised from the iteration. The thread
+    stops after the current item when the iteration is closed.
+
+    :param iterable: iterable that is iterated in the thread.
+    :param size: maximum number of items that are waiting to be consumed.
+        Default is 1.
+    :returns: iterator of the items of ``iterable``
+    """
+    items = queue.Queue(size)
+    stopped = threading.Event()
+    done = object()
+
+    def run():
+        try:
+            for item in iterable:
+                items.put((item, None))
+                if stopped.is_set():
+                    return
+            items.put((done, None))
+        except Exception as e:
+            items.put((done, e))
+
+    thread = threading.Thread(target=run)
+    thread.daemon = True
+    thread.start()
+    try:
+        while True:
+            item, error = items.get()
+            if error is not None:
+                raise error
+            if item is done:
+                return
+            yield item
+    finally:
+        stopped.set()
+        # unblock the thread that waits for a free slot
+        try:
+            while True:
+                items.get_nowait()
+        except queue.Empty:
+            pass
+
+
 def escape(s, force_quote=False):
     """Escape for query of groonga
 
+    The text is escaped in one copy by the C extension if it is built.
+
     :param s: string
     :param force_quote: If True, always quote the ``s``.
         If False, quote only if contains '\u0020'.  Default is False
     :returns: escaped string
     """
+    if _speedups_escape is not None and type(s) is text_type:
+        return _speedups_escape(s, force_quote)
     s = s.replace('\\', r'\\')
     s = s.replace('\n', r'\n')
     s = s.replace('"', r'\"')
@@ -68,13 +268,151 @@ def to_python(results, base_idx, maxlen=None):
     :param maxlen: maximum length of mapping results. Default is all
     :returns: list of mapped dict of query results
     """
+    return list(to_python_iter(results, base_idx, maxlen))
+
+
+def to_python_iter(results, base_idx, maxlen=None):
+    """Iterate the Python objects converted from results of query
+
+    Same as :func:`to_python` except that each dict is made on demand, so
+    that only the results are held in memory.
+
+    :param results: query results
+    :param base_idx: index of start of table info
+    :param maxlen: maximum length of mapping results. Default is all
+    :returns: iterator of mapped dict of query results
+    """
     cols = [col[0] for col in results[base_idx]]
-    colrange = range(len(cols))
-    objs = []
+    rows = itertools.islice(results, base_idx + 1, None)
     if maxlen is not None:
-        maxlen += 1
-    # TODO: implements by generator
-    for v in results[base_idx + 1:maxlen]:
-        mapped = dict(zip(cols, [v[i] for i in colrange]))
-        objs.append(mapped)
-    return objs
+        rows = itertools.islice(rows, maxlen)
+    for v in rows:
+        yield dict(zip(cols, v))
+
+
+def iter_to_python(chunks):
+    """Convert from chunks of results of 'select' query to Python objects
+
+    Unlike :func:`to_python`, the chunks are parsed incrementally, so that the
+    whole results aren't held in memory. Results of drilldown are ignored.
+
+    :param chunks: iterable of text chunks of results of 'select' query
+    :returns: iterator of mapped dict of query results
+    """
+    _, columns, rows = parse_select_chunks(chunks)
+    cols = [col[0] for col in columns]
+    for row in rows:
+        yield dict(zip(cols, row))
+
+
+def parse_select_chunks(chunks):
+    """Parse the chunks of results of 'select' query incrementally
+
+    Only the number of all results and the columns are read on the call. Each
+    row is decoded from the chunks as the rows are iterated, so that the
+    memory is bounded by the size of a row and a chunk rather than the whole
+    results. Results of drilldown are ignored.
+
+    :param chunks: iterable of text chunks of results of 'select' query
+    :returns: tuple of (number of all results, list of [name, type] of
+        columns, iterator of rows). Each row is list of values in the order of
+        columns.
+    :raises: ValueError if the chunks are not results of 'select' query
+    """
+    reader = JSONChunkReader(chunks)
+    reader.expect('[')
+    reader.expect('[')
+    all_len = reader.value()[0]
+    reader.expect(',')
+    columns = reader.value()
+    return all_len, columns, _iter_rows(reader)
+
+
+def _iter_rows(reader):
+    while reader.peek() == ',':
+        reader.expect(',')
+        yield reader.value()
+    reader.expect(']')
+    reader.drain()
+
+
+class JSONChunkReader(object):
+    """Reader of JSON values from the chunks of JSON text
+
+    The chunk is not necessarily a boundary of JSON value. The consumed part
+    of the buffer is discarded on reading the next chunk.
+    """
+
+    _whitespace = re.compile(r'[ \t\n\r]*')
+
+    def __init__(self, chunks):
+        """Construct of JSONChunkReader
+
+        :param chunks: iterable of text chunks
+        """
+        self._chunks = iter(chunks)
+        self._buf = ''
+        self._pos = 0
+        self._decoder = json.JSONDecoder()
+
+    def _fill(self, size=1):
+        # join the chunks at once instead of appending each of them to the
+        # buffer
+        chunks = [self._buf[self._pos:]]
+        n = 0
+        for chunk in self._chunks:
+            chunks.append(chunk)
+            n += len(chunk)
+            if n >= size:
+                break
+        if not n:
+            raise ValueError('unexpected end of JSON data')
+        self._buf = ''.join(chunks)
+        self._pos = 0
+
+    def peek(self):
+        """Get the next character except whitespaces without consuming
+
+        :returns: a character
+        """
+        while True:
+            pos = self._whitespace.match(self._buf, self._pos).end()
+            if pos < len(self._buf):
+                self._pos = pos
+                return self._buf[pos]
+            self._fill()
+
+    def expect(self, char):
+        """Consume the next character except whitespaces
+
+        :param char: expected character
+        :raises: ValueError if the next character isn't ``char``
+        """
+        c = self.peek()
+        if c != char:
+            raise ValueError('expected %r but got %r' % (char, c))
+        self._pos += 1
+
+    def value(self):
+        """Read the next JSON array or object
+
+        :returns: Python object
+        """
+        self.peek()
+        while True:
+            try:
+                obj, end = self._decoder.raw_decode(self._buf, self._pos)
+            except ValueError:
+                # read as much again as the incomplete value, so that a large
+                # value over many chunks is decoded in linear time
+                self._fill(len(self._buf) - self._pos)
+            else:
+                self._pos = end
+                return obj
+
+    def drain(self):
+        """Discard the rest of chunks"""
+        for _ in self._chunks:
+            pass
+        self._buf = ''
+        self._pos = 0
@@ -79,7 +79,14 @@ setup(name='pyroonga',
           '_groonga',
           sources=['_groonga.c'],
           define_macros=[],
+          # HTTP transport is available without the extension
+          optional=True,
           **pkgconfig('groonga')
+          ), Extension(
+          'pyroonga._speedups',
+          sources=['_speedups.c'],
+          # pure-Python fallback is used without the extension
+          optional=True,
           )],
       cmdclass={
           'test': gen_pytest_class(['pyroonga/tests/unit']),